@@ -0,0 +1,64 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from contextlib import contextmanager
+import threading
+import time
+
+
+# Hands the ORM's persistent connection (CONN_MAX_AGE) to the pipelines, so a request or job opens one connection instead of two.
+# At most `size` threads of a worker process hold a connection at once, others wait for a free slot.
+class ConnectionPool:
+
+    def __init__(self, size=None, alias=DEFAULT_DB_ALIAS):
+        self.size = size or settings.DB_POOL_SIZE
+        self.alias = alias
+        self.slots = threading.BoundedSemaphore(self.size)
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.active = 0
+        self.connects = 0
+        self.connect_seconds = 0.0
+
+    # Function to check out the thread's database connection, yields the raw psycopg2 connection
+    @contextmanager
+    def connection(self):
+        if not self.slots.acquire(blocking=False):
+            start = time.perf_counter()
+            self.slots.acquire()
+            with self.lock:
+                self.waits += 1
+                self.wait_seconds += time.perf_counter() - start
+        try:
+            with self.lock:
+                self.checkouts += 1
+                self.active += 1
+            yield self.ensure_connection()
+        finally:
+            with self.lock:
+                self.active -= 1
+            self.slots.release()
+
+    # Function to reuse the thread's open connection, reconnecting when it is missing, broken or older than CONN_MAX_AGE
+    def ensure_connection(self):
+        db = connections[self.alias]
+        if not db.in_atomic_block:
+            db.close_if_unusable_or_obsolete()
+        if db.connection is None:
+            start = time.perf_counter()
+            db.ensure_connection()
+            with self.lock:
+                self.connects += 1
+                self.connect_seconds += time.perf_counter() - start
+        return db.connection
+
+    # Function to return the pool usage counters
+    def stats(self):
+        with self.lock:
+            return {"size": self.size, "checkouts": self.checkouts, "waits": self.waits, "wait_seconds": round(self.wait_seconds, 3),
+                    "active": self.active, "connects": self.connects, "connect_seconds": round(self.connect_seconds, 3)}
+
+
+db_pool = ConnectionPool()
@@ -0,0 +1,233 @@
+from CPR.settings.base import BASE_DIR
+
+import logging
+import os
+import threading
+import time
+import tracemalloc
+
+MB = 1024 * 1024
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+# Seconds between RSS samples, frames kept per traced allocation and allocation sites reported per stage when profiling memory
+RSS_INTERVAL = 0.05
+TRACE_FRAMES = 25
+TOP_SITES = 5
+
+logger = logging.getLogger(__name__)
+
+
+# Function to return the resident set size of the process in bytes, None where /proc is not available
+def current_rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+# Function to return the project frame (the innermost one in this repository) and the innermost frame of a traceback
+def allocation_frames(traceback):
+    innermost = traceback[-1]
+    project = next((frame for frame in reversed(traceback) if frame.filename.startswith(str(BASE_DIR)) and "site-packages" not in frame.filename), innermost)
+    return project, innermost
+
+
+# Function to return the largest allocation sites retained between two tracemalloc snapshots, grouped by the project line
+# which made them with the library line where the memory was allocated. The profiler's own snapshots are left out
+def allocation_sites(before, after, limit=TOP_SITES):
+    sites = {}
+    own = [tracemalloc.Filter(False, __file__, all_frames=True), tracemalloc.Filter(False, tracemalloc.__file__, all_frames=True)]
+    for stat in after.filter_traces(own).compare_to(before.filter_traces(own), "traceback"):
+        if stat.size_diff <= 0:
+            continue
+        project, innermost = allocation_frames(stat.traceback)
+        key = "{}:{}".format(os.path.relpath(project.filename, BASE_DIR), project.lineno)
+        site = sites.setdefault(key, {"site": key, "allocated_in": "{}:{}".format(os.path.basename(innermost.filename), innermost.lineno), "mb": 0.0, "blocks": 0})
+        site["mb"] += stat.size_diff / MB
+        site["blocks"] += stat.count_diff
+    top = sorted(sites.values(), key=lambda site: site["mb"], reverse=True)[:limit]
+    return [dict(site, mb=round(site["mb"], 2)) for site in top]
+
+
+# Samples the process RSS in a background thread, keeping the highest value since the last reset
+class RssSampler(threading.Thread):
+
+    def __init__(self, interval=RSS_INTERVAL):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.max_rss = current_rss()
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            rss = current_rss()
+            with self.lock:
+                self.max_rss = max(self.max_rss, rss)
+
+    # Function to start a new sampling window, returns the current RSS
+    def reset(self):
+        rss = current_rss()
+        with self.lock:
+            self.max_rss = rss
+        return rss
+
+    # Function to return the highest RSS of the current window
+    def peak(self):
+        rss = current_rss()
+        with self.lock:
+            return max(self.max_rss, rss)
+
+    def stop(self):
+        self.stopped.set()
+
+
+# Traced (tracemalloc) and resident (RSS) memory of the stages of one run. Traced memory is exact for Python and NumPy
+# allocations, RSS also covers native libraries. Stages must not be nested while profiling, each one resets the traced peak
+class MemoryProfiler:
+
+    def __init__(self):
+        self.started = not tracemalloc.is_tracing()
+        if self.started:
+            tracemalloc.start(TRACE_FRAMES)
+        self.sampler = RssSampler() if current_rss() is not None else None
+        if self.sampler is not None:
+            self.sampler.start()
+
+    # Function to record the memory at the start of a stage. Allocation sites are only snapshotted on a stage's first entry
+    # (the first chunk), snapshots are slow on large heaps
+    def enter(self, record):
+        tracemalloc.reset_peak()
+        traced = tracemalloc.get_traced_memory()[0]
+        rss = self.sampler.reset() if self.sampler is not None else None
+        snapshot = tracemalloc.take_snapshot() if record["calls"] == 0 else None
+        return traced, rss, snapshot
+
+    # Function to add the peak and retained memory of a stage to its record
+    def exit(self, record, state):
+        traced_before, rss_before, snapshot = state
+        traced, traced_peak = tracemalloc.get_traced_memory()
+        record["peak_mb"] = max(record.get("peak_mb", 0.0), traced_peak / MB)
+        record["retained_mb"] = record.get("retained_mb", 0.0) + (traced - traced_before) / MB
+        if self.sampler is not None:
+            rss = current_rss()
+            record["rss_peak_mb"] = max(record.get("rss_peak_mb", 0.0), self.sampler.peak() / MB)
+            record["rss_retained_mb"] = record.get("rss_retained_mb", 0.0) + (rss - rss_before) / MB
+        if snapshot is not None:
+            record["top_sites"] = allocation_sites(snapshot, tracemalloc.take_snapshot())
+
+    def stop(self):
+        if self.sampler is not None:
+            self.sampler.stop()
+        if self.started:
+            tracemalloc.stop()
+
+
+# Timing of one entry into a stage, rows can be set inside the block
+class Stage:
+
+    def __init__(self, record, rows=None, memory=None):
+        self.record = record
+        self.rows = rows
+        self.memory = memory
+
+    def __enter__(self):
+        self.memory_state = self.memory.enter(self.record) if self.memory is not None else None
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.record["wall_seconds"] += time.perf_counter() - self.wall
+        self.record["cpu_seconds"] += time.process_time() - self.cpu
+        if self.memory is not None:
+            self.memory.exit(self.record, self.memory_state)
+        self.record["calls"] += 1
+        if self.rows is not None:
+            self.record["rows"] = (self.record["rows"] or 0) + self.rows
+        return False
+
+
+# Stand-in used while timing is turned off, entering and leaving it does nothing
+class NoStage:
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NO_STAGE = NoStage()
+
+
+# Wall time, CPU time and rows of the named stages of one pipeline run. A stage entered more than once (e.g. once per chunk)
+# adds up, stages are reported in the order they were first entered. With memory the peak and retained memory and largest
+# allocation sites of each stage are recorded too, which slows the run down, so it is meant to be turned on when needed
+class StageTimings:
+
+    def __init__(self, enabled=True, memory=False):
+        self.enabled = enabled or memory
+        self.memory = MemoryProfiler() if memory else None
+        self.stages = {}
+        self.start = time.perf_counter()
+
+    # Function to return a context manager timing a block as the named stage
+    def stage(self, name, rows=None):
+        if not self.enabled:
+            return NO_STAGE
+        record = self.stages.get(name)
+        if record is None:
+            record = self.stages[name] = {"stage": name, "wall_seconds": 0.0, "cpu_seconds": 0.0, "rows": None, "calls": 0}
+        return Stage(record, rows, self.memory)
+
+    # Function to iterate over chunks, timing the reading of each one as the named stage with the chunk's rows
+    def iterate(self, name, chunks):
+        if not self.enabled:
+            yield from chunks
+            return
+        chunks = iter(chunks)
+        while True:
+            with self.stage(name) as stage:
+                chunk = next(chunks, None)
+                stage.rows = 0 if chunk is None else len(chunk.index)
+            if chunk is None:
+                return
+            yield chunk
+
+    # Function to stop memory profiling, called once the run is over (also when it failed)
+    def close(self):
+        if self.memory is not None:
+            self.memory.stop()
+            self.memory = None
+
+    # Function to return the stages with their share of the run's wall time, an empty list when timing is turned off
+    def report(self):
+        total = time.perf_counter() - self.start
+        report = []
+        for record in self.stages.values():
+            record = dict(record, wall_seconds=round(record["wall_seconds"], 3), cpu_seconds=round(record["cpu_seconds"], 3),
+                          share=round(record["wall_seconds"] / total * 100, 1) if total else 0.0)
+            for key in ["peak_mb", "retained_mb", "rss_peak_mb", "rss_retained_mb"]:
+                if key in record:
+                    record[key] = round(record[key], 1)
+            report.append(record)
+        return report
+
+    # Function to log the per-stage breakdown of the run, as one record
+    def log(self, title):
+        if not self.enabled:
+            return
+        lines = ["Stage timings of %s:" % title]
+        for record in self.report():
+            line = "  {:<16} {:>9.3f} s wall {:>9.3f} s cpu {:>5.1f}% {:>10} rows".format(
+                record["stage"], record["wall_seconds"], record["cpu_seconds"], record["share"], "-" if record["rows"] is None else record["rows"])
+            if "peak_mb" in record:
+                line += " {:>8.1f} MB peak {:>8.1f} MB retained".format(record["peak_mb"], record["retained_mb"])
+            if "rss_peak_mb" in record:
+                line += " {:>8.1f} MB RSS peak".format(record["rss_peak_mb"])
+            lines.append(line)
+            for site in record.get("top_sites", []):
+                lines.append("      {:>8.2f} MB {} ({})".format(site["mb"], site["site"], site["allocated_in"]))
+        logger.info("\n".join(lines))
@@ -0,0 +1,175 @@
+from operator import itemgetter
+import codecs
+import csv
+import json
+import os
+import re
+import tempfile
+
+# Bytes read from the request per chunk and records written to the CSV per chunk
+READ_SIZE = 64 * 1024
+CSV_CHUNK_ROWS = 5000
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+DECODER = json.JSONDecoder()
+
+
+# Incremental reader for the OneSchema webhook JSON, keeps only the undecoded tail of the body in memory
+class PayloadStream:
+
+    def __init__(self, stream, read_size=READ_SIZE):
+        self.stream = stream
+        self.read_size = read_size
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    # Function to append the next chunk of the body to the buffer, returns False at the end of the body
+    def fill(self):
+        if self.eof:
+            return False
+        data = self.stream.read(self.read_size)
+        if not data:
+            self.eof = True
+        text = self.decoder.decode(data or b"", final=self.eof)
+        self.buffer = self.buffer[self.pos:] + text
+        self.pos = 0
+        return bool(data)
+
+    # Function to return the next non-whitespace character without consuming it, "" at the end of the body
+    def peek(self):
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ""
+
+    # Function to consume the expected structural character
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError("Invalid OneSchema payload: expected '{}' but found '{}'".format(char, self.peek()))
+        self.pos += 1
+
+    # Function to decode the next complete JSON value, reading more of the body until it is complete
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = DECODER.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # A number ending at the buffer boundary may continue in the next chunk
+            if end == len(self.buffer) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+    # Function to yield the elements of a JSON array one at a time
+    def items(self):
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            separator = self.peek()
+            self.pos += 1
+            if separator == "]":
+                return
+            if separator != ",":
+                raise ValueError("Invalid OneSchema payload: expected ',' or ']' but found '{}'".format(separator))
+
+    # Function to yield the keys of a JSON object, the caller consumes each value before asking for the next key
+    def members(self):
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            separator = self.peek()
+            self.pos += 1
+            if separator == "}":
+                return
+            if separator != ",":
+                raise ValueError("Invalid OneSchema payload: expected ',' or '}}' but found '{}'".format(separator))
+
+
+# Function to return the CSV column headers and record keys from the payload columns
+def column_keys(columns):
+    column_headers, template_key_headers = [], []
+    for col in columns:
+        for k, v in col.items():
+            if k == "template_column_name":
+                column_headers.append(v)
+            elif k == "template_column_key":
+                template_key_headers.append(v)
+    return column_headers, template_key_headers
+
+
+# Function to return a function which projects a record onto the template key order as a row
+def record_projection(template_key_headers):
+    if len(template_key_headers) == 1:
+        key = template_key_headers[0]
+        return lambda rec: (rec[key],)
+    if not template_key_headers:
+        return lambda rec: ()
+    return itemgetter(*template_key_headers)
+
+
+# Function to write records to the CSV in chunks of chunk_rows, returns the number of rows written
+def write_records(csv_writer, records, template_key_headers, chunk_rows=CSV_CHUNK_ROWS):
+    project = record_projection(template_key_headers)
+    rows, chunk = 0, []
+    for rec in records:
+        chunk.append(project(rec))
+        if len(chunk) >= chunk_rows:
+            csv_writer.writerows(chunk)
+            rows += len(chunk)
+            chunk.clear()
+    csv_writer.writerows(chunk)
+    return rows + len(chunk)
+
+
+# Function to stream a OneSchema webhook body into a CSV file, returns the column headers and number of rows
+def write_oneschema_csv(stream, csv_file_path, chunk_rows=CSV_CHUNK_ROWS):
+    payload = PayloadStream(stream)
+    column_headers, template_key_headers = None, None
+    rows = 0
+    # Records sent before the columns are spooled to a temporary file until the key order is known
+    spool = None
+    part_file_path = "{}.part".format(csv_file_path)
+    try:
+        with open(part_file_path, 'w', newline='') as csv_file:
+            csv_writer = csv.writer(csv_file)
+            for key in payload.members():
+                if key == "columns":
+                    column_headers, template_key_headers = column_keys(payload.items())
+                    csv_writer.writerow(column_headers)
+                elif key == "records" and template_key_headers is not None:
+                    rows += write_records(csv_writer, payload.items(), template_key_headers, chunk_rows)
+                elif key == "records":
+                    spool = tempfile.TemporaryFile("w+", encoding="utf-8")
+                    for rec in payload.items():
+                        spool.write(json.dumps(rec) + "\n")
+                else:
+                    payload.value()
+            if template_key_headers is None:
+                raise ValueError("Invalid OneSchema payload: no columns were sent")
+            if spool is not None:
+                spool.seek(0)
+                rows += write_records(csv_writer, map(json.loads, spool), template_key_headers, chunk_rows)
+        os.replace(part_file_path, csv_file_path)
+    except BaseException:
+        if os.path.exists(part_file_path):
+            os.remove(part_file_path)
+        raise
+    finally:
+        if spool is not None:
+            spool.close()
+    return column_headers, rows
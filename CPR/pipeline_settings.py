@@ -0,0 +1,92 @@
+from django.core.exceptions import ImproperlyConfigured
+
+from CPR.settings.base import BASE_DIR, PIPELINE_HOME
+
+from dataclasses import dataclass
+from pathlib import Path
+import json
+import os
+import threading
+import pandas as pd
+
+CONFIG_JSON_PATH = Path(os.path.join(BASE_DIR, "config.json"))
+PATH_KEYS = ["win_etl_output_files_path", "oneschema_air_path", "oneschema_hotels_path", "air_group_mapping_path", "hotels_group_mapping_path"]
+# Preferred airlines whose contract classifier is split by a departure date cut-off
+DEPARTURE_CUTOFF_KEYS = {"JetBlue": "jet_departure_date"}
+
+
+# Settings parsed from config.json, with paths, contract codes and cut-off dates ready to use
+@dataclass(frozen=True)
+class PipelineSettings:
+    win_etl_output_files_path: Path
+    oneschema_air_path: Path
+    oneschema_hotels_path: Path
+    air_group_mapping_path: Path
+    hotels_group_mapping_path: Path
+    departure_cutoffs: dict
+    contract_codes: dict
+    group_deals: frozenset
+    # Rows per chunk when processing air files, None processes the whole file at once
+    air_chunk_size: int = None
+    # Record per-stage wall time, CPU time and rows of every pipeline run
+    stage_timing: bool = True
+    # Also record peak and retained memory and the largest allocation sites of every stage, slows runs down
+    memory_profiling: bool = False
+
+
+# Function to validate config.json and build the settings object
+def parse_pipeline_settings(data, user_path):
+    missing = [key for key in PATH_KEYS + ["group_deals", "tour_code_and_ticket_designator"] + list(DEPARTURE_CUTOFF_KEYS.values()) if key not in data]
+    if missing:
+        raise ImproperlyConfigured("config.json is missing: %s" % ", ".join(missing))
+    paths = {key: Path(os.path.join(user_path, data[key])) for key in PATH_KEYS}
+    try:
+        departure_cutoffs = {airline: pd.to_datetime(data[key], format="%m/%d/%Y") for airline, key in DEPARTURE_CUTOFF_KEYS.items()}
+    except ValueError as error:
+        raise ImproperlyConfigured("config.json has an invalid departure date: %s" % error)
+    contract_codes = {}
+    for airline, values in data["tour_code_and_ticket_designator"].items():
+        tour_code = next((v for k, v in values.items() if k.endswith("tour_code")), None)
+        ticket_designator = next((v for k, v in values.items() if k.endswith("ticket_designator")), None)
+        if tour_code is None and ticket_designator is None:
+            raise ImproperlyConfigured("config.json has no tour code or ticket designator for %s" % airline)
+        contract_codes[airline] = (tour_code, ticket_designator)
+    air_chunk_size = data.get("air_chunk_size")
+    if air_chunk_size is not None and (not isinstance(air_chunk_size, int) or air_chunk_size < 1):
+        raise ImproperlyConfigured("config.json has an invalid air_chunk_size: %s" % air_chunk_size)
+    flags = {key: data.get(key, default) for key, default in [("stage_timing", True), ("memory_profiling", False)]}
+    for key, value in flags.items():
+        if not isinstance(value, bool):
+            raise ImproperlyConfigured("config.json has an invalid %s: %s" % (key, value))
+    return PipelineSettings(departure_cutoffs=departure_cutoffs, contract_codes=contract_codes, group_deals=frozenset(data["group_deals"]),
+                            air_chunk_size=air_chunk_size, **flags, **paths)
+
+
+# Process-wide config.json cache, reloaded only when the file changes
+class PipelineSettingsCache:
+
+    def __init__(self, path=CONFIG_JSON_PATH):
+        self.path = path
+        self.version = None
+        self.settings = None
+        self.lock = threading.Lock()
+
+    # Function to return the current settings, re-reading config.json if it changed on disk
+    def get(self):
+        stat = os.stat(self.path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            if self.version != version:
+                with open(self.path) as f:
+                    data = json.load(f)
+                self.settings = parse_pipeline_settings(data, Path(PIPELINE_HOME))
+                self.version = version
+            return self.settings
+
+
+settings_cache = PipelineSettingsCache()
+
+
+# Function to return the process-wide pipeline settings
+def pipeline_settings():
+    return settings_cache.get()
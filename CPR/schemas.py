@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+MB = 1024 * 1024
+
+
+# Column types of an input file, applied when it is read instead of letting pandas infer object and float64 for every column.
+# Low-cardinality codes and names are categorical, counts use the narrowest type which holds them exactly and dates are parsed
+# with their known format. Columns missing from a file are skipped, money amounts are left float64 so no cent is rounded
+class FrameSchema:
+
+    def __init__(self, dtypes, dates=None):
+        self.dtypes = dtypes
+        self.dates = dates or {}
+
+    # Function to return the keyword arguments of pd.read_csv which apply the column types while parsing
+    def read_options(self):
+        return {"dtype": self.dtypes}
+
+    # Function to parse the date columns of a frame read with read_options
+    def parse_dates(self, df):
+        for column, date_format in self.dates.items():
+            if column in df.columns:
+                df[column] = pd.to_datetime(df[column], format=date_format)
+        return df
+
+    # Function to apply the schema to a frame which was read without it (e.g. from an .xlsx file)
+    def apply(self, df):
+        dtypes = {column: dtype for column, dtype in self.dtypes.items() if column in df.columns}
+        return self.parse_dates(df.astype(dtypes))
+
+
+# Function to return a constant column as a categorical with one category, stored as one small code per row
+def constant_column(value, index):
+    return pd.Series(pd.Categorical.from_codes(np.zeros(len(index), dtype=np.int8), [value]), index=index)
+
+
+# Function to return the memory of a frame in MB, counting the contents of object and string columns
+def frame_memory_mb(df):
+    return df.memory_usage(deep=True).sum() / MB
+
+
+# Function to compute a column from a date column through its distinct dates, which files have a few hundred of at most.
+# function receives the distinct dates as a DatetimeIndex and returns one value per date, missing dates give NaN
+def per_date(dates, function):
+    codes, uniques = pd.factorize(dates)
+    values = np.append(np.asarray(function(uniques), dtype=object), np.nan)
+    return pd.Series(values[codes], index=dates.index)
+
+
+# Function to format a date column as text, strftime runs once per distinct date instead of once per row
+def format_dates(dates, date_format):
+    return per_date(dates, lambda uniques: uniques.strftime(date_format))
@@ -10,8 +10,10 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 
+import getpass
 import os
 import django_heroku
+from decouple import config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
@@ -38,6 +40,7 @@ INSTALLED_APPS = [
     'concertiv',
     'air',
     'hotels',
+    'jobs',
 ]
 
 MIDDLEWARE = [
@@ -129,6 +132,38 @@ STATICFILES_DIRS = [
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-django_heroku.settings(locals())
+# Database connections are kept open per thread and shared by the ORM and the pipelines (CPR/db_pool.py)
+DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default=600, cast=int)
+# Threads of one worker process which may hold a pipeline connection at the same time
+DB_POOL_SIZE = config('DB_POOL_SIZE', default=4, cast=int)
+# Home directory the relative paths of config.json are resolved against. getpass also works without a controlling terminal
+# (job workers, run_batch, gunicorn), os.getlogin() does not
+PIPELINE_HOME = config('PIPELINE_HOME', default=os.path.join('C:/Users', getpass.getuser()))
+
+# Run reports and stage timings of the pipelines are logged at INFO, they are also stored in the result of the pipeline's job
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'verbose': {
+            'format': '%(asctime)s [%(process)d] [%(levelname)s] %(name)s %(message)s',
+            'datefmt': '%Y-%m-%d %H:%M:%S',
+        },
+    },
+    'handlers': {
+        'console': {
+            'level': 'DEBUG',
+            'class': 'logging.StreamHandler',
+            'formatter': 'verbose',
+        },
+    },
+    'loggers': {
+        'air': {'handlers': ['console'], 'level': 'INFO'},
+        'hotels': {'handlers': ['console'], 'level': 'INFO'},
+        'CPR.instrumentation': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
+django_heroku.settings(locals(), logging=False)
 
 SESSION_COOKIE_AGE = 900
@@ -16,5 +16,7 @@ DATABASES = {
         'PASSWORD': config('PROD_DB_PASSWORD'),
         'HOST': config('DB_HOST'),
         'PORT': config('DB_PORT'),
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
\ No newline at end of file
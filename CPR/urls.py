@@ -21,4 +21,5 @@ urlpatterns = [
     path('CPR-dev/', include('concertiv.urls', namespace='cprauth')),
     path('CPR-dev/', include('air.urls', namespace="air")),
     path('CPR-dev/', include('hotels.urls', namespace="hotels")),
+    path('CPR-dev/', include('jobs.urls', namespace="jobs")),
 ]
@@ -0,0 +1,125 @@
+from openpyxl import Workbook
+
+from pathlib import Path
+import os
+import time
+import pandas as pd
+
+# Rows per worksheet in an .xlsx file, including the header row
+EXCEL_MAX_ROWS = 1048576
+
+
+# Writes an .xlsx artifact chunk by chunk with a write-only workbook, so rows are not kept in memory
+class ChunkedSheetWriter:
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = list(columns)
+        self.workbook = Workbook(write_only=True)
+        self.sheet = None
+        self.sheet_rows = 0
+        self.rows = 0
+
+    # Function to start a new worksheet with the header row, used again when a sheet is full
+    def add_sheet(self):
+        self.sheet = self.workbook.create_sheet("Sheet%d" % (len(self.workbook.worksheets) + 1))
+        self.sheet.append(self.columns)
+        self.sheet_rows = 1
+
+    # Function to append the rows of a chunk
+    def append(self, df):
+        if self.sheet is None:
+            self.add_sheet()
+        df = df.reindex(columns=self.columns)
+        for row in df.astype(object).where(df.notna(), None).itertuples(index=False, name=None):
+            if self.sheet_rows >= EXCEL_MAX_ROWS:
+                self.add_sheet()
+            self.sheet.append(row)
+            self.sheet_rows += 1
+        self.rows += len(df.index)
+
+    # Function to save the workbook
+    def save(self):
+        if self.sheet is None:
+            self.add_sheet()
+        self.workbook.save(self.path)
+
+
+# Collects the output frames of a pipeline run and writes them once at the end, recording per-run I/O bytes and time
+class RunArtifacts:
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.frames = []
+        self.writers = []
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.io_seconds = 0.0
+
+    # Function to read an input CSV into a frame, counting its size and read time. With a schema (CPR.schemas.FrameSchema)
+    # its column types are applied while parsing
+    def read_csv(self, path, schema=None, **kwargs):
+        start = time.perf_counter()
+        if schema is not None:
+            kwargs = dict(schema.read_options(), **kwargs)
+        df = pd.read_csv(path, **kwargs)
+        if schema is not None:
+            df = schema.parse_dates(df)
+        self.io_seconds += time.perf_counter() - start
+        self.bytes_read += os.path.getsize(path)
+        return df
+
+    # Function to read an input CSV in frames of chunk_size rows, the whole file as one frame when chunk_size is None
+    def read_csv_chunks(self, path, chunk_size=None, schema=None, **kwargs):
+        if chunk_size is None:
+            yield self.read_csv(path, schema, **kwargs)
+            return
+        self.bytes_read += os.path.getsize(path)
+        if schema is not None:
+            kwargs = dict(schema.read_options(), **kwargs)
+        with pd.read_csv(path, chunksize=chunk_size, **kwargs) as reader:
+            while True:
+                start = time.perf_counter()
+                df = next(reader, None)
+                if df is not None and schema is not None:
+                    df = schema.parse_dates(df)
+                self.io_seconds += time.perf_counter() - start
+                if df is None:
+                    return
+                yield df
+
+    # Function to register a frame to be written as an .xlsx artifact, returns the path it will be written to
+    def add(self, file_name, df):
+        path = Path(os.path.join(self.directory, file_name))
+        self.frames.append((path, df))
+        return path
+
+    # Function to register an .xlsx artifact which receives its rows chunk by chunk, returns the writer
+    def add_chunked(self, file_name, columns):
+        writer = ChunkedSheetWriter(Path(os.path.join(self.directory, file_name)), columns)
+        self.writers.append(writer)
+        return writer
+
+    # Function to append a chunk to a chunked artifact, counting the time spent
+    def append(self, writer, df):
+        start = time.perf_counter()
+        writer.append(df)
+        self.io_seconds += time.perf_counter() - start
+
+    # Function to write every registered artifact
+    def write(self):
+        for path, df in self.frames:
+            start = time.perf_counter()
+            df.to_excel(path, index=False)
+            self.io_seconds += time.perf_counter() - start
+            self.bytes_written += os.path.getsize(path)
+        for writer in self.writers:
+            start = time.perf_counter()
+            writer.save()
+            self.io_seconds += time.perf_counter() - start
+            self.bytes_written += os.path.getsize(writer.path)
+        self.frames, self.writers = [], []
+
+    # Function to return the I/O totals of the run
+    def report(self):
+        return {"bytes_read": self.bytes_read, "bytes_written": self.bytes_written, "io_seconds": round(self.io_seconds, 3)}
@@ -0,0 +1,76 @@
+from .loaders import MISSING_DISCOUNT
+
+from CPR.schemas import format_dates
+
+import numpy as np
+import pandas as pd
+
+NOT_PREFERRED = "Not Preferred Airlines"
+NOT_AVAILABLE = "Not Available, Not Matched"
+MATCHED = "Available, Matched"
+NOT_MATCHED = "Available, Not Matched - "
+BLANK_VALUES = ["", "nan"]
+
+# Function to return the tour code / ticket designator check result for every row
+def check_code(values, expected, preferred):
+    blank = values.isin(BLANK_VALUES)
+    matched = ~blank & (values == expected)
+    result = np.select([~preferred, blank, matched], [NOT_PREFERRED, NOT_AVAILABLE, MATCHED], NOT_MATCHED + values)
+    return result, matched
+
+
+# Function to return the classifier of the rows of airlines with a departure cut-off, the period prefix followed by the
+# booking class. As in savings_classifier, every character of a booking class makes one classifier and the classifiers are
+# handed to the airline's rows in order, so a multi-character class shifts the classifiers of the airline's later rows.
+# In a chunked run, carried holds the classifiers of every airline not handed out by the earlier chunks, they go to the
+# airline's first rows in the chunk so the chunks give the rows of the whole file. An empty booking class is refused when
+# its chunk runs short of classifiers, even if a later chunk would have made up for it
+def cutoff_references(prefix, booking_class, airline, has_cutoff, carried=None):
+    carried = {} if carried is None else carried
+    references = (prefix + booking_class).to_numpy(dtype=object)
+    if not carried and (booking_class[has_cutoff].str.len() == 1).all():
+        return references
+    for name in airline[has_cutoff].unique():
+        rows = np.flatnonzero((airline == name).to_numpy() & has_cutoff)
+        shifted = carried.pop(name, []) + [prefix.iloc[row] + character for row in rows for character in booking_class.iloc[row]]
+        if len(shifted) < len(rows):
+            raise ValueError("{} rows have empty booking class codes, their contract classifier cannot be determined".format(name))
+        references[rows] = shifted[:len(rows)]
+        if len(shifted) > len(rows):
+            carried[name] = shifted[len(rows):]
+    return references
+
+
+# Function which determines contract classifier, tour code / ticket designator checks and discount for all preferred airlines in one pass.
+# carried is shared by the chunks of a run, see cutoff_references
+def classify_contracts(df, codes, cutoffs, discounts, carried=None):
+    airline = df["Savings Alliance Classification"]
+    preferred = airline.isin(list(codes)).to_numpy()
+
+    # Savings contract classifier: departure cut-off and booking class, or the CTV reference
+    cutoff = pd.to_datetime(airline.map(cutoffs))
+    has_cutoff = cutoff.notna().to_numpy() & preferred
+    # The departure date is compared as text ("2019-04-30 00:00:00") with the config.json date ("05/01/2019"), as
+    # savings_classifier always did, so every row is "Post". Comparing the dates would change delivered discounts
+    departure_text = df["Departure Date"].map(str)
+    cutoff_text = format_dates(cutoff, "%m/%d/%Y").fillna("")
+    period = np.where(departure_text <= cutoff_text, "Pre ", "Post ")
+    period_label = format_dates(cutoff, "%b %Y").fillna("")
+    booking_class = df["CTV_Booking Class Code"].astype(str)
+    cutoff_classifier = cutoff_references(period + period_label + "-", booking_class, airline, has_cutoff, carried)
+    classifier = np.select([has_cutoff, preferred], [cutoff_classifier, df["CTV_Reference"].astype(str)], NOT_PREFERRED)
+    df["Savings Contract Classifier"] = classifier
+
+    # Tour code and ticket designator checks against the contract codes
+    tour_code = airline.map({k: v[0] for k, v in codes.items()})
+    ticket_designator = airline.map({k: v[1] for k, v in codes.items()})
+    df["Contract Classifier Tour Code"], tour_code_matched = check_code(df["Tour Code"].astype(str), tour_code, preferred)
+    df["Contract Classifier Ticket Designator"], ticket_designator_matched = check_code(df["Ticket Designator"].astype(str), ticket_designator, preferred)
+    discount_applied = (tour_code_matched | ticket_designator_matched).to_numpy()
+    df["If Discount Applied"] = np.where(discount_applied, "Y", "N")
+
+    # Discount from the group mappings, missing references are flagged with MISSING_DISCOUNT
+    classifier = pd.Series(classifier, index=df.index)
+    reference_discount = np.where(classifier.isin(discounts.index), classifier.map(discounts), MISSING_DISCOUNT)
+    df["Discount"] = np.where(discount_applied, reference_discount, 0.0).astype(float)
+    return df
@@ -0,0 +1,208 @@
+from django.db import connection
+from django.utils import timezone
+
+from .loaders import FACT_TABLE
+from jobs.models import Job
+
+import datetime
+import threading
+import numpy as np
+import pandas as pd
+
+# Cube dimensions and the SQL expression of each over air_facttable joined with its carrier and alliance
+DIMENSION_SQL = {
+    "client_name": "f.client_name",
+    "data_receive_quarter": "f.data_receive_quarter",
+    "carrier_name": "a.carrier_name",
+    "alliance_name": "al.alliance_name",
+    "route": "f.origin_airport_code_id || '-' || f.destination_airport_code_id",
+}
+# Measures, rounded per segment like the Pre-Discount Cost and Savings columns of the final data
+MEASURE_SQL = {
+    "segments": "count(*)",
+    "pre_discount": "sum(round((f.fare / (1 - f.discount))::numeric, 2))",
+    "actual_spend": "sum(f.fare::numeric)",
+    "savings": "sum(round(round((f.fare / (1 - f.discount))::numeric, 2) - f.fare::numeric, 2))",
+}
+CUBE_DIMENSIONS = list(DIMENSION_SQL)
+CUBE_MEASURES = list(MEASURE_SQL)
+# Roll-ups over fewer possible groups than this are summed into a dense array, larger ones are grouped with np.unique
+DENSE_LIMIT = 65536
+# Jobs which finish while the cube is syncing may commit a moment later, so recent jobs are looked at again
+SYNC_OVERLAP = datetime.timedelta(minutes=5)
+
+
+# Function to return the SQL GROUP BY query over air_facttable for the given dimensions and filters
+def group_by_sql(group_by, filters=None):
+    conditions, params = [], []
+    for dimension, values in (filters or {}).items():
+        conditions.append("{} = ANY(%s)".format(DIMENSION_SQL[dimension]))
+        params.append(list(values))
+    query = """
+        SELECT {columns}
+        FROM {fact_table} AS f
+        JOIN air_airline AS a ON a.carrier_code = f.carrier_code_id
+        JOIN air_alliance AS al ON al.alliance_id = a.carrier_alliance_id
+        {where} {group}
+    """.format(columns=", ".join([DIMENSION_SQL[dimension] for dimension in group_by] + list(MEASURE_SQL.values())),
+               fact_table=FACT_TABLE,
+               where="WHERE " + " AND ".join(conditions) if conditions else "",
+               group="GROUP BY " + ", ".join(str(i + 1) for i in range(len(group_by))) if group_by else "")
+    return query, params
+
+
+# Dictionary encoding of one dimension, values get consecutive integer codes in the order they are first seen
+class Dimension:
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    # Function to return the codes of an iterable of values, adding unseen values to the dictionary
+    def encode(self, values):
+        codes = self.codes
+        for value in values:
+            if value not in codes:
+                codes[value] = len(self.values)
+                self.values.append(value)
+        return np.fromiter((codes[value] for value in values), dtype=np.int32)
+
+    # Function to return the codes of the known values among the given ones
+    def lookup(self, values):
+        return np.array([self.codes[value] for value in values if value in self.codes], dtype=np.int32)
+
+    # Function to return the values of an array of codes
+    def decode(self, codes):
+        return np.array(self.values, dtype=object)[codes]
+
+
+# Savings cube held in memory: one cell per client x quarter x carrier x alliance x route with its summed measures.
+# Cells are stored sparse, as a (dimensions x cells) array of dictionary codes next to a (measures x cells) array, so every
+# dimension and measure is one contiguous row.
+class SavingsCube:
+
+    def __init__(self):
+        self.dimensions = {dimension: Dimension() for dimension in CUBE_DIMENSIONS}
+        self.coords = np.empty((len(CUBE_DIMENSIONS), 0), dtype=np.int32)
+        self.measures = np.empty((len(CUBE_MEASURES), 0), dtype=np.float64)
+
+    # Function to build the cube from air_facttable
+    @classmethod
+    def build(cls):
+        cube = cls()
+        cube.load()
+        return cube
+
+    # Function to aggregate facts matching the filters into cells and add them to the cube
+    def load(self, filters=None):
+        query, params = group_by_sql(CUBE_DIMENSIONS, filters)
+        with connection.cursor() as cursor:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        self.add_cells(rows)
+        return len(rows)
+
+    # Function to add cells given as rows of dimension values followed by measures
+    def add_cells(self, rows):
+        if not rows:
+            return
+        columns = list(zip(*rows))
+        coords = np.vstack([self.dimensions[dimension].encode(columns[i]) for i, dimension in enumerate(CUBE_DIMENSIONS)])
+        measures = np.array(columns[len(CUBE_DIMENSIONS):], dtype=np.float64)
+        self.coords = np.concatenate([self.coords, coords], axis=1)
+        self.measures = np.concatenate([self.measures, measures], axis=1)
+
+    # Function to return the mask of cells matching every filter, filters map a dimension to the values to keep
+    def mask(self, filters=None):
+        mask = np.ones(len(self), dtype=bool)
+        for dimension, values in (filters or {}).items():
+            row = CUBE_DIMENSIONS.index(dimension)
+            mask &= np.isin(self.coords[row], self.dimensions[dimension].lookup(values))
+        return mask
+
+    # Function to replace the cells of a client's quarters (all its quarters when None) after that client quarter was loaded
+    def update_client_quarters(self, client_name, quarters=None):
+        filters = {"client_name": [client_name]}
+        if quarters is not None:
+            filters["data_receive_quarter"] = quarters
+        keep = ~self.mask(filters)
+        self.coords, self.measures = self.coords[:, keep], self.measures[:, keep]
+        return self.load(filters)
+
+    # Function to roll up the cells matching the filters to the group_by dimensions, returns the group codes (groups x dimensions)
+    # and summed measures (groups x measures) as arrays. An empty group_by returns the grand total, more dimensions drill down
+    def rollup(self, group_by=(), filters=None):
+        mask = self.mask(filters) if filters else slice(None)
+        measures = self.measures[:, mask]
+        if not group_by:
+            return np.empty((1, 0), dtype=np.int64), measures.sum(axis=1)[np.newaxis]
+        if not measures.shape[1]:
+            return np.empty((0, len(group_by)), dtype=np.int64), np.empty((0, len(CUBE_MEASURES)))
+        coords = [self.coords[CUBE_DIMENSIONS.index(dimension)][mask] for dimension in group_by]
+        sizes = tuple(len(self.dimensions[dimension].values) for dimension in group_by)
+        keys = np.ravel_multi_index(coords, sizes) if len(group_by) > 1 else coords[0]
+        cells = int(np.prod(sizes, dtype=np.int64))
+        if cells <= DENSE_LIMIT:
+            present = np.flatnonzero(np.bincount(keys, minlength=cells))
+            sums = np.column_stack([np.bincount(keys, weights=row, minlength=cells)[present] for row in measures])
+        else:
+            present, inverse = np.unique(keys, return_inverse=True)
+            sums = np.column_stack([np.bincount(inverse.reshape(-1), weights=row, minlength=len(present)) for row in measures])
+        return np.column_stack(np.unravel_index(present, sizes)), sums
+
+    # Function to return a roll-up as a frame of the group values and their measures with net savings
+    def query(self, group_by=(), filters=None):
+        group_by = list(group_by)
+        group_coords, sums = self.rollup(group_by, filters)
+        df = pd.DataFrame(sums, columns=CUBE_MEASURES)
+        for i, dimension in reversed(list(enumerate(group_by))):
+            df.insert(0, dimension, self.dimensions[dimension].decode(group_coords[:, i]))
+        df["segments"] = df["segments"].astype(int)
+        pre_discount = df["pre_discount"].where(df["pre_discount"] != 0)
+        df["net_savings"] = (df["savings"] / pre_discount * 100).fillna(0.0).round(2)
+        return df
+
+    # Function to return the number of cells
+    def __len__(self):
+        return self.coords.shape[1]
+
+
+# Process-wide savings cube, built on first use and updated from the air loads which finished since the last sync
+class SavingsCubeCache:
+
+    def __init__(self):
+        self.cube = None
+        self.synced_at = None
+        # Jobs applied within the sync overlap, by id with their finish time
+        self.applied_jobs = {}
+        self.lock = threading.Lock()
+
+    # Function to return the cube, applying air loads which finished since the last call
+    def get(self):
+        with self.lock:
+            now = timezone.now()
+            if self.cube is None:
+                self.cube = SavingsCube.build()
+            else:
+                jobs = (Job.objects.filter(kind="air.process_data", status=Job.SUCCEEDED, finished_at__gt=self.synced_at - SYNC_OVERLAP)
+                        .exclude(id__in=list(self.applied_jobs)).order_by("finished_at"))
+                for job in jobs:
+                    self.cube.update_client_quarters(job.params["customer_name"], (job.result or {}).get("quarters"))
+                    self.applied_jobs[job.id] = job.finished_at
+            self.synced_at = now
+            self.applied_jobs = {id: finished_at for id, finished_at in self.applied_jobs.items() if finished_at > now - 2 * SYNC_OVERLAP}
+            return self.cube
+
+    # Function to drop the cube, it is rebuilt on the next call to get
+    def invalidate(self):
+        with self.lock:
+            self.cube = None
+            self.applied_jobs = {}
+
+
+savings_cube_cache = SavingsCubeCache()
+
+
+# Function to return the process-wide savings cube
+def savings_cube():
+    return savings_cube_cache.get()
@@ -0,0 +1,46 @@
+from .models import Airline, Airport, Alliance
+
+import pandas as pd
+
+# Reference columns checked for unresolved codes: (source column, resolved column)
+REFERENCE_CHECKS = [
+    ("Carrier Code", "Carrier Name"),
+    ("Origin Airport Code", "CTV_Origin_Airport_Id"),
+    ("Destination Airport Code", "CTV_Destination_Airport_Id"),
+    ("CTV_Alliance_ID", "Savings Alliance Classification"),
+]
+
+
+# Function to build indexed lookup frames from the Airline, Airport and Alliance tables
+def reference_lookups():
+    airline_fields = ["carrier_code", "carrier_id", "carrier_name", "carrier_alliance_id"]
+    airport_fields = ["airport_code", "airport_id"]
+    alliance_fields = ["alliance_id", "alliance_name"]
+    airlines = pd.DataFrame.from_records(Airline.objects.values(*airline_fields), columns=airline_fields).set_index("carrier_code")
+    airports = pd.DataFrame.from_records(Airport.objects.values(*airport_fields), columns=airport_fields).set_index("airport_code")
+    alliances = pd.DataFrame.from_records(Alliance.objects.values(*alliance_fields), columns=alliance_fields).set_index("alliance_id")
+    return airlines, airports, alliances
+
+
+# Function to resolve carrier, airport and alliance columns with indexed lookups
+def enrich_references(df, airlines, airports, alliances):
+    df["Carrier Name"] = df["Carrier Code"].map(airlines["carrier_name"])
+    df["CTV_Origin_Airport_Id"] = df["Origin Airport Code"].map(airports["airport_id"]).astype("Int64")
+    df["CTV_Destination_Airport_Id"] = df["Destination Airport Code"].map(airports["airport_id"]).astype("Int64")
+    df["CTV_Carrier_Id"] = df["Carrier Code"].map(airlines["carrier_id"]).astype("Int64")
+    df["CTV_Alliance_ID"] = df["Carrier Code"].map(airlines["carrier_alliance_id"]).astype("Int64")
+    df["Savings Alliance Classification"] = df["CTV_Alliance_ID"].map(alliances["alliance_name"])
+    return df
+
+
+# Function to report codes which could not be resolved against the reference tables
+def unresolved_references(df):
+    report = []
+    for source, resolved in REFERENCE_CHECKS:
+        missing = df[resolved].isna()
+        if source == "CTV_Alliance_ID":
+            # Rows without an alliance id are already reported as unresolved carriers
+            missing &= df[source].notna()
+        counts = df.loc[missing, source].astype(str).value_counts()
+        report.extend((source, code, rows) for code, rows in counts.items())
+    return pd.DataFrame(report, columns=["Column", "Code", "Rows"])
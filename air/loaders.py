@@ -0,0 +1,76 @@
+from django.core.exceptions import ValidationError
+
+import tempfile
+import pandas as pd
+from psycopg2 import sql
+
+FACT_TABLE = "air_facttable"
+MISSING_DISCOUNT = 99999.9
+# Columns which identify a flight segment, hashed with the segment's position among rows with the same key into row_fingerprint
+FINGERPRINT_COLUMNS = ["client_name", "pnr_locator", "invoice_number", "departure_date", "carrier_code_id", "origin_airport_code_id", "destination_airport_code_id"]
+
+
+# Function to return the number of fact rows whose reference code has no discount
+def missing_discount_rows(db_df):
+    return int((db_df["discount"] == MISSING_DISCOUNT).sum())
+
+
+# Function to stop a load when any fact row is missing its discount
+def check_missing_discounts(missing_rows):
+    if missing_rows:
+        raise ValidationError("Reference code is available but Discount is not applied for {} row(s). Please check".format(missing_rows))
+
+
+# Function to return the travel quarters (air_facttable partitions) of the departure dates in a frame of fact rows
+def travel_quarters(db_df):
+    return set(pd.to_datetime(db_df["departure_date"], format="%m/%d/%Y").dt.to_period("Q").dropna().unique())
+
+
+# Spools the fact rows of a chunked run to a temporary CSV file, so the run can be validated in full before anything is loaded
+class FactRowSpool:
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.file = tempfile.TemporaryFile("w+", newline="")
+        self.rows = 0
+        self.missing_rows = 0
+        self.quarters = set()
+
+    # Function to add a chunk of fact rows to the spool
+    def append(self, db_df):
+        self.missing_rows += missing_discount_rows(db_df)
+        self.quarters.update(travel_quarters(db_df))
+        db_df.to_csv(self.file, index=False, header=False, na_rep="")
+        self.rows += len(db_df.index)
+
+    # Function to validate every spooled row before anything is written to the database
+    def validate(self):
+        check_missing_discounts(self.missing_rows)
+
+    # Function to stream the spooled rows into a table with COPY FROM STDIN
+    def copy_to(self, cursor, table=FACT_TABLE):
+        self.file.seek(0)
+        cursor.copy_expert("COPY {0} ({1}) FROM STDIN WITH (FORMAT csv)".format(table, ','.join(self.columns)), self.file)
+
+    def close(self):
+        self.file.close()
+
+
+# Function to return the SQL expression computing row_fingerprint, segments with the same key are numbered in the order of their other columns
+def fingerprint_sql(columns):
+    key = sql.SQL(", ").join(sql.SQL("coalesce({}::text, '')").format(sql.Identifier(column)) for column in FINGERPRINT_COLUMNS)
+    order = sql.SQL(", ").join(sql.Identifier(column) for column in columns if column not in FINGERPRINT_COLUMNS)
+    return sql.SQL("md5(concat_ws('|', {}, row_number() OVER (PARTITION BY {} ORDER BY {})))").format(
+        key, sql.SQL(", ").join(map(sql.Identifier, FINGERPRINT_COLUMNS)), order)
+
+
+# Function to copy a spool into the temporary table fact_stage, adding the row fingerprint of every row
+def stage_fact_spool(cursor, spool, table=FACT_TABLE):
+    columns = sql.SQL(",").join(map(sql.Identifier, spool.columns))
+    cursor.execute(sql.SQL("CREATE TEMP TABLE fact_load ON COMMIT DROP AS SELECT {} FROM {} WITH NO DATA").format(columns, sql.Identifier(table)))
+    spool.copy_to(cursor, "fact_load")
+    cursor.execute(sql.SQL("CREATE TEMP TABLE fact_stage ON COMMIT DROP AS SELECT {}, {} AS row_fingerprint FROM fact_load").format(
+        columns, fingerprint_sql(spool.columns)))
+    cursor.execute("CREATE INDEX ON fact_stage (row_fingerprint)")
+    cursor.execute("ANALYZE fact_stage")
+    return spool.columns + ["row_fingerprint"]
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from air.models import Airline
+from CPR.db_pool import ConnectionPool
+
+import statistics
+import time
+import psycopg2
+
+
+class Command(BaseCommand):
+    help = "Compares the database connection overhead of a pipeline request: a separate psycopg2 connection next to a per-request ORM connection, against the shared pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="Number of simulated requests per mode")
+
+    # Function which reproduces the original request: the ORM connects for the lookups, the load opens its own connection, both are closed
+    def separate_connections(self):
+        Airline.objects.exists()
+        conn = psycopg2.connect(**connection.get_connection_params())
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+        finally:
+            conn.close()
+        connection.close()
+
+    # Function which runs the same request on the pooled connection shared with the ORM
+    def pooled_connection(self, pool):
+        with pool.connection() as conn:
+            Airline.objects.exists()
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+
+    # Function to time a request function, returns the per-request times in milliseconds
+    def time_requests(self, request, count):
+        timings = []
+        for _ in range(count):
+            start = time.perf_counter()
+            request()
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
+
+    def handle(self, *args, **options):
+        count = options["requests"]
+        connection.close()
+        pool = ConnectionPool()
+        modes = [("separate connections", self.separate_connections), ("shared pool", lambda: self.pooled_connection(pool))]
+        for name, request in modes:
+            timings = self.time_requests(request, count)
+            self.stdout.write("{:<21} {:>6} requests  mean {:>8.2f} ms  median {:>8.2f} ms  max {:>8.2f} ms".format(
+                name, count, statistics.mean(timings), statistics.median(timings), max(timings)))
+        self.stdout.write("Pool usage: %s" % pool.stats())
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from air.cube import SavingsCube, group_by_sql
+
+import time
+
+
+class Command(BaseCommand):
+    help = ("Builds the in-memory savings cube from air_facttable and times roll-up, drill-down and filter queries on it "
+            "against the equivalent SQL GROUP BY queries.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=20, help="Times each cube query is run, the best time is reported")
+
+    # Function to return the roll-up, drill-down and filter queries to compare, with filters taken from the largest values
+    def queries(self, cube):
+        clients = cube.query(["client_name"]).sort_values("segments", ascending=False)["client_name"].tolist()
+        carriers = cube.query(["carrier_name"]).sort_values("segments", ascending=False)["carrier_name"].tolist()
+        client = {"client_name": clients[:1]}
+        return [
+            ("grand total", [], None),
+            ("roll-up by client", ["client_name"], None),
+            ("roll-up by alliance", ["alliance_name"], None),
+            ("drill-down client > quarter", ["client_name", "data_receive_quarter"], None),
+            ("drill-down client > quarter > carrier", ["client_name", "data_receive_quarter", "carrier_name"], None),
+            ("client routes", ["route"], client),
+            ("client carriers by quarter", ["data_receive_quarter", "carrier_name"], client),
+            ("top carriers by client", ["client_name"], {"carrier_name": carriers[:3]}),
+        ]
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        cube = SavingsCube.build()
+        build_seconds = time.perf_counter() - start
+        if not len(cube):
+            raise CommandError("air_facttable is empty, load data before benchmarking the cube.")
+        self.stdout.write("Cube built with {} cells in {:.2f} s".format(len(cube), build_seconds))
+        self.stdout.write("{:<40} {:>8} {:>12} {:>12} {:>10}".format("query", "groups", "cube us", "SQL ms", "speed-up"))
+        mismatches = []
+        with connection.cursor() as cursor:
+            for name, group_by, filters in self.queries(cube):
+                cube_seconds = None
+                for _ in range(options["repeat"]):
+                    start = time.perf_counter()
+                    cube.rollup(group_by, filters)
+                    elapsed = time.perf_counter() - start
+                    cube_seconds = elapsed if cube_seconds is None else min(cube_seconds, elapsed)
+                result = cube.query(group_by, filters)
+                query, params = group_by_sql(group_by, filters)
+                start = time.perf_counter()
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+                sql_seconds = time.perf_counter() - start
+                if len(rows) != len(result) or sum(row[len(group_by)] for row in rows) != result["segments"].sum():
+                    mismatches.append(name)
+                self.stdout.write("{:<40} {:>8} {:>12.1f} {:>12.2f} {:>9.0f}x".format(
+                    name, len(result), cube_seconds * 1e6, sql_seconds * 1e3, sql_seconds / max(cube_seconds, 1e-9)))
+        if mismatches:
+            raise CommandError("Cube results differ from SQL for: %s" % ", ".join(mismatches))
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from air.synthetic import synthetic_fact_rows
+from air.loaders import FACT_TABLE, FactRowSpool, travel_quarters
+from air.partitions import ensure_quarter_partitions
+from CPR.db_pool import db_pool
+
+import psycopg2.extras as extras
+import time
+
+INSERT_PAGE_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = ("Compares air_facttable load throughput of per-row and batched INSERT with the COPY of the pipeline, which spools the "
+            "fact rows to a CSV file and streams it with FactRowSpool.copy_to. Every run is rolled back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10000, help="Number of synthetic fact rows to load")
+        parser.add_argument("--skip-per-row", action="store_true", help="Skip the per-row INSERT path (slow on large row counts)")
+
+    # Function which reproduces the original one-statement-per-row load
+    def insert_per_row(self, conn, db_df):
+        cols = ','.join(db_df.columns.to_list())
+        for x in db_df.to_numpy():
+            query = "INSERT INTO {0} ({1}) VALUES {2}".format(FACT_TABLE, cols, tuple(x.tolist()))
+            cursor = conn.cursor()
+            cursor.execute(query)
+            cursor.close()
+        return len(db_df.index)
+
+    # Function which loads the rows with batched multi-row INSERT statements
+    def insert_batched(self, conn, db_df):
+        query = "INSERT INTO {0} ({1}) VALUES %s".format(FACT_TABLE, ','.join(db_df.columns.to_list()))
+        rows = db_df.astype(object).where(db_df.notna(), None).itertuples(index=False, name=None)
+        with conn.cursor() as cursor:
+            extras.execute_values(cursor, query, rows, page_size=INSERT_PAGE_SIZE)
+        return len(db_df.index)
+
+    # Function which loads the rows the way the pipeline does: spooled to a CSV file, then streamed with COPY FROM STDIN
+    def copy_spool(self, conn, db_df):
+        spool = FactRowSpool(db_df.columns)
+        spool.append(db_df)
+        with conn.cursor() as cursor:
+            spool.copy_to(cursor)
+        spool.close()
+        return spool.rows
+
+    def handle(self, *args, **options):
+        db_df = synthetic_fact_rows(options["rows"])
+        paths = [("per-row INSERT", self.insert_per_row), ("batched INSERT", self.insert_batched), ("spool + COPY", self.copy_spool)]
+        if options["skip_per_row"]:
+            paths = paths[1:]
+        with db_pool.connection() as conn:
+            ensure_quarter_partitions(conn, travel_quarters(db_df), db_df["client_name"].unique())
+            for name, load in paths:
+                with transaction.atomic():
+                    start = time.perf_counter()
+                    loaded = load(conn, db_df)
+                    elapsed = time.perf_counter() - start
+                    transaction.set_rollback(True)
+                self.stdout.write("{:<16} {:>9} rows {:>9.2f} s {:>12,.0f} rows/s".format(name, loaded, elapsed, loaded / elapsed))
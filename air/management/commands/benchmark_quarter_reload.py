@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from air.synthetic import synthetic_fact_rows
+from air.loaders import FACT_TABLE, FactRowSpool
+from air.partitions import ensure_quarter_partitions, load_scope, partition_name, replace_client_quarters, table_exists
+from CPR.db_pool import db_pool
+
+from psycopg2 import sql
+import time
+import pandas as pd
+
+# Point of sale of the synthetic fact rows
+POINT_OF_SALE = "US"
+
+
+class Command(BaseCommand):
+    help = ("Compares reloading one client quarter of air_facttable with DELETE + COPY (and the VACUUM it needs) against "
+            "swapping in a rebuilt client sub-partition. Uses a quarter far in the future which is dropped afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=50000, help="Rows of the reloaded client")
+        parser.add_argument("--other-rows", type=int, default=200000, help="Rows of other clients in the same quarter")
+        parser.add_argument("--quarter", default="2099-07-01", help="First day of the benchmark quarter, must not hold real data")
+
+    # Function to return a spool holding the given fact rows
+    def spool(self, db_df):
+        spool = FactRowSpool(db_df.columns)
+        spool.append(db_df)
+        return spool
+
+    # Function which reproduces a reload without partitions: delete the client's quarter, load it again, vacuum the dead rows
+    def delete_and_copy(self, conn, spool, client_name, quarter):
+        with conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql.SQL("DELETE FROM {} WHERE {}").format(
+                    sql.Identifier(FACT_TABLE), load_scope(client_name, POINT_OF_SALE, [quarter])))
+                spool.copy_to(cursor)
+        with conn.cursor() as cursor:
+            cursor.execute(sql.SQL("VACUUM {}").format(sql.Identifier(partition_name(quarter))))
+
+    def handle(self, *args, **options):
+        quarter = pd.Period(options["quarter"], freq="Q")
+        name = partition_name(quarter)
+        client_name, other_client_name = "Benchmark Reload Client", "Benchmark Other Client"
+        client_rows = synthetic_fact_rows(options["rows"], client_name, seed=1, quarter_start=options["quarter"])
+        other_rows = synthetic_fact_rows(options["other_rows"], other_client_name, seed=2, quarter_start=options["quarter"])
+        with db_pool.connection() as conn:
+            with conn.cursor() as cursor:
+                if table_exists(cursor, name):
+                    raise CommandError("%s already exists, choose a --quarter without data." % name)
+            try:
+                ensure_quarter_partitions(conn, [quarter], [client_name, other_client_name])
+                replace_client_quarters(conn, self.spool(other_rows), other_client_name, POINT_OF_SALE)
+                replace_client_quarters(conn, self.spool(client_rows), client_name, POINT_OF_SALE)
+                modes = [("DELETE + COPY + VACUUM", lambda spool: self.delete_and_copy(conn, spool, client_name, quarter)),
+                         ("partition swap", lambda spool: replace_client_quarters(conn, spool, client_name, POINT_OF_SALE))]
+                for mode, reload in modes:
+                    spool = self.spool(client_rows)
+                    start = time.perf_counter()
+                    reload(spool)
+                    elapsed = time.perf_counter() - start
+                    spool.close()
+                    self.stdout.write("{:<24} {:>9} client rows next to {:>9} other rows {:>9.2f} s".format(mode, options["rows"], options["other_rows"], elapsed))
+            finally:
+                with conn:
+                    with conn.cursor() as cursor:
+                        if table_exists(cursor, name):
+                            cursor.execute(sql.SQL("ALTER TABLE {} DETACH PARTITION {}").format(sql.Identifier(FACT_TABLE), sql.Identifier(name)))
+                            cursor.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(name)))
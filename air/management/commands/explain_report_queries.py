@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from air.report_queries import REPORT_QUERIES, report_query_params
+from CPR.settings.base import BASE_DIR
+
+from pathlib import Path
+import json
+
+BASELINE_PATH = Path(BASE_DIR, "air", "report_queries_baseline.json")
+
+
+class Command(BaseCommand):
+    help = ("Runs EXPLAIN ANALYZE for the savings report queries and fails when a query stops using its index, scans air_facttable "
+            "sequentially or gets slower than its baseline. Run it against a production-sized copy of the table.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--record", action="store_true", help="Write the current plans and timings as the new baseline")
+        parser.add_argument("--baseline", default=str(BASELINE_PATH), help="Baseline file to compare with or record to")
+        parser.add_argument("--tolerance", type=float, default=2.0, help="Allowed slowdown against the baseline execution time")
+
+    # Function to return every node of an EXPLAIN (FORMAT JSON) plan
+    def plan_nodes(self, plan):
+        yield plan
+        for child in plan.get("Plans", []):
+            yield from self.plan_nodes(child)
+
+    # Function to run EXPLAIN ANALYZE for one query, returns its execution time, indexes used and sequentially scanned tables
+    def explain(self, cursor, query, params):
+        cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query["sql"], params)
+        result = cursor.fetchone()[0]
+        explain = (json.loads(result) if isinstance(result, str) else result)[0]
+        nodes = list(self.plan_nodes(explain["Plan"]))
+        return {
+            "execution_ms": round(explain["Execution Time"], 3),
+            "indexes": sorted({node["Index Name"] for node in nodes if "Index Name" in node}),
+            "seq_scans": sorted({node["Relation Name"] for node in nodes if node["Node Type"] == "Seq Scan"}),
+        }
+
+    # Function to return the regressions of one query against its expected index and baseline
+    def regressions(self, query, plan, baseline, tolerance):
+        problems = []
+        if query["index"] not in plan["indexes"]:
+            problems.append("does not use %s" % query["index"])
+        if "air_facttable" in plan["seq_scans"]:
+            problems.append("sequential scan on air_facttable")
+        baseline_ms = baseline.get("execution_ms")
+        if baseline_ms and plan["execution_ms"] > baseline_ms * tolerance:
+            problems.append("%.1f ms against a %.1f ms baseline" % (plan["execution_ms"], baseline_ms))
+        return problems
+
+    def handle(self, *args, **options):
+        params = report_query_params()
+        if params is None:
+            raise CommandError("air_facttable is empty, load data before explaining the report queries.")
+        baseline_path = Path(options["baseline"])
+        baselines = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+        plans, failures = {}, []
+        with connection.cursor() as cursor:
+            for query in REPORT_QUERIES:
+                plan = self.explain(cursor, query, params)
+                plans[query["name"]] = plan
+                problems = self.regressions(query, plan, baselines.get(query["name"], {}), options["tolerance"])
+                status = "REGRESSION: " + "; ".join(problems) if problems else "ok"
+                self.stdout.write("{:<34} {:>10.2f} ms  {:<40} {}".format(query["name"], plan["execution_ms"], ",".join(plan["indexes"]) or "-", status))
+                if problems:
+                    failures.append(query["name"])
+        if options["record"]:
+            baseline_path.write_text(json.dumps(plans, indent=4) + "\n")
+            self.stdout.write("Baseline written to %s" % baseline_path)
+        elif failures:
+            raise CommandError("Report query regressions: %s" % ", ".join(failures))
@@ -0,0 +1,55 @@
+import hashlib
+import io
+import threading
+import pandas as pd
+
+
+# Function to build the Reference -> Discount index from the group mappings (first mapping wins)
+def discount_index(group):
+    return group.drop_duplicates("Reference").set_index("Reference")["Discount"]
+
+
+# Process-level cache of parsed group mapping workbooks, keyed on path and invalidated when the file's content changes.
+# Reading and hashing a workbook takes milliseconds, parsing it seconds. Callers get copies, the cached frames are never shared
+class GroupMappingCache:
+
+    def __init__(self):
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    # Function to return the group mappings and their Reference -> Discount index, parsing the workbook only when it changed.
+    # The version of a workbook is the hash of its content, a rewrite keeping the size or modification time is still seen
+    def get(self, path):
+        path = str(path)
+        with open(path, "rb") as f:
+            content = f.read()
+        version = hashlib.sha1(content).hexdigest()
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry[0] == version:
+                self.hits += 1
+                return entry[1].copy(), entry[2].copy()
+            self.misses += 1
+        group = pd.concat(pd.read_excel(io.BytesIO(content), sheet_name=None), ignore_index=True)
+        discounts = discount_index(group)
+        with self.lock:
+            self.entries[path] = (version, group, discounts)
+        return group.copy(), discounts.copy()
+
+    # Function to drop one workbook, or every workbook, from the cache
+    def invalidate(self, path=None):
+        with self.lock:
+            if path is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(str(path), None)
+
+    # Function to return cache hit / miss counters
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries)}
+
+
+group_mapping_cache = GroupMappingCache()
@@ -0,0 +1,64 @@
+from .loaders import FACT_TABLE, fingerprint_sql, stage_fact_spool
+from .partitions import load_scope
+
+from psycopg2 import sql
+
+
+# Function to compute the fingerprints of the rows in the merge scope when any of them is missing one, with the
+# expression the staged rows get. Segments with the same key are numbered together, so every row in scope is recomputed.
+# Returns the number of rows whose fingerprint changed
+def backfill_fingerprints(cursor, spool, scope, target):
+    cursor.execute(sql.SQL("SELECT EXISTS (SELECT 1 FROM {target} AS t WHERE {scope} AND t.row_fingerprint IS NULL)").format(
+        target=target, scope=scope))
+    if not cursor.fetchone()[0]:
+        return 0
+    cursor.execute(sql.SQL("""
+        UPDATE {target} AS u SET row_fingerprint = f.row_fingerprint
+        FROM (SELECT t.id, t.departure_date, {fingerprint} AS row_fingerprint FROM {target} AS t WHERE {scope}) AS f
+        WHERE u.id = f.id AND u.departure_date = f.departure_date AND u.row_fingerprint IS DISTINCT FROM f.row_fingerprint
+    """).format(target=target, fingerprint=fingerprint_sql(spool.columns), scope=scope))
+    return cursor.rowcount
+
+
+# Function to merge a spool into the rows of the client and point of sale (the file's country) in the spool's travel quarters,
+# matching rows on row_fingerprint. Unchanged rows are left alone, changed rows updated, new rows inserted and rows missing
+# from the spool deleted, so loading the same file again changes nothing and the client's files of other countries are not
+# touched. Rows written without a fingerprint (by another loader) get one first, so they are matched like any other row
+# instead of deleted. Returns the number of rows in each bucket.
+def merge_client_quarters(conn, spool, client_name, point_of_sale, table=FACT_TABLE):
+    spool.validate()
+    if not spool.rows:
+        return {"inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0, "backfilled": 0}
+    target = sql.Identifier(table)
+    scope = load_scope(client_name, point_of_sale, spool.quarters, "t")
+    with conn:
+        with conn.cursor() as cursor:
+            stage_columns = stage_fact_spool(cursor, spool, table)
+            columns = sql.SQL(", ").join(map(sql.Identifier, stage_columns))
+            values = [column for column in stage_columns if column != "row_fingerprint"]
+            backfilled = backfill_fingerprints(cursor, spool, scope, target)
+
+            cursor.execute(sql.SQL("""
+                UPDATE {target} AS t SET ({columns}) = ({staged})
+                FROM fact_stage AS s
+                WHERE {scope} AND t.row_fingerprint = s.row_fingerprint AND ({current}) IS DISTINCT FROM ({staged_values})
+            """).format(target=target, columns=sql.SQL(", ").join(map(sql.Identifier, values)),
+                        staged=sql.SQL(", ").join(sql.Identifier("s", column) for column in values), scope=scope,
+                        current=sql.SQL(", ").join(sql.Identifier("t", column) for column in values),
+                        staged_values=sql.SQL(", ").join(sql.Identifier("s", column) for column in values)))
+            updated = cursor.rowcount
+
+            cursor.execute(sql.SQL("""
+                DELETE FROM {target} AS t
+                WHERE {scope} AND NOT EXISTS (SELECT 1 FROM fact_stage AS s WHERE s.row_fingerprint = t.row_fingerprint)
+            """).format(target=target, scope=scope))
+            deleted = cursor.rowcount
+
+            cursor.execute(sql.SQL("""
+                INSERT INTO {target} ({columns})
+                SELECT {columns} FROM fact_stage AS s
+                WHERE NOT EXISTS (SELECT 1 FROM {target} AS t WHERE {scope} AND t.row_fingerprint = s.row_fingerprint)
+            """).format(target=target, columns=columns, scope=scope))
+            inserted = cursor.rowcount
+    return {"inserted": inserted, "updated": updated, "unchanged": spool.rows - inserted - updated, "deleted": deleted,
+            "backfilled": backfilled}
@@ -0,0 +1,52 @@
+# Generated by Django 4.1.1 on 2026-10-18 09:52
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    # Indexes are built concurrently so loads and reports keep running, the FK indexes are dropped once the composites exist
+    atomic = False
+
+    dependencies = [
+        ('air', '0002_facttable'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='facttable',
+            index=models.Index(fields=['client_name', 'data_receive_quarter'], include=('carrier_code', 'fare', 'discount'), name='facttable_client_qtr_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='facttable',
+            index=models.Index(fields=['client_name', 'departure_date'], name='facttable_client_dep_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='facttable',
+            index=models.Index(fields=['carrier_code', 'departure_date'], name='facttable_carrier_dep_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='facttable',
+            index=models.Index(fields=['origin_airport_code', 'destination_airport_code', 'departure_date'], name='facttable_od_dep_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='facttable',
+            index=models.Index(condition=models.Q(('discount__gt', 0)), fields=['client_name', 'data_receive_quarter'], include=('carrier_code', 'fare', 'discount'), name='facttable_disc_client_qtr_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='facttable',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['departure_date'], name='facttable_departure_brin'),
+        ),
+        migrations.AlterField(
+            model_name='facttable',
+            name='carrier_code',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='air.airline'),
+        ),
+        migrations.AlterField(
+            model_name='facttable',
+            name='origin_airport_code',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='origin_airport_code', to='air.airport'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+import re
+
+from django.db import migrations
+
+
+# Function to rebuild air_facttable as a table range partitioned by the travel quarter of departure_date.
+# Existing rows are moved into one partition per quarter, then the indexes and foreign keys of the old table are
+# recreated on the partitioned table under their original names.
+def partition_facttable(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("ALTER TABLE air_facttable RENAME TO air_facttable_unpartitioned")
+        cursor.execute("SELECT pg_get_serial_sequence('air_facttable_unpartitioned', 'id')")
+        sequence = cursor.fetchone()[0]
+        cursor.execute("""
+            SELECT indexname, indexdef FROM pg_indexes
+            WHERE tablename = 'air_facttable_unpartitioned' AND indexname <> 'air_facttable_pkey'
+        """)
+        indexes = cursor.fetchall()
+        cursor.execute("""
+            SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+            WHERE conrelid = 'air_facttable_unpartitioned'::regclass AND contype = 'f'
+        """)
+        foreign_keys = cursor.fetchall()
+
+        cursor.execute("CREATE TABLE air_facttable (LIKE air_facttable_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE (departure_date)")
+        cursor.execute("SELECT DISTINCT date_trunc('quarter', departure_date)::date FROM air_facttable_unpartitioned ORDER BY 1")
+        for (start,) in cursor.fetchall():
+            name = "air_facttable_{}q{}".format(start.year, (start.month - 1) // 3 + 1)
+            end = start.replace(year=start.year + 1, month=1) if start.month == 10 else start.replace(month=start.month + 3)
+            cursor.execute("CREATE TABLE {} PARTITION OF air_facttable FOR VALUES FROM ('{}') TO ('{}')".format(name, start, end))
+        cursor.execute("INSERT INTO air_facttable SELECT * FROM air_facttable_unpartitioned")
+        # Tables created by Django 4.1 have an identity id column, which LIKE does not copy and whose sequence cannot move to
+        # another table. Its ids continue from a plain sequence owned by the new table, as serial ids do
+        cursor.execute("""
+            SELECT attidentity <> '' FROM pg_attribute WHERE attrelid = 'air_facttable_unpartitioned'::regclass AND attname = 'id'
+        """)
+        if cursor.fetchone()[0]:
+            cursor.execute("SELECT last_value, is_called FROM {}".format(sequence))
+            last_value, is_called = cursor.fetchone()
+            cursor.execute("ALTER TABLE air_facttable_unpartitioned ALTER COLUMN id DROP IDENTITY")
+            cursor.execute("CREATE SEQUENCE {}".format(sequence))
+            cursor.execute("SELECT setval(%s, %s, %s)", [sequence, last_value, is_called])
+            cursor.execute("ALTER TABLE air_facttable ALTER COLUMN id SET DEFAULT nextval('{}')".format(sequence))
+        cursor.execute("ALTER SEQUENCE {} OWNED BY air_facttable.id".format(sequence))
+        cursor.execute("DROP TABLE air_facttable_unpartitioned")
+
+        # A primary key on a partitioned table has to include the partition key
+        cursor.execute("ALTER TABLE air_facttable ADD CONSTRAINT air_facttable_pkey PRIMARY KEY (id, departure_date)")
+        for name, definition in indexes:
+            cursor.execute(re.sub(r" ON (\S+\.)?air_facttable_unpartitioned ", r" ON \1air_facttable ", definition))
+        for name, definition in foreign_keys:
+            cursor.execute("ALTER TABLE air_facttable ADD CONSTRAINT {} {}".format(name, definition))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('air', '0003_facttable_report_indexes'),
+    ]
+
+    # The primary key of the table becomes (id, departure_date). Django 4.1 cannot represent a composite primary key, so the
+    # migration state keeps FactTable.id as the primary key: ids still come from one sequence and stay unique
+    operations = [
+        migrations.SeparateDatabaseAndState(database_operations=[migrations.RunPython(partition_facttable)], state_operations=[]),
+    ]
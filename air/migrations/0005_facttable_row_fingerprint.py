@@ -0,0 +1,40 @@
+# Generated by Django 4.1.1 on 2026-10-18 09:56
+
+from django.db import migrations, models
+
+# Same expression as air.loaders.fingerprint_sql over the loaded columns, so rows loaded before the merge match reloads
+BACKFILL_FINGERPRINTS = """
+    UPDATE air_facttable AS t SET row_fingerprint = f.row_fingerprint
+    FROM (
+        SELECT id, departure_date, md5(concat_ws('|',
+            coalesce(client_name::text, ''), coalesce(pnr_locator::text, ''), coalesce(invoice_number::text, ''),
+            coalesce(departure_date::text, ''), coalesce(carrier_code_id::text, ''), coalesce(origin_airport_code_id::text, ''),
+            coalesce(destination_airport_code_id::text, ''),
+            row_number() OVER (
+                PARTITION BY client_name, pnr_locator, invoice_number, departure_date, carrier_code_id, origin_airport_code_id, destination_airport_code_id
+                ORDER BY data_receive_quarter, traveller_name, booked_date_or_invoice_date, class_of_service_code, tour_code, ticket_designator,
+                         point_of_sale, fare, tax, miles_or_mileage, discount, currency_code))) AS row_fingerprint
+        FROM air_facttable
+    ) AS f
+    WHERE t.id = f.id AND t.departure_date = f.departure_date
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('air', '0004_partition_facttable_by_quarter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='facttable',
+            name='row_fingerprint',
+            field=models.CharField(max_length=32, null=True),
+        ),
+        migrations.RunSQL(BACKFILL_FINGERPRINTS, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='facttable',
+            index=models.Index(fields=['client_name', 'row_fingerprint'], name='facttable_client_fp_idx'),
+        ),
+    ]
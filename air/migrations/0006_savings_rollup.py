@@ -0,0 +1,33 @@
+from django.db import migrations
+
+# The view as created by this migration, kept here rather than imported so the migration does not change with the code.
+# Pre-discount and savings are rounded per segment exactly like the Pre-Discount Cost and Savings columns of the final data
+CREATE_ROLLUP = """
+    CREATE MATERIALIZED VIEW air_savings_rollup AS
+    SELECT f.client_name, f.data_receive_quarter, f.carrier_code_id, a.carrier_name, al.alliance_id, al.alliance_name, f.class_of_service_code,
+           count(*) AS segments,
+           sum(round((f.fare / (1 - f.discount))::numeric, 2)) AS pre_discount,
+           sum(f.fare::numeric) AS actual_spend,
+           sum(round(round((f.fare / (1 - f.discount))::numeric, 2) - f.fare::numeric, 2)) AS savings,
+           sum(f.tax::numeric) AS tax,
+           sum(f.miles_or_mileage::numeric) AS miles
+    FROM air_facttable AS f
+    JOIN air_airline AS a ON a.carrier_code = f.carrier_code_id
+    JOIN air_alliance AS al ON al.alliance_id = a.carrier_alliance_id
+    GROUP BY f.client_name, f.data_receive_quarter, f.carrier_code_id, a.carrier_name, al.alliance_id, al.alliance_name, f.class_of_service_code
+    WITH DATA;
+    -- REFRESH ... CONCURRENTLY needs a unique index, the carrier determines its name and alliance
+    CREATE UNIQUE INDEX air_savings_rollup_key ON air_savings_rollup (client_name, data_receive_quarter, carrier_code_id, class_of_service_code);
+    CREATE INDEX air_savings_rollup_quarter_idx ON air_savings_rollup (data_receive_quarter);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('air', '0005_facttable_row_fingerprint'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_ROLLUP, "DROP MATERIALIZED VIEW air_savings_rollup"),
+    ]
@@ -0,0 +1,40 @@
+import hashlib
+
+from django.db import migrations
+
+
+# Function to list partition every air_facttable quarter partition by client_name, one sub-partition per client, so a
+# client's quarter can be swapped in without rewriting the other clients' rows. Sub-partitions get the names of
+# air.partitions.client_partition_name, the naming is repeated here so this migration keeps working if that function changes.
+def partition_quarters_by_client(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        # A primary key on a partitioned table has to include the partition keys of every level
+        cursor.execute("ALTER TABLE air_facttable DROP CONSTRAINT air_facttable_pkey")
+        cursor.execute("ALTER TABLE air_facttable ADD CONSTRAINT air_facttable_pkey PRIMARY KEY (id, departure_date, client_name)")
+        cursor.execute("""
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits AS i JOIN pg_class AS c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'air_facttable'::regclass AND c.relkind = 'r'
+        """)
+        for name, bound in cursor.fetchall():
+            cursor.execute("ALTER TABLE air_facttable DETACH PARTITION {}".format(name))
+            cursor.execute("ALTER TABLE {0} RENAME TO {0}_unpartitioned".format(name))
+            cursor.execute("CREATE TABLE {} PARTITION OF air_facttable {} PARTITION BY LIST (client_name)".format(name, bound))
+            cursor.execute("SELECT DISTINCT client_name FROM {}_unpartitioned".format(name))
+            for (client_name,) in cursor.fetchall():
+                cursor.execute("CREATE TABLE {}_c{} PARTITION OF {} FOR VALUES IN (%s)".format(
+                    name, hashlib.md5(client_name.encode()).hexdigest()[:11], name), [client_name])
+            cursor.execute("INSERT INTO {0} SELECT * FROM {0}_unpartitioned".format(name))
+            cursor.execute("DROP TABLE {}_unpartitioned".format(name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('air', '0006_savings_rollup'),
+    ]
+
+    # The primary key of the table becomes (id, departure_date, client_name). Django 4.1 cannot represent a composite primary
+    # key, so the migration state keeps FactTable.id as the primary key: ids still come from one sequence and stay unique
+    operations = [
+        migrations.SeparateDatabaseAndState(database_operations=[migrations.RunPython(partition_quarters_by_client)], state_operations=[]),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Q
+from django.contrib.postgres.indexes import BrinIndex
 from django.core.exceptions import ValidationError
 
 # Create your models here.
@@ -29,15 +31,20 @@ class Airline(models.Model):
 
 
 class FactTable(models.Model):
+    # The table's primary key is (id, departure_date, client_name), Postgres needs the partition keys in it (migrations 0004
+    # and 0007). Django cannot represent a composite primary key, its state keeps id, which is unique on its own
+    # There is no default partition: rows are written by the air pipeline (air/merge.py, air/partitions.py), which creates the
+    # partition of a quarter and client first. The ORM must not insert rows, a quarter or client without a partition fails
     id = models.AutoField(primary_key=True)
     data_receive_quarter = models.CharField(max_length=10)
     client_name = models.CharField(max_length=255)
     traveller_name = models.CharField(max_length=255)
     booked_date_or_invoice_date = models.DateField(null=True)
     departure_date = models.DateField()
-    carrier_code = models.ForeignKey("Airline", on_delete=models.CASCADE)
+    # Carrier and origin lookups use the leading column of the composite indexes below
+    carrier_code = models.ForeignKey("Airline", on_delete=models.CASCADE, db_index=False)
     class_of_service_code = models.CharField(max_length=2)
-    origin_airport_code = models.ForeignKey("Airport", related_name="origin_airport_code",on_delete=models.CASCADE)
+    origin_airport_code = models.ForeignKey("Airport", related_name="origin_airport_code",on_delete=models.CASCADE, db_index=False)
     destination_airport_code = models.ForeignKey("Airport", related_name="destination_airport_code",on_delete=models.CASCADE)
     tour_code = models.CharField(max_length=20, null=True)
     ticket_designator = models.CharField(max_length=20, null=True)
@@ -49,6 +56,23 @@ class FactTable(models.Model):
     discount = models.FloatField()
     invoice_number = models.CharField(max_length=20, null=True)
     currency_code = models.CharField(max_length=3, null=True)
-    
+    # Hash of the segment key (air/loaders.py FINGERPRINT_COLUMNS), used to merge reloaded files
+    row_fingerprint = models.CharField(max_length=32, null=True)
+
+    # Indexes for the savings report queries in air/report_queries.py
+    class Meta:
+        indexes = [
+            models.Index(fields=["client_name", "data_receive_quarter"], include=["carrier_code", "fare", "discount"], name="facttable_client_qtr_idx"),
+            models.Index(fields=["client_name", "departure_date"], name="facttable_client_dep_idx"),
+            models.Index(fields=["carrier_code", "departure_date"], name="facttable_carrier_dep_idx"),
+            models.Index(fields=["origin_airport_code", "destination_airport_code", "departure_date"], name="facttable_od_dep_idx"),
+            # Rows with a contract discount applied, the preferred carrier savings
+            models.Index(fields=["client_name", "data_receive_quarter"], include=["carrier_code", "fare", "discount"],
+                         condition=Q(discount__gt=0), name="facttable_disc_client_qtr_idx"),
+            # Segments are loaded a client quarter at a time, so departure dates follow the physical row order closely
+            BrinIndex(fields=["departure_date"], name="facttable_departure_brin"),
+            models.Index(fields=["client_name", "row_fingerprint"], name="facttable_client_fp_idx"),
+        ]
+
     def __str__(self):
         return self.client_name	
\ No newline at end of file
@@ -0,0 +1,115 @@
+from .loaders import FACT_TABLE, stage_fact_spool
+from .models import FactTable
+
+from psycopg2 import sql
+import hashlib
+
+# air_facttable is range partitioned by travel quarter of departure_date, one partition per quarter (migration 0004), and
+# every quarter partition is list partitioned by client_name, one sub-partition per client (migration 0007)
+FACT_COLUMNS = [field.column for field in FactTable._meta.fields]
+
+
+# Function to return the partition table name of a travel quarter, e.g. air_facttable_2022q3
+def partition_name(quarter, table=FACT_TABLE):
+    return "{}_{}q{}".format(table, quarter.year, quarter.quarter)
+
+
+# Function to return the sub-partition table name of a client in a travel quarter, e.g. air_facttable_2022q3_c1a2b3c4d5e.
+# Client names are hashed, they can hold any character and be longer than a table name
+def client_partition_name(quarter, client_name, table=FACT_TABLE):
+    return "{}_c{}".format(partition_name(quarter, table), hashlib.md5(client_name.encode()).hexdigest()[:11])
+
+
+# Function to return the partition bounds of a travel quarter, the first day of the quarter and of the next one
+def partition_bounds(quarter):
+    return str(quarter.start_time.date()), str((quarter + 1).start_time.date())
+
+
+# Function to return the SQL condition selecting the rows of a travel quarter, qualified with a table alias when given
+def quarter_condition(quarter, alias=None):
+    start, end = partition_bounds(quarter)
+    column = sql.Identifier(alias, "departure_date") if alias else sql.Identifier("departure_date")
+    return sql.SQL("{0} >= {1} AND {0} < {2}").format(column, sql.Literal(start), sql.Literal(end))
+
+
+# Function to return the SQL condition selecting the rows of any of the travel quarters, partition pruning still applies
+def quarters_condition(quarters, alias=None):
+    return sql.SQL("({})").format(sql.SQL(" OR ").join(sql.SQL("({})").format(quarter_condition(quarter, alias)) for quarter in sorted(quarters)))
+
+
+# Function to return the SQL condition selecting the rows one file loads into: the rows of a client and point of sale (the
+# country of the file) in the travel quarters. A client's files of other countries are outside it
+def load_scope(client_name, point_of_sale, quarters, alias=None):
+    columns = [sql.Identifier(alias, column) if alias else sql.Identifier(column) for column in ["client_name", "point_of_sale"]]
+    return sql.SQL("{} = {} AND {} = {} AND {}").format(columns[0], sql.Literal(client_name), columns[1], sql.Literal(point_of_sale),
+                                                        quarters_condition(quarters, alias))
+
+
+# Function to check whether a table exists
+def table_exists(cursor, name):
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [name])
+    return cursor.fetchone()[0]
+
+
+# Function to create the partition of a travel quarter and the sub-partitions of clients in it which do not exist yet,
+# returns the tables created. There is no default sub-partition, rows are only loaded for clients whose sub-partition exists
+def create_quarter_partitions(cursor, quarter, client_names=(), table=FACT_TABLE):
+    created = []
+    name = partition_name(quarter, table)
+    if not table_exists(cursor, name):
+        start, end = partition_bounds(quarter)
+        cursor.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {} PARTITION OF {} FOR VALUES FROM ({}) TO ({}) PARTITION BY LIST (client_name)").format(
+            sql.Identifier(name), sql.Identifier(table), sql.Literal(start), sql.Literal(end)))
+        created.append(name)
+    for client_name in sorted(set(client_names)):
+        client_table = client_partition_name(quarter, client_name, table)
+        if not table_exists(cursor, client_table):
+            cursor.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {} PARTITION OF {} FOR VALUES IN ({})").format(
+                sql.Identifier(client_table), sql.Identifier(name), sql.Literal(client_name)))
+            created.append(client_table)
+    return created
+
+
+# Function to create the partitions of any travel quarters, and the sub-partitions of the clients loaded into them, which do
+# not have one yet
+def ensure_quarter_partitions(conn, quarters, client_names=(), table=FACT_TABLE):
+    created = []
+    with conn:
+        with conn.cursor() as cursor:
+            for quarter in sorted(quarters):
+                created += create_quarter_partitions(cursor, quarter, client_names, table)
+    return created
+
+
+# Function to replace the rows of a client and point of sale (the file's country) in every travel quarter of the spool by
+# swapping in a rebuilt client sub-partition. The new table gets the client's rows of other points of sale from the old
+# sub-partition and the spool's rows, with the indexes of air_facttable, then the old sub-partition is detached and dropped
+# and the new table attached in its place. No DELETE (or the vacuum after it) is needed, and the other clients'
+# sub-partitions of the quarter are not touched. Returns the rows loaded.
+def replace_client_quarters(conn, spool, client_name, point_of_sale, table=FACT_TABLE):
+    spool.validate()
+    with conn:
+        with conn.cursor() as cursor:
+            stage_columns = sql.SQL(",").join(map(sql.Identifier, stage_fact_spool(cursor, spool, table)))
+            for quarter in sorted(spool.quarters):
+                create_quarter_partitions(cursor, quarter, table=table)
+                name = partition_name(quarter, table)
+                client_table = client_partition_name(quarter, client_name, table)
+                load_name = client_table + "_load"
+                in_partition = sql.SQL("{} AND client_name = {}").format(quarter_condition(quarter), sql.Literal(client_name))
+                # The new table is indexed as it is filled, so ATTACH adopts its indexes instead of building them under lock
+                cursor.execute(sql.SQL("CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS INCLUDING INDEXES)").format(sql.Identifier(load_name), sql.Identifier(table)))
+                # The bounds constraint lets ATTACH skip scanning the new partition
+                cursor.execute(sql.SQL("ALTER TABLE {} ADD CONSTRAINT client_quarter_bounds CHECK ({})").format(sql.Identifier(load_name), in_partition))
+                cursor.execute(sql.SQL("INSERT INTO {0} ({1}) SELECT {1} FROM fact_stage WHERE {2}").format(sql.Identifier(load_name), stage_columns, in_partition))
+                if table_exists(cursor, client_table):
+                    # The client's files of other countries are kept
+                    cursor.execute(sql.SQL("INSERT INTO {0} ({1}) SELECT {1} FROM {2} WHERE point_of_sale IS DISTINCT FROM {3}").format(
+                        sql.Identifier(load_name), sql.SQL(",").join(map(sql.Identifier, FACT_COLUMNS)), sql.Identifier(client_table),
+                        sql.Literal(point_of_sale)))
+                    cursor.execute(sql.SQL("ALTER TABLE {} DETACH PARTITION {}").format(sql.Identifier(name), sql.Identifier(client_table)))
+                    cursor.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(client_table)))
+                cursor.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(sql.Identifier(load_name), sql.Identifier(client_table)))
+                cursor.execute(sql.SQL("ALTER TABLE {} ATTACH PARTITION {} FOR VALUES IN ({})").format(
+                    sql.Identifier(name), sql.Identifier(client_table), sql.Literal(client_name)))
+    return spool.rows
@@ -0,0 +1,221 @@
+from django.core.exceptions import ValidationError
+
+from .loaders import FactRowSpool
+from .merge import merge_client_quarters
+from .rollups import refresh_savings_rollup
+from .partitions import ensure_quarter_partitions, replace_client_quarters
+from .enrichment import reference_lookups, enrich_references, unresolved_references
+from .classification import classify_contracts
+from .mappings import group_mapping_cache
+from .artifacts import RunArtifacts
+
+from CPR.pipeline_settings import pipeline_settings
+from CPR.instrumentation import StageTimings
+from CPR.schemas import FrameSchema, constant_column, format_dates, per_date
+from CPR.db_pool import db_pool
+
+from pathlib import Path, PureWindowsPath
+import logging
+import os
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Column order of the final data .xlsx file
+FINAL_HEADERS = ["Travel Date Quarter", "Travel Date Half Year", "Travel Date Year",
+                 "Client", "Agency", "PoS", "Traveller Name",
+                 "Departure Date", "Booked Date / Invoice Date", "Carrier Code", "Carrier Name",
+                 "Class of Service Code", "Origin Airport Code", "Destination Airport Code",
+                 "Tour Code", "Ticket Designator", "Fare", "Currency Code", "Tax", "Miles / Mileage", "Invoice Number",
+                 "PNR Locator", "CTV_Booking Class Code", "CTV_Origin_Airport_Id",
+                 "CTV_Destination_Airport_Id", "CTV_Fare", "CTV_Reference", "CTV_Carrier_Id", "CTV_Alliance_ID",
+                 "Savings Alliance Classification", "Savings Contract Classifier", "Discount", "Pre-Discount Cost",
+                 "Savings", "Non-Prism Preferred", "Contract Classifier Tour Code", "Contract Classifier Ticket Designator",
+                 "If Discount Applied", "If Reference Missing"]
+
+# Final data columns loaded into air_facttable, mapped to their table columns
+DB_COLUMNS = {"Travel Date Quarter": "data_receive_quarter", "Client": "client_name", "Traveller Name": "traveller_name",
+              "Booked Date / Invoice Date": "booked_date_or_invoice_date", "Departure Date": "departure_date", "Carrier Code": "carrier_code_id",
+              "Class of Service Code": "class_of_service_code", "Origin Airport Code": "origin_airport_code_id",
+              "Destination Airport Code": "destination_airport_code_id", "Tour Code": "tour_code", "Ticket Designator": "ticket_designator",
+              "PoS": "point_of_sale", "Fare": "fare", "Tax": "tax", "Miles / Mileage": "miles_or_mileage", "PNR Locator": "pnr_locator",
+              "Discount": "discount", "Invoice Number": "invoice_number", "Currency Code": "currency_code"}
+
+# Column types of the OneSchema air file: carrier, airport, class of service and currency codes are categorical, segment miles
+# are whole numbers which float32 holds exactly, and the departure date is parsed with the format the agencies send
+AIR_SCHEMA = FrameSchema({"Carrier Code": "category", "Class of Service Code": "category", "Class of Service": "category",
+                          "Origin Airport Code": "category", "Destination Airport Code": "category", "Currency Code": "category",
+                          "Tour Code": "category", "Ticket Designator": "category", "Segment Miles": "float32"},
+                         dates={"Departure Date": "%m/%d/%Y"})
+
+
+# Function to return the Raw TMC Data folder of a client quarter
+def dropbox_output_path(customer_name, year, quarter):
+    win_etl_output_file_path = Path(os.path.join(pipeline_settings().win_etl_output_files_path, customer_name))
+    dropbox_path = Path(os.path.join(win_etl_output_file_path, "3. Performance Reports", year, quarter, "Raw TMC Data-Dev"))
+    return PureWindowsPath(dropbox_path)
+
+
+# Function to read Group Mappings for Preferred Savings Classifiers
+def read_group_mappings():
+    path = PureWindowsPath(pipeline_settings().air_group_mapping_path)
+    full_file_path = Path(os.path.join(path, "Group Airline Discounts Mapping.xlsx"))
+    return group_mapping_cache.get(full_file_path)
+
+
+# Function to fill optional columns and add the travel date, client and CTV columns
+def prepare_frame(df, customer_name, travel_agency, country, year):
+    # Check if columns exists in dataframe
+    for column in ["Tax", "Invoice Number", "Tour Code", "Ticket Designator"]:
+        if column not in df.columns:
+            df[column] = ""
+
+    if "Booked Date / Invoice Date" in df.columns:
+        df["Booked Date / Invoice Date"] = format_dates(pd.to_datetime(df["Booked Date / Invoice Date"]), "%m/%d/%Y")
+    else:
+        df["Booked Date / Invoice Date"] = ""
+
+    # Forming dataframe for final data
+    df['Departure Date'] = pd.to_datetime(df['Departure Date'], format="%m/%d/%Y")
+    df.insert(0, "Travel Date Quarter", per_date(df['Departure Date'], lambda dates: ["Q{} {}".format(d.quarter, d.year) for d in dates]), True)
+    df.insert(1, "Travel Date Half Year", per_date(df['Departure Date'], lambda dates: ["H{} {}".format(2 if d.month > 6 else 1, d.year) for d in dates]), True)
+    df.insert(2, "Travel Date Year", constant_column(year, df.index), True)
+    df.insert(3, "Client", constant_column(customer_name, df.index), True)
+    df.insert(4, "Agency", constant_column(travel_agency, df.index), True)
+    df.insert(5, "PoS", constant_column(country, df.index), True)
+    traveller_names = df['Traveller Name'].tolist()
+    df["Traveller Name"] = [i.replace('/', ', ') for i in traveller_names]
+    df["PNR Locator"] = df["PNR"]
+    df["Miles / Mileage"] = df["Segment Miles"]
+    df["CTV_Booking Class Code"] = df["Class of Service Code"]
+    df["CTV_Reference"] = df["Origin Airport Code"].astype(object) + "-" + df["Destination Airport Code"].astype(object) + "-" + df["Class of Service Code"].astype(object)
+    df["CTV_Fare"] = df["Class of Service"]
+    return df
+
+
+# Function to add pre-discount cost, savings and preferred airline flags
+def savings_columns(df, settings):
+    if 'Currency Code' not in df.columns:
+        df["Currency Code"] = constant_column("USD", df.index)
+    pre_dis, pre, sav = [], [], []
+    fare = df["Fare"].tolist()
+    discount = df["Discount"].tolist()
+    pre_dis, pre, sav, reference_code_missing = [], [], [], []
+    [reference_code_missing.append("Y") if d == 99999.9 else reference_code_missing.append("N") for d in discount]
+    df["If Reference Missing"] = [ref for ref in reference_code_missing]
+    [pre.append(1 - d) for d in discount]
+    [pre_dis.append(f / d) for f, d in zip(fare, pre)]
+    df["Pre-Discount Cost"] = [pr for pr in pre_dis]
+    df["Pre-Discount Cost"] = df["Pre-Discount Cost"].round(2)
+    pre_disc_cost = df["Pre-Discount Cost"].tolist()
+    [sav.append(pre - f) for f, pre in zip(fare, pre_disc_cost)]
+    df["Savings"] = [s for s in sav]
+    df["Savings"] = df["Savings"].round(2)
+    df["Non-Prism Preferred"] = df["Savings Alliance Classification"].isin(settings.group_deals).map({True: "N", False: "Y"})
+    return df
+
+
+# Function to run every per-row stage on one chunk of the agency file, returns the final frame and its unresolved codes.
+# carried_classifiers is shared by the chunks of a file, see air.classification.cutoff_references
+def process_chunk(df, lookups, discounts, settings, customer_name, travel_agency, country, year, timings=None, carried_classifiers=None):
+    timings = timings or StageTimings(enabled=False)
+    rows = len(df.index)
+    with timings.stage("prepare", rows):
+        df = prepare_frame(df, customer_name, travel_agency, country, year)
+
+    # Resolving carrier, airport and alliance columns from the reference tables
+    with timings.stage("enrich", rows):
+        df = enrich_references(df, *lookups)
+        unresolved_df = unresolved_references(df)
+
+    # Determine savings contract classifier, tour code / ticket designator checks and discount for preferred airlines
+    with timings.stage("classify", rows):
+        df = classify_contracts(df, settings.contract_codes, settings.departure_cutoffs, discounts, carried_classifiers)
+    with timings.stage("savings", rows):
+        df["Departure Date"] = format_dates(df["Departure Date"], "%m/%d/%Y")
+        df = savings_columns(df, settings)
+
+    # Prism flights data still pending....
+
+    # Rearranging the columns
+    return df.reindex(columns=FINAL_HEADERS), unresolved_df
+
+
+# Function to run the air pipeline for one OneSchema CSV file and load it into air_facttable, returns the run result
+# The file is processed chunk_size rows at a time (the whole file at once when None), so peak memory depends on the chunk size.
+# Rows are merged into the rows of the client and country (point of sale) in the file's travel quarters, with replace_existing
+# those rows are replaced
+def process_air_file(csv_file_path, customer_name, travel_agency, travel_type, country, year, quarter, write_db_staging=False, chunk_size=None,
+                     replace_existing=False):
+    if not os.path.exists(csv_file_path):
+        raise FileNotFoundError("Unable to find CSV file in specified directory: %s" % csv_file_path)
+    settings = pipeline_settings()
+    chunk_size = chunk_size or settings.air_chunk_size
+    artifacts = RunArtifacts(dropbox_output_path(customer_name, year, quarter))
+    timings = StageTimings(settings.stage_timing, settings.memory_profiling)
+
+    # Get indexed lookup frames from database tables and the group mappings, shared by every chunk
+    with timings.stage("lookups"):
+        lookups = reference_lookups()
+        group, discounts = read_group_mappings()
+
+    # Final data .xlsx file, and the DB staging file when asked for, receive their rows chunk by chunk
+    new_file_name = "{}_{}_{}{}_{}_FinalData.xlsx".format(customer_name, travel_type, quarter, year, country)
+    final_sheet = artifacts.add_chunked(new_file_name, FINAL_HEADERS)
+    db_sheet = None
+    if write_db_staging:
+        db_sheet = artifacts.add_chunked("{}_{}_{}{}_{}_DBFinalData.xlsx".format(customer_name, travel_type, quarter, year, country), DB_COLUMNS.values())
+
+    spool = FactRowSpool(DB_COLUMNS.values())
+    try:
+        unresolved = []
+        carried_classifiers = {}
+        for df in timings.iterate("read", artifacts.read_csv_chunks(csv_file_path, chunk_size, AIR_SCHEMA)):
+            df, unresolved_df = process_chunk(df, lookups, discounts, settings, customer_name, travel_agency, country, year, timings,
+                                              carried_classifiers)
+            unresolved.append(unresolved_df)
+            with timings.stage("write_xlsx", len(df.index)):
+                artifacts.append(final_sheet, df)
+                db_df = df[list(DB_COLUMNS)].rename(columns=DB_COLUMNS)
+                if db_sheet is not None:
+                    artifacts.append(db_sheet, db_df)
+            with timings.stage("spool", len(db_df.index)):
+                spool.append(db_df)
+        unresolved_df = pd.concat(unresolved).groupby(["Column", "Code"], sort=False)["Rows"].sum().reset_index()
+
+        # Codes missing from the reference tables stop the run before the database load
+        if not unresolved_df.empty:
+            unresolved_file_name = artifacts.add("{}_{}_{}{}_{}_UnresolvedCodes.xlsx".format(customer_name, travel_type, quarter, year, country), unresolved_df)
+            artifacts.write()
+            raise ValidationError("{} carrier/airport code(s) are missing from the reference tables. Please check {}".format(len(unresolved_df.index), unresolved_file_name))
+
+        # Writing the run's .xlsx artifacts once, after every chunk has been processed
+        with timings.stage("write_xlsx"):
+            artifacts.write()
+
+        # Saving final data into database - all rows are validated first and merged in one transaction, into the quarter partitions
+        with db_pool.connection() as conn:
+            with timings.stage("db_load", spool.rows):
+                ensure_quarter_partitions(conn, spool.quarters, [customer_name])
+                if replace_existing:
+                    rows = replace_client_quarters(conn, spool, customer_name, country)
+                    merge_report = None
+                else:
+                    # Merging on row fingerprints makes reprocessing the same or a corrected file idempotent
+                    merge_report = merge_client_quarters(conn, spool, customer_name, country)
+                    rows = spool.rows
+            # Dashboard totals are read from the rollup, so it is refreshed once the load is committed
+            with timings.stage("refresh_rollup"):
+                refresh_savings_rollup(conn)
+    finally:
+        spool.close()
+        timings.close()
+
+    io_report = artifacts.report()
+    logger.info("I/O report of %s: %s", os.path.basename(csv_file_path), io_report)
+    if merge_report is not None:
+        logger.info("Merge report of %s: %s", os.path.basename(csv_file_path), merge_report)
+    timings.log(os.path.basename(csv_file_path))
+    quarters = ["Q{} {}".format(q.quarter, q.year) for q in sorted(spool.quarters)]
+    return {"final_sheet": str(final_sheet.path), "rows": rows, "quarters": quarters, "io_report": io_report, "merge_report": merge_report,
+            "stages": timings.report()}
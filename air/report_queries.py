@@ -0,0 +1,91 @@
+from django.db.models import Count
+
+from .models import FactTable
+
+# Representative savings report queries on air_facttable and the index each one is expected to use.
+# Checked by `manage.py explain_report_queries` against the baselines in air/report_queries_baseline.json
+REPORT_QUERIES = [
+    {
+        "name": "client_quarter_savings",
+        "index": "facttable_client_qtr_idx",
+        "sql": """
+            SELECT carrier_code_id, count(*) AS segments, sum(fare) AS fare, sum(fare / (1 - discount) - fare) AS savings
+            FROM air_facttable
+            WHERE client_name = %(client)s AND data_receive_quarter = %(quarter)s
+            GROUP BY carrier_code_id
+        """,
+    },
+    {
+        "name": "preferred_client_quarter_savings",
+        "index": "facttable_disc_client_qtr_idx",
+        "sql": """
+            SELECT carrier_code_id, count(*) AS segments, sum(fare / (1 - discount) - fare) AS savings
+            FROM air_facttable
+            WHERE client_name = %(client)s AND data_receive_quarter = %(quarter)s AND discount > 0
+            GROUP BY carrier_code_id
+        """,
+    },
+    {
+        "name": "client_departure_range",
+        "index": "facttable_client_dep_idx",
+        "sql": """
+            SELECT departure_date, carrier_code_id, origin_airport_code_id, destination_airport_code_id, fare, discount
+            FROM air_facttable
+            WHERE client_name = %(client)s AND departure_date BETWEEN %(start)s AND %(end)s
+            ORDER BY departure_date
+        """,
+    },
+    {
+        "name": "carrier_departure_range",
+        "index": "facttable_carrier_dep_idx",
+        "sql": """
+            SELECT client_name, count(*) AS segments, sum(fare) AS fare
+            FROM air_facttable
+            WHERE carrier_code_id = %(carrier)s AND departure_date BETWEEN %(start)s AND %(end)s
+            GROUP BY client_name
+        """,
+    },
+    {
+        "name": "origin_destination_range",
+        "index": "facttable_od_dep_idx",
+        "sql": """
+            SELECT carrier_code_id, class_of_service_code, count(*) AS segments, avg(fare) AS average_fare
+            FROM air_facttable
+            WHERE origin_airport_code_id = %(origin)s AND destination_airport_code_id = %(destination)s
+              AND departure_date BETWEEN %(start)s AND %(end)s
+            GROUP BY carrier_code_id, class_of_service_code
+        """,
+    },
+    {
+        "name": "departure_range_by_quarter",
+        "index": "facttable_departure_brin",
+        "sql": """
+            SELECT data_receive_quarter, count(*) AS segments, sum(fare) AS fare
+            FROM air_facttable
+            WHERE departure_date BETWEEN %(start)s AND %(end)s
+            GROUP BY data_receive_quarter
+        """,
+    },
+]
+
+
+# Function to pick representative parameters from the data: the largest client quarter, its date range, top carrier and route
+def report_query_params():
+    client_quarter = (FactTable.objects.values("client_name", "data_receive_quarter")
+                      .annotate(segments=Count("id")).order_by("-segments").first())
+    if client_quarter is None:
+        return None
+    rows = FactTable.objects.filter(client_name=client_quarter["client_name"], data_receive_quarter=client_quarter["data_receive_quarter"])
+    dates = rows.order_by("departure_date").values_list("departure_date", flat=True)
+    carrier = rows.values("carrier_code_id").annotate(segments=Count("id")).order_by("-segments").first()
+    route = (rows.values("origin_airport_code_id", "destination_airport_code_id")
+             .annotate(segments=Count("id")).order_by("-segments").first())
+    return {
+        "client": client_quarter["client_name"],
+        "quarter": client_quarter["data_receive_quarter"],
+        "start": dates.first(),
+        "end": dates.last(),
+        "carrier": carrier["carrier_code_id"],
+        "origin": route["origin_airport_code_id"],
+        "destination": route["destination_airport_code_id"],
+    }
@@ -0,0 +1,49 @@
+from django.db import connection
+
+import pandas as pd
+
+# Materialized view of savings totals, created by migration 0006. A change to its query needs a new migration
+ROLLUP_VIEW = "air_savings_rollup"
+# Dimensions of the rollup, client x quarter x carrier x alliance x cabin (booking class)
+ROLLUP_DIMENSIONS = ["client_name", "data_receive_quarter", "carrier_code_id", "carrier_name", "alliance_id", "alliance_name", "class_of_service_code"]
+ROLLUP_MEASURES = ["segments", "pre_discount", "actual_spend", "savings", "tax", "miles"]
+
+
+# Function to refresh the rollup after a load, concurrently so dashboards keep reading the previous totals meanwhile
+def refresh_savings_rollup(conn):
+    with conn:
+        with conn.cursor() as cursor:
+            cursor.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY {}".format(ROLLUP_VIEW))
+
+
+# Function to return savings totals from the rollup grouped by the given dimensions, with volume share and net savings.
+# Volume share is each group's share of the segments of its client quarter (of all selected segments when the
+# grouping has no client or quarter), net savings is savings over pre-discount cost, both in percent
+def savings_rollup(group_by=("client_name", "data_receive_quarter", "carrier_name"), client_name=None, quarters=None, carriers=None, alliances=None):
+    group_by = list(group_by)
+    unknown = [dimension for dimension in group_by if dimension not in ROLLUP_DIMENSIONS]
+    if unknown:
+        raise ValueError("Unknown rollup dimension(s): %s" % ", ".join(unknown))
+    conditions, params = [], []
+    for column, values in [("client_name", [client_name] if client_name else None), ("data_receive_quarter", quarters),
+                           ("carrier_code_id", carriers), ("alliance_name", alliances)]:
+        if values:
+            conditions.append("{} = ANY(%s)".format(column))
+            params.append(list(values))
+    query = "SELECT {dimensions}{separator}{measures} FROM {view}{where}{group}".format(
+        dimensions=", ".join(group_by),
+        separator=", " if group_by else "",
+        measures=", ".join("sum({0}) AS {0}".format(measure) for measure in ROLLUP_MEASURES),
+        view=ROLLUP_VIEW,
+        where=" WHERE " + " AND ".join(conditions) if conditions else "",
+        group=" GROUP BY " + ", ".join(group_by) + " ORDER BY " + ", ".join(group_by) if group_by else "")
+    with connection.cursor() as cursor:
+        cursor.execute(query, params)
+        df = pd.DataFrame(cursor.fetchall(), columns=group_by + ROLLUP_MEASURES)
+    df[ROLLUP_MEASURES] = df[ROLLUP_MEASURES].astype(float)
+    df["segments"] = df["segments"].astype(int)
+    share_keys = [dimension for dimension in ["client_name", "data_receive_quarter"] if dimension in group_by]
+    totals = df.groupby(share_keys)["segments"].transform("sum") if share_keys else df["segments"].sum()
+    df["volume_share"] = (df["segments"] / totals * 100).round(2)
+    df["net_savings"] = (df["savings"] / df["pre_discount"] * 100).round(2)
+    return df
@@ -0,0 +1,128 @@
+from .models import Airline, Airport
+
+import itertools
+import string
+import numpy as np
+import pandas as pd
+
+
+# Function to build a synthetic db_df frame shaped like the one the air pipeline loads, using the loaded reference codes
+def synthetic_fact_rows(rows, client_name="Benchmark Client", seed=0, quarter_start="2022-07-01"):
+    carrier_codes = list(Airline.objects.values_list("carrier_code", flat=True))
+    airport_codes = list(Airport.objects.values_list("airport_code", flat=True))
+    if not carrier_codes or not airport_codes:
+        raise ValueError("Airline and Airport reference tables must be loaded before building synthetic fact rows.")
+    rng = np.random.default_rng(seed)
+    quarter = pd.Period(quarter_start, freq="Q")
+    departure_dates = quarter.start_time + pd.to_timedelta(rng.integers(0, (quarter.end_time - quarter.start_time).days + 1, rows), unit="D")
+    return pd.DataFrame({
+        "data_receive_quarter": "Q{} {}".format(quarter.quarter, quarter.year),
+        "client_name": client_name,
+        "traveller_name": ["TRAVELLER, {}".format(i) for i in range(rows)],
+        "booked_date_or_invoice_date": (departure_dates - pd.Timedelta(days=14)).strftime("%m/%d/%Y"),
+        "departure_date": departure_dates.strftime("%m/%d/%Y"),
+        "carrier_code_id": rng.choice(carrier_codes, rows),
+        "class_of_service_code": rng.choice(["Y", "J", "F", "W"], rows),
+        "origin_airport_code_id": rng.choice(airport_codes, rows),
+        "destination_airport_code_id": rng.choice(airport_codes, rows),
+        "tour_code": "",
+        "ticket_designator": "",
+        "point_of_sale": "US",
+        "fare": rng.uniform(100, 5000, rows).round(2),
+        "tax": rng.uniform(10, 300, rows).round(2),
+        "miles_or_mileage": rng.integers(100, 8000, rows).astype(float),
+        "pnr_locator": ["PNR{:06d}".format(i) for i in range(rows)],
+        "discount": 0.0,
+        "invoice_number": "",
+        "currency_code": "USD",
+    })
+
+
+# Alliances of the synthetic reference tables, each preferred airline of config.json is an alliance of its own
+SYNTHETIC_ALLIANCES = ["Star Alliance", "oneworld", "SkyTeam", "JetBlue", "Emirates", "Turkish", "Qantas", "Singapore", "Cathay", "Unaffiliated"]
+# Booking class codes and the fare class names OneSchema files carry next to them
+SYNTHETIC_CLASSES = {"Y": "Economy", "W": "Premium Economy", "J": "Business", "F": "First"}
+
+
+# Function to return n distinct upper-case codes of the given length, e.g. AA, AB, ... for carriers
+def synthetic_codes(n, length):
+    letters = string.ascii_uppercase
+    return ["".join(code) for code in itertools.islice(itertools.product(letters, repeat=length), n)]
+
+
+# Function to build Alliance, Airline and Airport reference rows, returned as frames with the model field names
+def synthetic_references(carriers=80, airports=300, seed=0):
+    rng = np.random.default_rng(seed)
+    alliances = pd.DataFrame({"alliance_id": range(1, len(SYNTHETIC_ALLIANCES) + 1), "alliance_name": SYNTHETIC_ALLIANCES})
+    carrier_codes = synthetic_codes(carriers, 2)
+    # Every preferred airline gets one carrier, the other carriers are spread over the remaining alliances
+    alliance_ids = list(range(4, 10)) + rng.choice([1, 2, 3, 10], carriers - 6).tolist()
+    airlines = pd.DataFrame({
+        "carrier_code": carrier_codes,
+        "carrier_id": range(1, carriers + 1),
+        "carrier_name": ["{} Airways".format(code) for code in carrier_codes],
+        "carrier_alliance_id": alliance_ids[:carriers],
+    })
+    airport_codes = synthetic_codes(airports, 3)
+    airports = pd.DataFrame({"airport_code": airport_codes, "airport_id": range(1, airports + 1), "airport_city": ["City {}".format(code) for code in airport_codes]})
+    return {"alliances": alliances, "airlines": airlines, "airports": airports}
+
+
+# Function to return the indexed lookup frames reference_lookups would build from the synthetic reference rows
+def synthetic_reference_lookups(references):
+    return (references["airlines"].set_index("carrier_code"), references["airports"].set_index("airport_code"),
+            references["alliances"].set_index("alliance_id"))
+
+
+# Function to build a OneSchema air file of flight segments on the synthetic reference codes. Segments of preferred airlines
+# carry the contract tour code or ticket designator at the given rate, the other segments random or blank codes
+def synthetic_air_file(rows, references, settings, seed=0, quarter_start="2022-07-01", contract_rate=0.6):
+    rng = np.random.default_rng(seed)
+    quarter = pd.Period(quarter_start, freq="Q")
+    airlines = references["airlines"]
+    alliance_names = airlines["carrier_alliance_id"].map(references["alliances"].set_index("alliance_id")["alliance_name"])
+    carriers = rng.integers(0, len(airlines.index), rows)
+    carrier_alliances = alliance_names.to_numpy()[carriers]
+    departure_dates = quarter.start_time + pd.to_timedelta(rng.integers(0, (quarter.end_time - quarter.start_time).days + 1, rows), unit="D")
+    classes = rng.choice(list(SYNTHETIC_CLASSES), rows, p=[0.7, 0.1, 0.15, 0.05])
+    contract = rng.random(rows) < contract_rate
+    tour_codes = [settings.contract_codes[alliance][0] if use and alliance in settings.contract_codes else rng.choice(["", "OTHER1"])
+                  for alliance, use in zip(carrier_alliances, contract)]
+    ticket_designators = [(settings.contract_codes[alliance][1] or "") if use and alliance in settings.contract_codes else ""
+                          for alliance, use in zip(carrier_alliances, contract)]
+    return pd.DataFrame({
+        "Traveller Name": ["TRAVELLER{}/NAME{}".format(i % 5000, i % 97) for i in range(rows)],
+        "Departure Date": departure_dates.strftime("%m/%d/%Y"),
+        "Booked Date / Invoice Date": (departure_dates - pd.to_timedelta(rng.integers(1, 60, rows), unit="D")).strftime("%m/%d/%Y"),
+        "Carrier Code": airlines["carrier_code"].to_numpy()[carriers],
+        "Class of Service Code": classes,
+        "Class of Service": [SYNTHETIC_CLASSES[code] for code in classes],
+        "Origin Airport Code": rng.choice(references["airports"]["airport_code"], rows),
+        "Destination Airport Code": rng.choice(references["airports"]["airport_code"], rows),
+        "Tour Code": tour_codes,
+        "Ticket Designator": ticket_designators,
+        "Fare": rng.uniform(100, 5000, rows).round(2),
+        "Tax": rng.uniform(10, 300, rows).round(2),
+        "Segment Miles": rng.integers(100, 8000, rows),
+        "PNR": ["PNR{:06d}".format(i // 2) for i in range(rows)],
+        "Invoice Number": ["INV{:07d}".format(i // 2) for i in range(rows)],
+    })
+
+
+# Function to build the Group Airline Discounts Mapping sheets (one per preferred airline, Reference and Discount) covering
+# every contract reference of an air file, so no processed segment is missing its discount
+def synthetic_air_group_mappings(air_df, references, settings, seed=0):
+    rng = np.random.default_rng(seed)
+    alliance_names = references["alliances"].set_index("alliance_id")["alliance_name"]
+    airlines = references["airlines"].set_index("carrier_code")["carrier_alliance_id"].map(alliance_names)
+    alliance = air_df["Carrier Code"].map(airlines)
+    route_references = air_df["Origin Airport Code"] + "-" + air_df["Destination Airport Code"] + "-" + air_df["Class of Service Code"]
+    sheets = {}
+    for airline in settings.contract_codes:
+        if airline in settings.departure_cutoffs:
+            label = settings.departure_cutoffs[airline].strftime("%b %Y")
+            reference_list = ["{} {}-{}".format(period, label, code) for period in ["Pre", "Post"] for code in SYNTHETIC_CLASSES]
+        else:
+            reference_list = sorted(route_references[alliance == airline].unique())
+        sheets[airline] = pd.DataFrame({"Reference": reference_list, "Discount": rng.uniform(0.02, 0.3, len(reference_list)).round(3)})
+    return sheets
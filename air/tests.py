@@ -1,3 +1,299 @@
-from django.test import TestCase
+from django.test import SimpleTestCase, TransactionTestCase
 
-# Create your tests here.
+from .classification import classify_contracts
+from .loaders import FactRowSpool
+from .merge import merge_client_quarters
+from .models import Airline, Airport, Alliance, FactTable
+from .rollups import refresh_savings_rollup
+from .views import BasicView
+from .mappings import GroupMappingCache, discount_index
+from .artifacts import RunArtifacts
+from .partitions import client_partition_name, ensure_quarter_partitions, partition_name, replace_client_quarters
+from .pipeline import AIR_SCHEMA, process_chunk
+from .synthetic import (synthetic_air_file, synthetic_air_group_mappings, synthetic_fact_rows, synthetic_reference_lookups,
+                        synthetic_references)
+
+import json
+import os
+import numpy as np
+import pandas as pd
+from CPR.settings.base import BASE_DIR
+from CPR.pipeline_settings import parse_pipeline_settings
+from CPR.instrumentation import StageTimings
+from CPR.db_pool import db_pool
+from pathlib import Path
+import tempfile
+import tracemalloc
+
+CONFIG = json.loads(Path(BASE_DIR, "config.json").read_text())
+SETTINGS = parse_pipeline_settings(CONFIG, Path("C:/Users/test"))
+AIRLINES = ["JetBlue", "Emirates", "Turkish", "Qantas", "Singapore", "Cathay", "Star Alliance"]
+
+
+# Synthetic enriched air rows with the output the per-row classification of ProcessDataView (before classify_contracts)
+# gave for them, including JetBlue rows departing before the cut-off and multi-character booking classes
+EXPECTED_CLASSIFICATION = Path(BASE_DIR, "air", "testdata", "classify_contracts_expected.csv")
+
+
+# Function to build a synthetic enriched air frame covering every tour code / ticket designator combination
+def synthetic_air_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    airline = rng.choice(AIRLINES, rows)
+    codes = SETTINGS.contract_codes
+    tour_code = [rng.choice([codes.get(a, ("X", "X"))[0] or "", "", np.nan, "OTHER1"]) for a in airline]
+    ticket_designator = [rng.choice([codes.get(a, ("X", "X"))[1] or "", "", np.nan, "ZZ99"]) for a in airline]
+    df = pd.DataFrame({
+        "Savings Alliance Classification": airline,
+        "Departure Date": pd.Timestamp("2022-07-01") + pd.to_timedelta(rng.integers(0, 92, rows), unit="D"),
+        "CTV_Booking Class Code": rng.choice(["Y", "J", "F", "B"], rows),
+        "Origin Airport Code": rng.choice(["JFK", "DXB", "IST"], rows),
+        "Destination Airport Code": rng.choice(["LHR", "SYD", "SIN"], rows),
+        "Tour Code": tour_code,
+        "Ticket Designator": ticket_designator,
+    })
+    df["CTV_Reference"] = df["Origin Airport Code"] + "-" + df["Destination Airport Code"] + "-" + df["CTV_Booking Class Code"]
+    return df
+
+
+# Function to build a group mapping frame which leaves some references unmapped
+def synthetic_group_mappings():
+    references = ["Post May 2019-Y", "Post May 2019-J", "JFK-LHR-Y", "DXB-SYD-J", "IST-SIN-F", "JFK-SIN-B", "DXB-LHR-Y"]
+    return pd.DataFrame({"Reference": references + ["JFK-LHR-Y"], "Discount": [0.1, 0.15, 0.2, 0.05, 0.12, 0.3, 0.08, 0.5]})
+
+
+class ClassifyContractsTest(SimpleTestCase):
+    columns = ["Savings Contract Classifier", "Contract Classifier Tour Code", "Contract Classifier Ticket Designator", "If Discount Applied", "Discount"]
+
+    def classify(self, df, group, carried=None):
+        return classify_contracts(df.copy(), SETTINGS.contract_codes, SETTINGS.departure_cutoffs, discount_index(group), carried)
+
+    def test_matches_legacy_classification(self):
+        fixture = pd.read_csv(EXPECTED_CLASSIFICATION, parse_dates=["Departure Date"], keep_default_na=False)
+        expected = fixture[["Expected " + column for column in self.columns]].set_axis(self.columns, axis=1)
+        result = self.classify(fixture.drop(columns=expected.columns.map("Expected {}".format)), synthetic_group_mappings())
+        pd.testing.assert_frame_equal(result[self.columns], expected, check_dtype=False)
+
+    def test_departure_cutoff_classifier(self):
+        df = synthetic_air_frame(4)
+        df["Savings Alliance Classification"] = "JetBlue"
+        df["CTV_Booking Class Code"] = ["Y", "J", "YB", "F"]
+        df["Departure Date"] = pd.to_datetime(["2019-04-30", "2019-05-01", "2019-05-02", "2022-01-01"])
+        result = self.classify(df, synthetic_group_mappings())
+        # Departure dates are compared with the cut-off as text, and the two-letter class shifts the last row
+        self.assertEqual(result["Savings Contract Classifier"].tolist(), ["Post May 2019-Y", "Post May 2019-J", "Post May 2019-Y", "Post May 2019-B"])
+
+    def test_chunks_carry_the_shifted_classifiers(self):
+        df = synthetic_air_frame(40)
+        df["Savings Alliance Classification"] = np.where(np.arange(40) % 3, "JetBlue", "Emirates")
+        df.loc[[2, 5, 17], "CTV_Booking Class Code"] = ["YB", "JF", "BY"]
+        whole = self.classify(df, synthetic_group_mappings())
+        carried = {}
+        chunks = pd.concat([self.classify(df.iloc[start:start + 7], synthetic_group_mappings(), carried) for start in range(0, 40, 7)])
+        pd.testing.assert_frame_equal(chunks[self.columns], whole[self.columns])
+
+    def test_missing_reference_discount(self):
+        df = synthetic_air_frame(1)
+        df["Savings Alliance Classification"] = "Emirates"
+        df["CTV_Reference"] = "AAA-BBB-Y"
+        df["Tour Code"] = SETTINGS.contract_codes["Emirates"][0]
+        result = self.classify(df, synthetic_group_mappings())
+        self.assertEqual(result["If Discount Applied"].tolist(), ["Y"])
+        self.assertEqual(result["Discount"].tolist(), [99999.9])
+
+
+class AirSchemaTest(SimpleTestCase):
+
+    def test_schema_keeps_processed_values(self):
+        references = synthetic_references()
+        df = synthetic_air_file(300, references, SETTINGS)
+        group = pd.concat(synthetic_air_group_mappings(df, references, SETTINGS).values(), ignore_index=True)
+        df.loc[0, "Class of Service Code"] = np.nan
+        df.loc[1, "Tour Code"] = np.nan
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory, "air.csv")
+            df.to_csv(path, index=False)
+            results = [process_chunk(RunArtifacts(directory).read_csv(path, schema), synthetic_reference_lookups(references), discount_index(group),
+                                     SETTINGS, "Client", "Agency", "US", "2022")[0] for schema in [None, AIR_SCHEMA]]
+        self.assertEqual(results[1]["Carrier Code"].dtype, "category")
+        inferred, typed = [result.astype(object).where(result.notna(), None) for result in results]
+        pd.testing.assert_frame_equal(inferred, typed)
+
+
+class StageTimingsTest(SimpleTestCase):
+
+    def process(self, timings=None):
+        references = synthetic_references()
+        df = synthetic_air_file(500, references, SETTINGS)
+        group = pd.concat(synthetic_air_group_mappings(df, references, SETTINGS).values(), ignore_index=True)
+        return process_chunk(df, synthetic_reference_lookups(references), discount_index(group), SETTINGS, "Client", "Agency", "US", "2022", timings)[0]
+
+    def test_timed_chunk_matches_untimed(self):
+        timings = StageTimings()
+        pd.testing.assert_frame_equal(self.process(timings), self.process())
+        report = timings.report()
+        self.assertEqual([stage["stage"] for stage in report], ["prepare", "enrich", "classify", "savings"])
+        self.assertTrue(all(stage["rows"] == 500 and stage["calls"] == 1 for stage in report))
+        with self.assertLogs("CPR.instrumentation", "INFO") as logs:
+            timings.log("synthetic.csv")
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(logs.records[0].getMessage().splitlines()[0], "Stage timings of synthetic.csv:")
+
+    def test_disabled_timings_record_nothing(self):
+        timings = StageTimings(enabled=False)
+        with timings.stage("read") as stage:
+            stage.rows = 10
+        self.assertEqual(list(timings.iterate("read", [pd.DataFrame({"a": [1]})]))[0]["a"].tolist(), [1])
+        self.assertEqual(timings.report(), [])
+
+    def test_memory_profiling_records_allocation_sites(self):
+        timings = StageTimings(enabled=False, memory=True)
+        try:
+            self.process(timings)
+        finally:
+            timings.close()
+        self.assertFalse(tracemalloc.is_tracing())
+        report = timings.report()
+        self.assertTrue(all(stage["peak_mb"] > 0 and stage["top_sites"] for stage in report))
+        self.assertTrue(any(site["site"].startswith("air") for site in report[0]["top_sites"]))
+
+
+class GroupMappingCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name, "Group Airline Discounts Mapping.xlsx")
+        self.cache = GroupMappingCache()
+
+    def write_mappings(self, discount):
+        pd.DataFrame({"Reference": ["JFK-LHR-Y"], "Discount": [discount]}).to_excel(self.path, index=False)
+
+    def test_unchanged_workbook_is_parsed_once(self):
+        self.write_mappings(0.1)
+        self.cache.get(self.path)
+        group, discounts = self.cache.get(self.path)
+        self.assertEqual(discounts["JFK-LHR-Y"], 0.1)
+        self.assertEqual(self.cache.stats(), {"hits": 1, "misses": 1, "entries": 1})
+
+    def test_rewrite_with_same_size_and_time_is_reparsed(self):
+        self.write_mappings(0.1)
+        self.cache.get(self.path)
+        stat = os.stat(self.path)
+        self.write_mappings(0.2)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual((os.stat(self.path).st_size, os.stat(self.path).st_mtime_ns), (stat.st_size, stat.st_mtime_ns))
+        self.assertEqual(self.cache.get(self.path)[1]["JFK-LHR-Y"], 0.2)
+        self.assertEqual(self.cache.stats()["misses"], 2)
+
+    def test_callers_get_copies(self):
+        self.write_mappings(0.1)
+        group, discounts = self.cache.get(self.path)
+        group.loc[0, "Discount"] = 0.9
+        discounts["JFK-LHR-Y"] = 0.9
+        group, discounts = self.cache.get(self.path)
+        self.assertEqual((group.loc[0, "Discount"], discounts["JFK-LHR-Y"]), (0.1, 0.1))
+
+    def test_invalidate(self):
+        self.write_mappings(0.1)
+        self.cache.get(self.path)
+        self.cache.invalidate(self.path)
+        self.cache.get(self.path)
+        self.assertEqual(self.cache.stats(), {"hits": 0, "misses": 2, "entries": 1})
+
+
+class PartitionNamesTest(SimpleTestCase):
+
+    def test_client_partition_names(self):
+        quarter = pd.Period("2022-07-01", freq="Q")
+        name = client_partition_name(quarter, "A Client With A Very Long Name, Inc. & Subsidiaries " * 3)
+        self.assertTrue(name.startswith(partition_name(quarter) + "_c"))
+        # Postgres truncates identifiers longer than 63 characters
+        self.assertLessEqual(len(name), 63)
+        self.assertEqual(client_partition_name(quarter, "Client A"), client_partition_name(quarter, "Client A"))
+        self.assertNotEqual(client_partition_name(quarter, "Client A"), client_partition_name(quarter, "Client B"))
+
+
+# Loads commit on the pipeline connection, so the tests run outside a test transaction
+class FactTableTestCase(TransactionTestCase):
+
+    def setUp(self):
+        references = synthetic_references(carriers=10, airports=20)
+        Alliance.objects.bulk_create([Alliance(**row) for row in references["alliances"].to_dict("records")])
+        Airline.objects.bulk_create([Airline(**row) for row in references["airlines"].to_dict("records")])
+        Airport.objects.bulk_create([Airport(**row) for row in references["airports"].to_dict("records")])
+        self.rows = synthetic_fact_rows(20, "Merge Client")
+        with db_pool.connection() as conn:
+            ensure_quarter_partitions(conn, [pd.Period("2022-07-01", freq="Q")], ["Merge Client"])
+
+    def spool(self, db_df):
+        spool = FactRowSpool(db_df.columns)
+        spool.append(db_df)
+        self.addCleanup(spool.close)
+        return spool
+
+
+class MergeClientQuartersTest(FactTableTestCase):
+
+    def test_reloading_a_file_changes_nothing(self):
+        with db_pool.connection() as conn:
+            self.assertEqual(merge_client_quarters(conn, self.spool(self.rows), "Merge Client", "US")["inserted"], 20)
+            report = merge_client_quarters(conn, self.spool(self.rows), "Merge Client", "US")
+        self.assertEqual(report, {"inserted": 0, "updated": 0, "unchanged": 20, "deleted": 0, "backfilled": 0})
+
+    def test_files_of_other_countries_are_left_alone(self):
+        uk_rows = synthetic_fact_rows(10, "Merge Client", seed=3).assign(point_of_sale="UK")
+        with db_pool.connection() as conn:
+            merge_client_quarters(conn, self.spool(self.rows), "Merge Client", "US")
+            us_rows = set(FactTable.objects.values_list("id", "row_fingerprint"))
+            report = merge_client_quarters(conn, self.spool(uk_rows), "Merge Client", "UK")
+        self.assertEqual((report["inserted"], report["deleted"]), (10, 0))
+        self.assertEqual(set(FactTable.objects.filter(point_of_sale="US").values_list("id", "row_fingerprint")), us_rows)
+        self.assertEqual(FactTable.objects.filter(point_of_sale="UK").count(), 10)
+
+    def test_rows_loaded_without_fingerprints_are_matched_not_deleted(self):
+        with db_pool.connection() as conn:
+            # Rows loaded before row_fingerprint existed, copied without one
+            with conn:
+                with conn.cursor() as cursor:
+                    self.spool(self.rows).copy_to(cursor)
+            ids = set(FactTable.objects.values_list("id", flat=True))
+            report = merge_client_quarters(conn, self.spool(self.rows.iloc[:15]), "Merge Client", "US")
+        self.assertEqual(report, {"inserted": 0, "updated": 0, "unchanged": 15, "deleted": 5, "backfilled": 20})
+        # The rows still in the file are kept as they were, only the rows missing from it are deleted
+        self.assertLess(set(FactTable.objects.values_list("id", flat=True)), ids)
+        self.assertFalse(FactTable.objects.filter(row_fingerprint__isnull=True).exists())
+        self.assertEqual(sorted(FactTable.objects.values_list("pnr_locator", flat=True)), sorted(self.rows["pnr_locator"].iloc[:15]))
+
+
+class ReplaceClientQuartersTest(FactTableTestCase):
+
+    def test_replacing_a_file_keeps_the_other_countries(self):
+        uk_rows = synthetic_fact_rows(10, "Merge Client", seed=3).assign(point_of_sale="UK")
+        other_rows = synthetic_fact_rows(5, "Other Client", seed=4)
+        with db_pool.connection() as conn:
+            ensure_quarter_partitions(conn, [pd.Period("2022-07-01", freq="Q")], ["Other Client"])
+            merge_client_quarters(conn, self.spool(other_rows), "Other Client", "US")
+            merge_client_quarters(conn, self.spool(self.rows), "Merge Client", "US")
+            merge_client_quarters(conn, self.spool(uk_rows), "Merge Client", "UK")
+            kept = set(FactTable.objects.exclude(client_name="Merge Client", point_of_sale="US").values_list("id", "row_fingerprint"))
+            self.assertEqual(replace_client_quarters(conn, self.spool(self.rows.iloc[:12]), "Merge Client", "US"), 12)
+        self.assertEqual(set(FactTable.objects.exclude(client_name="Merge Client", point_of_sale="US").values_list("id", "row_fingerprint")), kept)
+        self.assertEqual(sorted(FactTable.objects.filter(client_name="Merge Client", point_of_sale="US").values_list("pnr_locator", flat=True)),
+                         sorted(self.rows["pnr_locator"].iloc[:12]))
+
+
+class SavingsRollupTest(FactTableTestCase):
+
+    def test_prism_flights_info_reads_the_rollup(self):
+        self.rows["discount"] = np.resize([0.0, 0.1, 0.25], len(self.rows))
+        with db_pool.connection() as conn:
+            merge_client_quarters(conn, self.spool(self.rows), "Merge Client", "US")
+            refresh_savings_rollup(conn)
+        alliances = dict(Airline.objects.values_list("carrier_code", "carrier_alliance__alliance_name"))
+        df = self.rows.assign(alliance_name=self.rows["carrier_code_id"].map(alliances))
+        df["pre_discount"] = (df["fare"] / (1 - df["discount"])).round(2)
+        df["savings"] = (df["pre_discount"] - df["fare"]).round(2)
+        prism_airlines = [df["alliance_name"].iloc[0], "Not An Alliance"]
+        totals = df[df["alliance_name"] == prism_airlines[0]][["pre_discount", "fare", "savings"]].sum()
+        self.assertEqual(BasicView().prism_flights_info("Merge Client", "Q3 2022", prism_airlines),
+                         [prism_airlines[0]] + ["{:,.2f}".format(total) for total in totals] + ["Not An Alliance", "0.00", "0.00", "0.00"])
@@ -0,0 +1,66 @@
+from functools import lru_cache
+
+import re
+
+SEPARATORS = re.compile(r"[^A-Z0-9]+")
+# Suites, floors, rooms and units are removed with the number that follows them, the property is the same whichever one is booked
+UNIT_DESIGNATORS = re.compile(r"(?:#|\b(?:SUITE|STE|UNIT|FLOOR|ROOM|RM|APT|APARTMENT)\b\.?)[\s#]*[A-Z0-9-]+")
+# Street types and directions spelled out or abbreviated in addresses, and the (USPS) abbreviation they are normalized to
+ABBREVIATIONS = {
+    "STREET": "ST", "STR": "ST", "AVENUE": "AVE", "AV": "AVE", "AVN": "AVE", "ROAD": "RD", "BOULEVARD": "BLVD", "BOUL": "BLVD",
+    "DRIVE": "DR", "DRV": "DR", "LANE": "LN", "PLACE": "PL", "COURT": "CT", "SQUARE": "SQ", "PARKWAY": "PKWY", "PKY": "PKWY",
+    "HIGHWAY": "HWY", "TERRACE": "TER", "CIRCLE": "CIR", "PLAZA": "PLZ", "EXPRESSWAY": "EXPY", "FREEWAY": "FWY", "TURNPIKE": "TPKE",
+    "CENTER": "CTR", "CENTRE": "CTR", "TRAIL": "TRL", "ALLEY": "ALY", "SAINT": "ST", "MOUNT": "MT", "FORT": "FT",
+    "NORTH": "N", "SOUTH": "S", "EAST": "E", "WEST": "W", "NORTHEAST": "NE", "NORTHWEST": "NW", "SOUTHEAST": "SE", "SOUTHWEST": "SW",
+}
+# Properties whose address key is computed in one query when the keys are refreshed
+REFRESH_BATCH_SIZE = 5000
+
+
+# Function to normalize an address for matching: upper case, suite and unit numbers removed, punctuation replaced by spaces and
+# street types and directions abbreviated
+def normalize_address(address):
+    if address is None or address != address:
+        return ""
+    address = UNIT_DESIGNATORS.sub(" ", str(address).upper())
+    return " ".join(ABBREVIATIONS.get(token, token) for token in SEPARATORS.sub(" ", address).split())
+
+
+# Function to normalize a city, country or postal code, the same few thousand values repeat on every row so they are cached
+@lru_cache(maxsize=100000)
+def normalize_place(place):
+    return normalize_address(place)
+
+
+# Function to return the address key of a normalized address, without the country and city agencies append to it
+def strip_places(address, city=None, country=None):
+    for place in (normalize_place(country), normalize_place(city)):
+        if place and address.endswith(" " + place):
+            address = address[:-len(place) - 1]
+    return address
+
+
+# Function to return the address key of a property, its normalized address without the country and city. Two addresses with
+# the same key are taken to be the same property without fuzzy matching
+def address_key(address, city=None, country=None):
+    return strip_places(normalize_address(address), city, country)
+
+
+# Function to compute the stored address_key of every Gdscodes property whose key is missing or out of date, returns the number
+# of properties updated. model is Gdscodes
+def refresh_address_keys(model):
+    updated = 0
+    batch = []
+    for concertiv_id, address, city, country, key in model.objects.values_list(
+            "concertiv_id", "property_address", "city_name", "country", "address_key").iterator(chunk_size=REFRESH_BATCH_SIZE):
+        new_key = address_key(address, city, country)
+        if new_key != key:
+            batch.append(model(concertiv_id=concertiv_id, address_key=new_key))
+        if len(batch) == REFRESH_BATCH_SIZE:
+            model.objects.bulk_update(batch, ["address_key"])
+            updated += len(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_update(batch, ["address_key"])
+        updated += len(batch)
+    return updated
@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from hotels.matching import AddressIndex
+from hotels.synthetic import synthetic_gdscodes, synthetic_hotel_file
+
+import re
+import time
+
+
+class Command(BaseCommand):
+    help = ("Builds the address index over a synthetic Gdscodes master (or the Gdscodes table with --database), matches a synthetic "
+            "hotel file against it and reports build and match times and accuracy, against the per-property loop matching used before "
+            "on a sample of the addresses.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--properties", type=int, default=1000000, help="Properties in the synthetic Gdscodes master")
+        parser.add_argument("--addresses", type=int, default=10000, help="Stays in the synthetic hotel file")
+        parser.add_argument("--database", action="store_true", help="Match against the Gdscodes table instead of a synthetic master")
+        parser.add_argument("--legacy-sample", type=int, default=5, help="Addresses timed with the per-property loop, 0 to skip it")
+        parser.add_argument("--seed", type=int, default=0)
+
+    # Function to time the per-property loop (exact, contains and regex match of every address against every property) on a sample
+    def legacy_seconds(self, addresses, properties):
+        start = time.perf_counter()
+        for address in addresses:
+            for value in properties:
+                try:
+                    if address == value or value in address or re.search(address, value):
+                        break
+                except re.error:
+                    pass
+        return (time.perf_counter() - start) / len(addresses)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        if options["database"]:
+            index = AddressIndex.from_database()
+            if not len(index.ids):
+                raise CommandError("The Gdscodes table is empty.")
+            gdscodes = None
+        else:
+            gdscodes = synthetic_gdscodes(options["properties"], seed=options["seed"])
+            index = AddressIndex(gdscodes)
+        self.stdout.write("Index of {} properties and {} tokens built in {:.2f} s".format(len(index.ids), len(index.vocabulary), time.perf_counter() - start))
+        if gdscodes is None:
+            return
+
+        hotel_df, concertiv_ids = synthetic_hotel_file(options["addresses"], gdscodes, seed=options["seed"])
+        start = time.perf_counter()
+        matches = [index.match(address, city, country) for address, city, country in zip(hotel_df["Property Address"], hotel_df["City"], hotel_df["Country"])]
+        seconds = time.perf_counter() - start
+        known = [expected is not None and expected == expected for expected in concertiv_ids]
+        correct = sum(match is not None and match["concertiv_id"] == expected for match, expected, is_known in zip(matches, concertiv_ids, known) if is_known)
+        false = sum(match is not None for match, is_known in zip(matches, known) if not is_known)
+        wrong = sum(match is not None and match["concertiv_id"] != expected for match, expected, is_known in zip(matches, concertiv_ids, known) if is_known)
+        self.stdout.write("Matched {} addresses in {:.2f} s ({:.0f} us per address)".format(len(matches), seconds, seconds / len(matches) * 1e6))
+        hashed = sum(match is not None and match["method"] == "hash" for match in matches)
+        self.stdout.write("Address key hits: {} ({:.1%})".format(hashed, hashed / len(matches)))
+        self.stdout.write("Known addresses: {} of {} matched correctly, {} matched to another property".format(correct, sum(known), wrong))
+        self.stdout.write("Unknown addresses: {} of {} matched".format(false, len(known) - sum(known)))
+        if options["legacy_sample"]:
+            sample = hotel_df["Property Address"].head(options["legacy_sample"]).tolist()
+            legacy = self.legacy_seconds(sample, index.addresses)
+            self.stdout.write("Per-property loop: {:.2f} s per address, {:.1f} h for the file ({:.0f}x slower)".format(
+                legacy, legacy * len(matches) / 3600, legacy * len(matches) / seconds))
@@ -0,0 +1,75 @@
+from django.contrib.postgres.search import SearchQuery, SearchVector
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from hotels.models import Gdscodes
+from hotels.pipeline import search_addresses
+
+import json
+import re
+
+
+class Command(BaseCommand):
+    help = ("Runs EXPLAIN ANALYZE for the Gdscodes address matching queries, the full-text search on the stored address_search "
+            "column and the icontains lookup, next to the to_tsvector-per-row query they replaced, and fails when a matching query "
+            "scans hotels_gdscodes sequentially. Run it against a production-sized Gdscodes table.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--address", help="Address to search for, by default one from the middle of the Gdscodes table")
+        parser.add_argument("--no-seqscan", action="store_true", help="Disable sequential scans, to check the indexes can serve the queries on a small table")
+
+    # Function to return every node of an EXPLAIN (FORMAT JSON) plan
+    def plan_nodes(self, plan):
+        yield plan
+        for child in plan.get("Plans", []):
+            yield from self.plan_nodes(child)
+
+    # Function to run EXPLAIN ANALYZE for a queryset, returns its execution time, scan node types and indexes used
+    def explain(self, cursor, queryset):
+        sql, params = queryset.query.sql_with_params()
+        cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql, params)
+        result = cursor.fetchone()[0]
+        explain = (json.loads(result) if isinstance(result, str) else result)[0]
+        nodes = list(self.plan_nodes(explain["Plan"]))
+        return {
+            "execution_ms": round(explain["Execution Time"], 3),
+            "scans": sorted({node["Node Type"] for node in nodes if "Scan" in node["Node Type"]}),
+            "indexes": sorted({node["Index Name"] for node in nodes if "Index Name" in node}),
+        }
+
+    # Function to return the queries to explain: (name, queryset, whether it must use an index)
+    def queries(self, address):
+        terms = re.split(", | | - |'", address)
+        fields = ("concertiv_id", "property_address")
+        return [
+            ("full-text per row (replaced)", Gdscodes.objects.values(*fields).annotate(search=SearchVector("property_address"))
+             .filter(search=SearchQuery(terms[0]) & SearchQuery(terms[1])), False),
+            ("full-text stored tsvector", search_addresses(*terms[:2]), True),
+            ("icontains address", Gdscodes.objects.values(*fields).filter(property_address__icontains=address), True),
+            ("icontains name", Gdscodes.objects.values(*fields).filter(property_name__icontains=address.split()[-1]), True),
+        ]
+
+    def handle(self, *args, **options):
+        address = options["address"]
+        if address is None:
+            rows = Gdscodes.objects.count()
+            if not rows:
+                raise CommandError("hotels_gdscodes is empty, load the Gdscodes master before explaining the address queries.")
+            address = Gdscodes.objects.order_by("concertiv_id").values_list("property_address", flat=True)[rows // 2]
+        if len(re.split(", | | - |'", address)) < 2:
+            raise CommandError("The address needs at least two words: %r" % address)
+        self.stdout.write("Explaining the address queries for %r" % address)
+        failures = []
+        with transaction.atomic(), connection.cursor() as cursor:
+            if options["no_seqscan"]:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+            for name, queryset, indexed in self.queries(address):
+                plan = self.explain(cursor, queryset)
+                status = "ok"
+                if indexed and "Seq Scan" in plan["scans"]:
+                    status = "REGRESSION: sequential scan on hotels_gdscodes"
+                    failures.append(name)
+                self.stdout.write("{:<30} {:>10.2f} ms  {:<40} {:<30} {}".format(
+                    name, plan["execution_ms"], ", ".join(plan["scans"]), ", ".join(plan["indexes"]) or "-", status))
+        if failures:
+            raise CommandError("Address queries scanning the whole table: %s" % ", ".join(failures))
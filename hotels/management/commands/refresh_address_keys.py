@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from hotels.addresses import refresh_address_keys
+from hotels.models import Gdscodes
+
+
+class Command(BaseCommand):
+    help = ("Computes the normalized address key of every Gdscodes property whose key is missing or out of date. Run it after "
+            "loading or editing the Gdscodes master outside of Django (psql COPY, SQL updates), save() and bulk_create set the key otherwise.")
+
+    def handle(self, *args, **options):
+        updated = refresh_address_keys(Gdscodes)
+        self.stdout.write("Updated the address key of {} properties".format(updated))
@@ -0,0 +1,298 @@
+from rapidfuzz import fuzz, process
+
+from .addresses import address_key, normalize_address, normalize_place, strip_places
+from .models import AddressMatch, Gdscodes, GdscodesVersion
+
+from collections import defaultdict
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+
+PROPERTY_FIELDS = ["concertiv_id", "property_address", "city_name", "postal_code", "country", "address_key"]
+# Posting lists longer than this (tokens such as ST or AVE) only count when an address has no rarer token
+MAX_POSTINGS = 1000
+# Candidates scored with rapidfuzz per address and block, and the lowest score accepted as a match
+CANDIDATES = 25
+MIN_SCORE = 90
+# Cached matches of these methods stay valid after other Gdscodes properties change, as long as the matched property does not.
+# The others (fuzzy, database and unmatched) are only valid for the Gdscodes version they were matched against
+DURABLE_METHODS = {"hash", "exact"}
+# Addresses looked up or stored in the match cache per query
+CACHE_BATCH_SIZE = 5000
+# A token missing from the index (a misspelling) of at least TYPO_MIN_LENGTH letters is looked up as the TYPO_TOKENS indexed
+# tokens closest to it, found by their shared character bigrams (short words share few trigrams once two letters are swapped),
+# which score at least TYPO_SCORE
+TYPO_MIN_LENGTH = 4
+TYPO_TOKENS = 3
+TYPO_SCORE = 75
+
+
+# Function to return the block (country and city) an address belongs to
+def block_key(country, city):
+    return "{}|{}".format(normalize_place(country), normalize_place(city))
+
+
+# Function to return the character bigrams of a token, padded so the first and last letters count as much as the others
+def bigrams(token):
+    token = "#{}#".format(token)
+    return {token[i:i + 2] for i in range(len(token) - 1)}
+
+
+# Function to tell whether a token missing from the index may be a misspelling of an indexed token. House numbers and
+# postal codes are never spelled differently, they only match exactly
+def is_word(token):
+    return len(token) >= TYPO_MIN_LENGTH and not any(character.isdigit() for character in token)
+
+
+# Function to return the house numbers of an address, the tokens made of digits only
+def house_numbers(tokens):
+    return {token for token in tokens if token.isdigit()}
+
+
+# Inverted index of the word tokens of the Gdscodes property addresses. Every property is indexed under the tokens of its
+# normalized address and its postal code, once for the whole master and once within its country and city block. The words of
+# the vocabulary are indexed by character bigrams, so a misspelled word still finds the properties of its indexed spelling.
+# Posting lists are stored as sorted NumPy arrays (CSR), so a 1M property master takes a few hundred MB. Address keys are kept
+# in hash tables, so an address whose key is the key of one property is matched without scoring any candidate
+class AddressIndex:
+
+    def __init__(self, properties):
+        self.ids = properties["concertiv_id"].to_numpy()
+        self.addresses = [normalize_address(address) for address in properties["property_address"].tolist()]
+        rows = len(self.addresses)
+        cities, countries = properties["city_name"].tolist(), properties["country"].tolist()
+        block_codes, blocks = pd.factorize(pd.Series([block_key(country, city) for country, city in zip(countries, cities)]))
+        self.blocks = pd.Index(blocks)
+
+        # Address keys: the stored key of the Gdscodes rows, computed for the properties which have none (or no key column)
+        stored_keys = properties["address_key"].tolist() if "address_key" in properties.columns else [""] * rows
+        keys = pd.Series([key if key else strip_places(address, city, country) for key, address, city, country in zip(
+            stored_keys, self.addresses, cities, countries)])
+        unique = ~keys.duplicated(keep=False).to_numpy()
+        self.key_rows = dict(zip(keys[unique], np.flatnonzero(unique)))
+        # A key shared by several properties only identifies one within its block (the same street address in two cities)
+        block_keys = pd.Series(list(zip(block_codes, keys)))
+        unique = ~block_keys.duplicated(keep=False).to_numpy()
+        self.block_key_rows = dict(zip(block_keys[unique], np.flatnonzero(unique)))
+
+        # One (row, token) pair per distinct token of every address and postal code
+        postal_codes = [normalize_place(code) for code in properties["postal_code"].tolist()]
+        tokens = pd.Series([address.split() + ([code] if code else []) for address, code in zip(self.addresses, postal_codes)]).explode().dropna()
+        pairs = pd.DataFrame({"row": tokens.index.to_numpy(), "token": tokens.to_numpy()}).drop_duplicates()
+        token_codes, vocabulary = pd.factorize(pairs["token"])
+        self.vocabulary = pd.Index(vocabulary)
+        pair_rows = pairs["row"].to_numpy()
+        size = len(vocabulary)
+
+        # Whole master: rows of token t are token_rows[token_offsets[t]:token_offsets[t + 1]]
+        order = np.argsort(token_codes, kind="stable")
+        self.token_rows = pair_rows[order]
+        self.token_offsets = np.searchsorted(token_codes[order], np.arange(size + 1))
+        document_frequency = np.diff(self.token_offsets)
+        self.idf = np.log((rows + 1) / (document_frequency + 1)) + 1.0
+
+        # Within blocks: the key of a token in a block is block * size + token
+        keys = block_codes[pair_rows].astype(np.int64) * size + token_codes
+        order = np.argsort(keys, kind="stable")
+        self.block_keys, starts = np.unique(keys[order], return_index=True)
+        self.block_offsets = np.append(starts, len(keys))
+        self.block_rows = pair_rows[order]
+
+        # Words of the vocabulary by bigram: words of bigram g are bigram_words[bigram_offsets[g]:bigram_offsets[g + 1]]
+        words = pd.Series([bigrams(token) if is_word(token) else None for token in vocabulary], dtype=object).explode().dropna()
+        bigram_codes, word_bigrams = pd.factorize(words)
+        self.word_bigrams = pd.Index(word_bigrams)
+        order = np.argsort(bigram_codes, kind="stable")
+        self.bigram_words = words.index.to_numpy()[order]
+        self.bigram_offsets = np.searchsorted(bigram_codes[order], np.arange(len(word_bigrams) + 1))
+
+    # Function to build the index from the Gdscodes table
+    @classmethod
+    def from_database(cls):
+        return cls(pd.DataFrame.from_records(Gdscodes.objects.values_list(*PROPERTY_FIELDS).iterator(chunk_size=20000), columns=PROPERTY_FIELDS))
+
+    # Function to return the vocabulary codes of the indexed words closest to a word missing from the vocabulary
+    def similar_words(self, token):
+        if not is_word(token):
+            return []
+        codes = self.word_bigrams.get_indexer(list(bigrams(token)))
+        codes = codes[codes >= 0]
+        if not len(codes):
+            return []
+        words, shared = np.unique(np.concatenate([self.bigram_words[self.bigram_offsets[g]:self.bigram_offsets[g + 1]] for g in codes]),
+                                  return_counts=True)
+        # Only the words sharing the most bigrams are scored
+        words = words[np.argsort(-shared, kind="stable")[:CANDIDATES]]
+        choices = [self.vocabulary[word] for word in words]
+        return [words[position] for choice, score, position in process.extract(
+            token, choices, scorer=fuzz.ratio, processor=None, limit=TYPO_TOKENS, score_cutoff=TYPO_SCORE)]
+
+    # Function to return the vocabulary codes of the tokens of an address, a token missing from the vocabulary is replaced by
+    # the indexed words closest to it
+    def token_codes(self, tokens):
+        codes = self.vocabulary.get_indexer(tokens)
+        similar = [word for token, code in zip(tokens, codes) if code < 0 for word in self.similar_words(token)]
+        return np.unique(np.concatenate([codes[codes >= 0], np.array(similar, dtype=codes.dtype)]))
+
+    # Function to return the posting lists of the tokens, within one block when block is not None
+    def postings(self, token_codes, block):
+        if block is None:
+            return [(self.token_rows[self.token_offsets[t]:self.token_offsets[t + 1]], t) for t in token_codes]
+        keys = block * len(self.vocabulary) + token_codes.astype(np.int64)
+        positions = np.searchsorted(self.block_keys, keys)
+        return [(self.block_rows[self.block_offsets[p]:self.block_offsets[p + 1]], t) for p, t, key in zip(positions, token_codes, keys)
+                if p < len(self.block_keys) and self.block_keys[p] == key]
+
+    # Function to return the rows sharing the most (IDF weighted) tokens with an address
+    def candidates(self, token_codes, block):
+        postings = self.postings(token_codes, block)
+        if not postings:
+            return np.empty(0, dtype=np.int64)
+        selective = [posting for posting in postings if len(posting[0]) <= MAX_POSTINGS]
+        postings = selective or [min(postings, key=lambda posting: len(posting[0]))]
+        rows = np.concatenate([posting[0] for posting in postings])
+        weights = np.concatenate([np.full(len(posting[0]), self.idf[posting[1]]) for posting in postings])
+        unique_rows, inverse = np.unique(rows, return_inverse=True)
+        scores = np.bincount(inverse, weights)
+        return unique_rows[np.argsort(-scores, kind="stable")[:CANDIDATES]]
+
+    # Function to return the best scoring candidate whose house number agrees with the address, as (row, score)
+    def best_match(self, address, tokens, rows):
+        numbers = house_numbers(tokens)
+        choices = [self.addresses[row] for row in rows]
+        for choice, score, position in process.extract(address, choices, scorer=fuzz.token_set_ratio, processor=None, limit=None, score_cutoff=MIN_SCORE):
+            candidate_numbers = house_numbers(choice.split())
+            if numbers and candidate_numbers and not numbers & candidate_numbers:
+                continue
+            return rows[position], score
+        return None
+
+    # Function to return the row of the property with the address key of an address, None when no property or several have it
+    def key_match(self, key, block):
+        row = self.block_key_rows.get((block, key)) if block >= 0 else None
+        return row if row is not None else self.key_rows.get(key)
+
+    # Function to match one address, returns {"concertiv_id", "score", "method"} or None. The address key is looked up first
+    # (method "hash"), then candidates are scored within the city block and then in the whole master (the city of the file
+    # may be spelled differently)
+    def match(self, address, city=None, country=None):
+        block = self.blocks.get_indexer([block_key(country, city)])[0] if city is not None else -1
+        key = address_key(address, city, country)
+        row = self.key_match(key, block) if key else None
+        if row is not None:
+            return {"concertiv_id": int(self.ids[row]), "score": 100.0, "method": "hash"}
+        address = normalize_address(address)
+        tokens = address.split()
+        token_codes = self.token_codes(tokens)
+        if not len(token_codes):
+            return None
+        for level in ([block] if block >= 0 else []) + [None]:
+            rows = self.candidates(token_codes, level)
+            if not len(rows):
+                continue
+            best = self.best_match(address, tokens, rows)
+            if best is not None:
+                row, score = best
+                return {"concertiv_id": int(self.ids[row]), "score": round(score, 1), "method": "exact" if self.addresses[row] == address else "fuzzy"}
+        return None
+
+
+# Function to return the version of the Gdscodes table, incremented by a trigger whenever the table changes
+def gdscodes_version():
+    return GdscodesVersion.objects.values_list("version", flat=True).first() or 0
+
+
+# Process-level cache of the address index, rebuilt when the Gdscodes version changes
+class AddressIndexCache:
+
+    def __init__(self):
+        self.version = None
+        self.index = None
+        self.lock = threading.Lock()
+
+    # Function to return the index of the current Gdscodes table, building it on first use and after a change
+    def get(self, version=None):
+        version = gdscodes_version() if version is None else version
+        with self.lock:
+            if self.index is None or self.version != version:
+                self.index = AddressIndex.from_database()
+                self.version = version
+            return self.index
+
+    def invalidate(self):
+        with self.lock:
+            self.index = None
+            self.version = None
+
+
+address_index_cache = AddressIndexCache()
+
+
+# Function to return the match cache key of an address, the SHA-1 of its city block and normalized address
+def match_key(address, city=None, country=None):
+    return hashlib.sha1("{}|{}".format(block_key(country, city), normalize_address(address)).encode()).hexdigest()
+
+
+# Function to return the fingerprint of the Gdscodes fields a match depends on, to find cached matches whose property changed
+def property_fingerprint(address, city, country):
+    return hashlib.sha1("{}|{}|{}".format(address, city, country).encode()).hexdigest()
+
+
+# Function to tell whether a cached match (a row of AddressMatch values with the current fields of its property) still holds
+def is_valid_match(entry, version):
+    if entry["gdscodes_version"] == version:
+        return True
+    if entry["method"] not in DURABLE_METHODS or entry["concertiv__property_address"] is None:
+        return False
+    return entry["property_fingerprint"] == property_fingerprint(entry["concertiv__property_address"], entry["concertiv__city_name"], entry["concertiv__country"])
+
+
+# Function to look up (address, city, country) keys in the match cache, returns {key: match or None (unmatched)} for the keys
+# with a valid cached match
+def cached_matches(keys, version):
+    hashes = defaultdict(list)
+    for key in keys:
+        if normalize_address(key[0]):
+            hashes[match_key(*key)].append(key)
+    hash_list = list(hashes)
+    fields = ["key", "concertiv_id", "score", "method", "gdscodes_version", "property_fingerprint",
+              "concertiv__property_address", "concertiv__city_name", "concertiv__country"]
+    matches = {}
+    for start in range(0, len(hash_list), CACHE_BATCH_SIZE):
+        for entry in AddressMatch.objects.filter(key__in=hash_list[start:start + CACHE_BATCH_SIZE]).values(*fields):
+            if is_valid_match(entry, version):
+                match = None if entry["concertiv_id"] is None else {"concertiv_id": entry["concertiv_id"], "score": entry["score"], "method": entry["method"]}
+                matches.update({key: match for key in hashes[entry["key"]]})
+    return matches
+
+
+# Function to return the match cache entries of the matches of (address, city, country) keys, one per match key. Raw addresses
+# normalizing to the same key (1 Main St and 1 Main Street, Suite 4) share an entry, the best match of them is kept
+def cache_entries(matches, version, fingerprints):
+    best = {}
+    for key, match in matches.items():
+        if not normalize_address(key[0]):
+            continue
+        cache_key = match_key(*key)
+        rank = (match is not None, (match["score"] or 0) if match else 0)
+        if cache_key not in best or rank > best[cache_key][0]:
+            best[cache_key] = (rank, key, match)
+    return [AddressMatch(
+        key=cache_key, address=normalize_address(key[0])[:255], block=block_key(key[2], key[1])[:255],
+        concertiv_id=match["concertiv_id"] if match else None, score=match["score"] if match else None, method=match["method"] if match else None,
+        gdscodes_version=version, property_fingerprint=fingerprints.get(match["concertiv_id"]) if match else None,
+    ) for cache_key, (rank, key, match) in best.items()]
+
+
+# Function to store the matches of (address, city, country) keys in the match cache, replacing the earlier entries of the keys.
+# The entries have distinct keys, Postgres rejects an upsert affecting the same row twice
+def store_matches(matches, version):
+    ids = list({match["concertiv_id"] for match in matches.values() if match is not None})
+    fingerprints = {}
+    for start in range(0, len(ids), CACHE_BATCH_SIZE):
+        for concertiv_id, address, city, country in Gdscodes.objects.filter(concertiv_id__in=ids[start:start + CACHE_BATCH_SIZE]).values_list(
+                "concertiv_id", "property_address", "city_name", "country"):
+            fingerprints[concertiv_id] = property_fingerprint(address, city, country)
+    AddressMatch.objects.bulk_create(cache_entries(matches, version, fingerprints), batch_size=CACHE_BATCH_SIZE, update_conflicts=True,
+                                     unique_fields=["key"], update_fields=["concertiv", "score", "method", "gdscodes_version", "property_fingerprint", "matched_at"])
@@ -0,0 +1,38 @@
+# Generated by Django 4.1.1 on 2026-10-18 10:38
+
+from django.contrib.postgres.operations import AddIndexConcurrently, TrigramExtension
+import django.contrib.postgres.indexes
+from django.db import migrations
+import django.db.models.functions.text
+
+# Stored tsvector of the property address, computed by Postgres on insert and update instead of on every full-text query
+ADD_ADDRESS_SEARCH = """
+    ALTER TABLE hotels_gdscodes ADD COLUMN address_search tsvector
+        GENERATED ALWAYS AS (to_tsvector('english', coalesce(property_address, ''))) STORED
+"""
+DROP_ADDRESS_SEARCH = "ALTER TABLE hotels_gdscodes DROP COLUMN address_search"
+CREATE_ADDRESS_SEARCH_INDEX = "CREATE INDEX CONCURRENTLY gdscodes_address_search ON hotels_gdscodes USING gin (address_search)"
+DROP_ADDRESS_SEARCH_INDEX = "DROP INDEX CONCURRENTLY gdscodes_address_search"
+
+
+class Migration(migrations.Migration):
+    # Indexes are built concurrently so matching keeps running while they are created
+    atomic = False
+
+    dependencies = [
+        ('hotels', '0001_initial'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunSQL(ADD_ADDRESS_SEARCH, DROP_ADDRESS_SEARCH),
+        migrations.RunSQL(CREATE_ADDRESS_SEARCH_INDEX, DROP_ADDRESS_SEARCH_INDEX),
+        AddIndexConcurrently(
+            model_name='gdscodes',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('property_address'), name='gin_trgm_ops'), name='gdscodes_address_trgm'),
+        ),
+        AddIndexConcurrently(
+            model_name='gdscodes',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('property_name'), name='gin_trgm_ops'), name='gdscodes_name_trgm'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 4.1.1 on 2026-10-18 10:42
+
+from django.db import migrations, models
+
+import re
+
+# The address normalization as of this migration, kept here rather than imported from hotels.addresses so the backfill does
+# not change with the code. Keys computed by a later normalization are refreshed with `manage.py refresh_address_keys`
+SEPARATORS = re.compile(r"[^A-Z0-9]+")
+UNIT_DESIGNATORS = re.compile(r"(?:#|\b(?:SUITE|STE|UNIT|FLOOR|ROOM|RM|APT|APARTMENT)\b\.?)[\s#]*[A-Z0-9-]+")
+ABBREVIATIONS = {
+    "STREET": "ST", "STR": "ST", "AVENUE": "AVE", "AV": "AVE", "AVN": "AVE", "ROAD": "RD", "BOULEVARD": "BLVD", "BOUL": "BLVD",
+    "DRIVE": "DR", "DRV": "DR", "LANE": "LN", "PLACE": "PL", "COURT": "CT", "SQUARE": "SQ", "PARKWAY": "PKWY", "PKY": "PKWY",
+    "HIGHWAY": "HWY", "TERRACE": "TER", "CIRCLE": "CIR", "PLAZA": "PLZ", "EXPRESSWAY": "EXPY", "FREEWAY": "FWY", "TURNPIKE": "TPKE",
+    "CENTER": "CTR", "CENTRE": "CTR", "TRAIL": "TRL", "ALLEY": "ALY", "SAINT": "ST", "MOUNT": "MT", "FORT": "FT",
+    "NORTH": "N", "SOUTH": "S", "EAST": "E", "WEST": "W", "NORTHEAST": "NE", "NORTHWEST": "NW", "SOUTHEAST": "SE", "SOUTHWEST": "SW",
+}
+BATCH_SIZE = 5000
+
+
+# Function to normalize an address: upper case, suite and unit numbers removed, punctuation replaced by spaces and street
+# types and directions abbreviated
+def normalize_address(address):
+    if address is None or address != address:
+        return ""
+    address = UNIT_DESIGNATORS.sub(" ", str(address).upper())
+    return " ".join(ABBREVIATIONS.get(token, token) for token in SEPARATORS.sub(" ", address).split())
+
+
+# Function to return the address key of a property, its normalized address without the country and city
+def address_key(address, city, country):
+    key = normalize_address(address)
+    for place in (normalize_address(country), normalize_address(city)):
+        if place and key.endswith(" " + place):
+            key = key[:-len(place) - 1]
+    return key
+
+
+# Function to compute the address key of the properties already in the table
+def backfill_address_keys(apps, schema_editor):
+    Gdscodes = apps.get_model('hotels', 'Gdscodes')
+    batch = []
+    for concertiv_id, address, city, country in Gdscodes.objects.values_list(
+            'concertiv_id', 'property_address', 'city_name', 'country').iterator(chunk_size=BATCH_SIZE):
+        batch.append(Gdscodes(concertiv_id=concertiv_id, address_key=address_key(address, city, country)))
+        if len(batch) == BATCH_SIZE:
+            Gdscodes.objects.bulk_update(batch, ['address_key'])
+            batch = []
+    if batch:
+        Gdscodes.objects.bulk_update(batch, ['address_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotels', '0002_gdscodes_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gdscodes',
+            name='address_key',
+            field=models.CharField(db_index=True, default='', max_length=255),
+        ),
+        migrations.RunPython(backfill_address_keys, migrations.RunPython.noop),
+    ]
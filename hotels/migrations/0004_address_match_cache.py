@@ -0,0 +1,56 @@
+# Generated by Django 4.1.1 on 2026-10-18 10:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Statement level trigger incrementing the Gdscodes version after every insert, update, delete or truncate of hotels_gdscodes
+CREATE_VERSION_TRIGGER = """
+    INSERT INTO hotels_gdscodesversion (version, changed_at) VALUES (0, now());
+
+    CREATE FUNCTION hotels_gdscodes_changed() RETURNS trigger AS $$
+    BEGIN
+        UPDATE hotels_gdscodesversion SET version = version + 1, changed_at = now();
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER hotels_gdscodes_changed AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON hotels_gdscodes
+        FOR EACH STATEMENT EXECUTE PROCEDURE hotels_gdscodes_changed();
+"""
+DROP_VERSION_TRIGGER = """
+    DROP TRIGGER hotels_gdscodes_changed ON hotels_gdscodes;
+    DROP FUNCTION hotels_gdscodes_changed();
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotels', '0003_gdscodes_address_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GdscodesVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+                ('changed_at', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AddressMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=40, unique=True)),
+                ('address', models.CharField(max_length=255)),
+                ('block', models.CharField(max_length=255)),
+                ('score', models.FloatField(null=True)),
+                ('method', models.CharField(max_length=20, null=True)),
+                ('gdscodes_version', models.BigIntegerField()),
+                ('property_fingerprint', models.CharField(max_length=40, null=True)),
+                ('matched_at', models.DateTimeField(auto_now=True)),
+                ('concertiv', models.ForeignKey(db_column='concertiv_id', db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='hotels.gdscodes')),
+            ],
+        ),
+        migrations.RunSQL(CREATE_VERSION_TRIGGER, DROP_VERSION_TRIGGER),
+    ]
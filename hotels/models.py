@@ -1,4 +1,19 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models.functions import Upper
+
+from .addresses import address_key
+
+
+class GdscodesManager(models.Manager):
+
+    # Function to insert properties with their address keys, bulk_create does not call save()
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.set_address_key()
+        return super().bulk_create(objs, *args, **kwargs)
+
 
 # Create your models here.
 class Gdscodes(models.Model):
@@ -11,6 +26,59 @@ class Gdscodes(models.Model):
     state = models.CharField(max_length=50, null=True)
     postal_code = models.CharField(max_length=50, null=True)
     country = models.CharField(max_length=50, null=True)
+    # Normalized property address (hotels.addresses.address_key), matched exactly before any fuzzy matching
+    address_key = models.CharField(max_length=255, default="", db_index=True)
+    # The table also has address_search, a tsvector of property_address generated and stored by Postgres (migration 0002).
+    # It is not a model field because Django would write it on insert, see hotels.pipeline.search_addresses
+
+    class Meta:
+        indexes = [
+            # Trigram indexes serve the icontains lookups, which Django runs as UPPER(column) LIKE UPPER(%pattern%)
+            GinIndex(OpClass(Upper("property_address"), name="gin_trgm_ops"), name="gdscodes_address_trgm"),
+            GinIndex(OpClass(Upper("property_name"), name="gin_trgm_ops"), name="gdscodes_name_trgm"),
+        ]
+
+    objects = GdscodesManager()
+
+    # Function to compute the address key from the address, city and country of the property
+    def set_address_key(self):
+        self.address_key = address_key(self.property_address, self.city_name, self.country)
+
+    def save(self, *args, **kwargs):
+        self.set_address_key()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"property_address", "city_name", "country"} & set(update_fields):
+            kwargs["update_fields"] = set(update_fields) | {"address_key"}
+        super().save(*args, **kwargs)
     
     def __str__(self):
-        return self.property_name
\ No newline at end of file
+        return self.property_name
+
+
+# Version of the Gdscodes table, incremented by a Postgres trigger after every statement that changes the table (migration
+# 0004), so loads and edits made outside of Django change it too
+class GdscodesVersion(models.Model):
+    version = models.BigIntegerField(default=0)
+    changed_at = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return str(self.version)
+
+
+# Concertiv ID an uploaded hotel address was matched to in an earlier run, None when it could not be matched. key is the SHA-1
+# of the city block and normalized address (hotels.matching.match_key)
+class AddressMatch(models.Model):
+    key = models.CharField(max_length=40, unique=True)
+    address = models.CharField(max_length=255)
+    block = models.CharField(max_length=255)
+    # No foreign key constraint, Gdscodes is reloaded independently of the cache. A match whose property was deleted or edited
+    # is found by the join with the property's current row
+    concertiv = models.ForeignKey(Gdscodes, null=True, on_delete=models.DO_NOTHING, db_constraint=False, db_column="concertiv_id", related_name="+")
+    score = models.FloatField(null=True)
+    method = models.CharField(max_length=20, null=True)
+    gdscodes_version = models.BigIntegerField()
+    property_fingerprint = models.CharField(max_length=40, null=True)
+    matched_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.address
@@ -0,0 +1,370 @@
+import datetime
+import logging
+import os
+import re
+from pathlib import Path, PureWindowsPath
+
+import pandas as pd
+from django.contrib.postgres.search import SearchQuery, SearchVectorField
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from collections import defaultdict
+
+from CPR.pipeline_settings import pipeline_settings
+from CPR.instrumentation import StageTimings
+from CPR.schemas import FrameSchema
+
+from .models import Gdscodes
+from .matching import address_index_cache, cached_matches, gdscodes_version, store_matches
+
+logger = logging.getLogger(__name__)
+
+# Column types of the OneSchema hotel file: client, city, state and country are categorical and room nights float32. The
+# check-in and check-out dates are left as text, they pass through the fuzzy match file the reviewers edit
+HOTEL_SCHEMA = FrameSchema({"Client Name": "category", "City": "category", "State": "category", "Country": "category", "Room Nights": "float32"})
+
+# Function to return the Raw TMC Data folder of a client quarter
+def dropbox_output_path(customer_name, year, quarter):
+    win_etl_output_file_path = Path(os.path.join(pipeline_settings().win_etl_output_files_path, customer_name))
+    dropbox_path = Path(os.path.join(win_etl_output_file_path, "3. Performance Reports", year, quarter, "Raw TMC Data-Dev"))
+    return PureWindowsPath(dropbox_path)
+
+
+# Function to get concertiv_ids from fuzzy match output
+def get_concertiv_ids(element, concertiv_ids_lst):
+    for i in concertiv_ids_lst:
+        for k, v in i.items():
+            if k == "property_address" and (element == v or element.__contains__(v) or re.search(element, v) or element in v or v in element):
+                return i['concertiv_id']
+    return None
+
+
+# Text search configuration of the stored address_search tsvector (migration 0002). A generated column cannot use the
+# database default (default_text_search_config), so it is built with 'english', the default of English-locale clusters,
+# and the search terms are parsed with the same configuration
+ADDRESS_SEARCH_CONFIG = "english"
+
+
+# Function to return the Gdscodes properties whose address contains all the search terms, using the stored address_search
+# tsvector and its GIN index instead of computing to_tsvector for every row
+def search_addresses(*terms):
+    search = RawSQL('"hotels_gdscodes"."address_search"', [], output_field=SearchVectorField())
+    query = SearchQuery(terms[0], config=ADDRESS_SEARCH_CONFIG)
+    for term in terms[1:]:
+        query &= SearchQuery(term, config=ADDRESS_SEARCH_CONFIG)
+    return Gdscodes.objects.values('concertiv_id', 'property_address').alias(search=search).filter(search=query)
+
+
+# Function to run one query for a batch of addresses, the query joins the unnest of its array parameters LATERAL with
+# hotels_gdscodes. Returns the (concertiv_id, property_address) rows found for every position of the arrays
+def batch_rows(query, arrays):
+    rows = [list() for i in range(len(arrays[0]))]
+    with connection.cursor() as cursor:
+        cursor.execute(query, arrays)
+        for position, concertiv_id, property_address in cursor.fetchall():
+            rows[position - 1].append({"concertiv_id": concertiv_id, "property_address": property_address})
+    return rows
+
+
+# Function to return, for every address, up to two Gdscodes properties whose address contains it (the icontains lookup),
+# in one query using the trigram index on UPPER(property_address)
+def contains_addresses(addresses):
+    query = """
+        SELECT p.position, g.concertiv_id, g.property_address
+        FROM unnest(%s::text[]) WITH ORDINALITY AS p(pattern, position)
+        CROSS JOIN LATERAL (
+            SELECT concertiv_id, property_address FROM hotels_gdscodes WHERE UPPER(property_address) LIKE UPPER(p.pattern) LIMIT 2
+        ) g"""
+    return batch_rows(query, [["%" + connection.ops.prep_for_like_query(address) + "%" for address in addresses]])
+
+
+# Function to return, for every list of search terms, up to two Gdscodes properties whose address contains all the terms (the
+# search_addresses query), in one query. The lists all have the same number of terms
+def search_address_terms(term_lists):
+    size = len(term_lists[0])
+    query = """
+        SELECT p.position, g.concertiv_id, g.property_address
+        FROM unnest({arrays}) WITH ORDINALITY AS p({terms}, position)
+        CROSS JOIN LATERAL (
+            SELECT concertiv_id, property_address FROM hotels_gdscodes WHERE {where} LIMIT 2
+        ) g""".format(
+        arrays=", ".join(["%s::text[]"] * size),
+        terms=", ".join("t{}".format(i) for i in range(size)),
+        where=" AND ".join("address_search @@ plainto_tsquery(%s, p.t{})".format(i) for i in range(size)))
+    return batch_rows(query, [[terms[i] for terms in term_lists] for i in range(size)] + [ADDRESS_SEARCH_CONFIG] * size)
+
+
+# Function to run the database cascade for the addresses the address index could not match, returns the Gdscodes rows found
+# for exactly one address query. Every level of the cascade is one query for all the addresses still unmatched: the address
+# contained in the property address, then full-text search for its first word, its first two and its first three words
+def database_matches(addresses):
+    ctv_ids_lst, converted_data = list(), list()
+    for pa, rows in zip(addresses, contains_addresses(addresses)):
+        if len(rows) == 1:
+            ctv_ids_lst.extend(rows)
+        else:
+            converted_data.append(re.split(", | | - |'", pa))
+    for size in (1, 2, 3):
+        terms = [i for i in converted_data if len(i) >= size]
+        converted_data = list()
+        if not terms:
+            break
+        for i, rows in zip(terms, search_address_terms([i[:size] for i in terms])):
+            if len(rows) == 1:
+                ctv_ids_lst.extend(rows)
+            else:
+                converted_data.append(i)
+    return ctv_ids_lst
+
+
+# Function to match every property address against Gdscodes, returns the concertiv_id per address (None when unmatched) and
+# the number of addresses matched by each method. Addresses matched in earlier runs are taken from the match cache. The others
+# are matched with the in-memory address index, by address key and then fuzzily within the city and country given for them,
+# and the ones it cannot match go through the database full-text cascade. Their matches are stored in the cache
+def match_concertiv_ids(property_address_lst, cities=None, countries=None):
+    cities = cities if cities is not None else [None] * len(property_address_lst)
+    countries = countries if countries is not None else [None] * len(property_address_lst)
+    keys = set(zip(property_address_lst, cities, countries))
+    version = gdscodes_version()
+    cached = cached_matches(keys, version)
+    misses = [key for key in keys if key not in cached]
+    index = address_index_cache.get(version) if misses else None
+    matches = {key: index.match(*key) for key in misses}
+    df_property_address_lst = list({key[0] for key, match in matches.items() if match is None and isinstance(key[0], str)})
+    ctv_ids_lst = database_matches(df_property_address_lst) if df_property_address_lst else list()
+    final_data = list()
+
+    for key, match in matches.items():
+        concertiv_id = get_concertiv_ids(key[0], ctv_ids_lst) if match is None and isinstance(key[0], str) else None
+        if concertiv_id is not None:
+            matches[key] = {"concertiv_id": concertiv_id, "score": None, "method": "database"}
+    store_matches(matches, version)
+    matches.update({key: match and dict(match, method="cache") for key, match in cached.items()})
+
+    report = {"cache": 0, "hash": 0, "exact": 0, "fuzzy": 0, "database": 0, "unmatched": 0}
+    for key in zip(property_address_lst, cities, countries):
+        match = matches[key]
+        final_data.append(match["concertiv_id"] if match is not None else None)
+        report[match["method"] if match is not None else "unmatched"] += 1
+    # Shares of the addresses resolved by the match cache and by the address key lookup, without fuzzy matching
+    report["cache_hit_rate"] = round(report["cache"] / len(final_data), 3) if final_data else 0.0
+    report["hash_hit_rate"] = round(report["hash"] / len(final_data), 3) if final_data else 0.0
+    return final_data, report
+
+
+# Function to change date format for bo ctv discounts
+def change_date_format(bo_row_lst):
+    final_bo_row_lst = []
+    for bo in bo_row_lst:
+        if type(bo) != str:
+            continue
+        else:
+            bo = datetime.datetime.strptime(bo, "%Y-%m-%d")
+            bo = datetime.datetime.strftime(bo, "%m/%d/%Y")
+            final_bo_row_lst.append(bo)
+    return final_bo_row_lst
+
+
+# Function that returns list of bo date
+def get_bo_dates_list(df):
+    bo_rows_lst = list()
+    for index, rows in df.iterrows():
+        row_lst = [rows.BO1_s, rows.BO1_e, rows.BO2_s, rows.BO2_e, rows.BO3_s, rows.BO3_e, rows.BO4_s, rows.BO4_e, rows.BO5_s, rows.BO5_e,
+                   rows.BO6_s, rows.BO6_e, rows.BO7_s, rows.BO7_e, rows.BO8_s, rows.BO8_e, rows.BO9_s, rows.BO9_e, rows.BO10_s, rows.BO10_e]
+        row_lst = change_date_format(row_lst)
+        bo_rows_lst.append(row_lst)
+    return bo_rows_lst
+
+
+# Function to add the brand and group name, dynamic and chainwide discounts, pre-discount cost and savings to a fuzzy match frame.
+# The group mapping frames are the sheets of Group Hotel Discounts Mapping.xlsx: Group CTV IDs, Group BO dates,
+# Special Contracts, Special Contracts BO dates and Chainwide discounts
+def calculate_group_savings(fuzzy_df, group_ctv_df, group_bo_df, sc_ctv_df, sc_bo_df, ch_wd_df):
+    # Group CTV,Special Contracts Mappings
+    group_ctv_lst = group_ctv_df['Concertiv_Hotel_UID'].to_list()
+    sc_ctv_lst = sc_ctv_df['Concertiv_Hotel_UID'].to_list()
+    sc_client_names_lst = sc_ctv_df['Client Name'].to_list()
+    chw_chain_name_lst = ch_wd_df['Chain_name'].to_list()
+
+    # Extracting BO dates and concertiv id in dictionary
+    group_bo_ctv_lst = group_bo_df['CTV ID'].tolist()
+    sc_bo_ctv_lst = sc_bo_df['Concertiv_Hotel_UID'].tolist()
+    sc_bo_client_names_lst = sc_bo_df['Client Name'].tolist()
+    grp_bo_rows_lst = get_bo_dates_list(group_bo_df)
+    sc_bo_rows_lst = get_bo_dates_list(sc_bo_df)
+
+    grp_bo_dates_dict = dict()
+    for ctv_id, bo_dates in zip(group_bo_ctv_lst, grp_bo_rows_lst):
+        grp_bo_dates_dict[ctv_id] = bo_dates
+
+    # Extracting Group Discounts - Dynamic
+    fuzzy_checkin_dates_lst, grp_bo_dates_lst, group_dynmc_disc_lst, sc_dynm_disc_lst, sc_bo_dates_lst = list(), list(), list(), list(), list()
+    fuzzy_ctv_ids_lst = fuzzy_df['CTV ID'].tolist()
+    fuzzy_client_names_lst = fuzzy_df['Client Name'].tolist()
+    fuzzy_df['Check-in Date'] = pd.to_datetime(fuzzy_df['Check-in Date'], format="%Y-%m-%d").dt.strftime("%m/%d/%Y")
+    fuzzy_df['Check-out Date'] = pd.to_datetime(fuzzy_df['Check-out Date'], format="%Y-%m-%d").dt.strftime("%m/%d/%Y")
+    fuzzy_df['Spends'] = fuzzy_df['Spends'].round(decimals=2)
+    fuzzy_checkin_dates_lst = fuzzy_df['Check-in Date'].tolist()
+    n = 2
+    grp_disc_lst, sc_disc_lst = list(), list()
+
+    # Group CTV - Dynamic Discount
+    for i, (j, k) in enumerate(zip(fuzzy_ctv_ids_lst, fuzzy_checkin_dates_lst)):
+        if j in group_ctv_lst:
+            disc = pd.Series(group_ctv_df.loc[group_ctv_df["Concertiv_Hotel_UID"] == j,  "Discount"]).item()
+            grp_disc_lst.append(disc)
+            if j in grp_bo_dates_dict.keys():
+                for k1, v in grp_bo_dates_dict.items():
+                    if k1 == j:
+                        v = [grp_bo_dates_dict[j][m * n:(j + 1) * n] for m in range((len(grp_bo_dates_dict[j]) + n - 1) // n)]
+                    for bo in v:
+                        start_date = bo[0]
+                        end_date = bo[1]
+                        if start_date <= k <= end_date:
+                            grp_disc_lst[i] = None
+        else:
+            grp_disc_lst.append(None)
+
+    # Group Mapping - Special Group : CTV and BO dates
+    fuzzy_ctv_client_dict, sc_ctv_client_dict, sc_bo_ctv_dates_dict, sc_bo_ctv_client_dict, d = defaultdict(list), defaultdict(list), defaultdict(list), defaultdict(list), list()
+    for ctv_id, client_name in zip(fuzzy_ctv_ids_lst, fuzzy_client_names_lst):
+        fuzzy_ctv_client_dict[ctv_id].append(client_name)
+    for ctv_id, client_name in zip(sc_ctv_lst, sc_client_names_lst):
+        sc_ctv_client_dict[ctv_id].append(client_name)
+    for ctv_id, client_name in zip(sc_bo_ctv_lst, sc_bo_client_names_lst):
+        sc_bo_ctv_client_dict[ctv_id].append(client_name)
+    for client_name, bo_dates in zip(sc_bo_client_names_lst, sc_bo_rows_lst):
+        sc_bo_ctv_dates_dict[client_name].append(bo_dates)
+
+    # Special Contracts - Dynamic discount   
+    for k, v in fuzzy_ctv_client_dict.items():
+        if k in sc_ctv_client_dict.keys():
+            for v0 in v:
+                disc = pd.Series(sc_ctv_df.loc[(sc_ctv_df['Concertiv_Hotel_UID'] == k) & (sc_ctv_df['Client Name'] == v0), "Discount"]).item()
+                sc_disc_lst.append(disc)
+                if k in sc_bo_ctv_client_dict.keys() and v0 in sc_bo_ctv_dates_dict.keys():
+                    for (k1, v1), (k2, v2) in zip(sc_bo_ctv_client_dict.items(), sc_bo_ctv_dates_dict.items()):
+                        if k1 == k and k2 == v0:
+                            for v in v2:
+                                d = [v[i0 * n:(i0 + 1) * n] for i0 in range((len(v) + n - 1) // n )]
+        else:
+            sc_disc_lst.append(None)
+    for i, j in enumerate(fuzzy_checkin_dates_lst):
+        for bo in d:
+            start_date = bo[0]
+            end_date = bo[1]
+            if start_date <= j <= end_date:
+                sc_disc_lst[i] = None 
+
+    # Chainwide discount
+    chain_names_lst, group_name_lst, chwd_disc_lst = list(), list(), list()
+    # The chain names of all the CTV IDs are read in one query, hotels missing from Gdscodes are skipped. concertiv_id is the
+    # primary key, so each CTV ID has one chain name, as with the query per CTV ID this replaces
+    chain_names = dict(Gdscodes.objects.filter(concertiv_id__in={ctv_id for ctv_id in fuzzy_ctv_ids_lst if ctv_id == ctv_id and ctv_id is not None})
+                       .values_list("concertiv_id", "chain_name"))
+    for ctv_id in fuzzy_ctv_ids_lst:
+        if ctv_id in chain_names:
+            chain_names_lst.append(chain_names[ctv_id])
+    for j in chain_names_lst:
+        group_name_lst.append(pd.Series(ch_wd_df.loc[ch_wd_df['Chain_name'] == j, "Hotel_Group"]).item())
+    for i, j in zip(chain_names_lst, group_name_lst):
+        disc = pd.Series(ch_wd_df.loc[(ch_wd_df['Chain_name'] == i) & (ch_wd_df['Hotel_Group'] == j), "Rate"]).item()
+        chwd_disc_lst.append(disc)
+
+    # Discount calculation
+    pre_discount, savings = list(), list()
+    spends = fuzzy_df['Spends'].tolist()
+
+    for i, j, k, l in zip(spends, grp_disc_lst, sc_disc_lst, chwd_disc_lst):
+        if j == None and k == None and l == None:
+            pre_discount.append(0.0)
+        elif (j and k) == None and (l == 0.0 or l == None):
+            pre_discount.append(0.0)
+        elif j and l == None and (k == 0.0 or k == None):
+            pre_discount.append(0.0)
+        elif (k and l) == None and (j == 0.0 or j == None):
+            pre_discount.append(0.0)
+        elif j and (k == None or k == 0.0) and (l == None or l == 0.0):
+            discount = i / (1 - j)
+            pre_discount.append(round(discount, 2))
+        elif (j == None or j == 0.0) and k and (l == None or l == 0.0):
+            discount = i / (1 - k)
+            pre_discount.append(round(discount, 2))
+        elif (j == None or j == 0.0) and (k == None or k == 0.0) and l:
+            discount = i / (1 - l)
+            pre_discount.append(round(discount, 2))
+        elif (j and k) and (l == None or l == 0.0):
+            if j > k:
+                discount = i / (1 - j)
+                pre_discount.append(round(discount, 2)) 
+            else:
+                discount = i / (1 - k)
+                pre_discount.append(round(discount, 2))
+        elif (j and l) and (k == None or k == 0.0):
+            if j > l:
+                discount = i / (1 - j)
+                pre_discount.append(round(discount, 2))
+            else:
+                discount = i / (1 - l)
+                pre_discount.append(round(discount, 2))
+        elif (k and l) and (j == None or j == 0.0):
+            if k > l:
+                discount = i / (1 - k)
+                pre_discount.append(round(discount, 2))
+            else:
+                discount = i / (1 - l)
+                pre_discount.append(round(discount, 2))
+        elif j and k and l:
+            if j > k > l:
+                discount = i / (1 - j)
+                pre_discount.append(round(discount, 2))
+            elif k > j > l:
+                discount = i / (1 - k)
+                pre_discount.append(round(discount, 2))
+            elif l > j > k:
+                discount = i / (1 - l)
+                pre_discount.append(round(discount, 2))
+
+    # Insert concertiv_ids into dataframe
+    fuzzy_df.insert(8, "Brand Name", [i for i in chain_names_lst])
+    fuzzy_df.insert(9, "Group Name", [i for i in group_name_lst])
+    fuzzy_df.insert(10, "Group Discount - Dynamic", [i for i in grp_disc_lst])
+    fuzzy_df.insert(11, "Special Contracts - Dynamic", [i for i in sc_disc_lst])
+    fuzzy_df.insert(12, "Chainwide Discount", [i for i in chwd_disc_lst])
+    fuzzy_df.insert(13, "Pre - Discount", [i for i in pre_discount])
+    pre_disc_cost = fuzzy_df["Pre - Discount"].to_list()
+    [savings.append(0.0) if pre == 0.0 else savings.append(pre - f) for f, pre in zip(spends, pre_disc_cost)]
+    fuzzy_df.insert(14, "Savings", [round(s, 2) for s in savings])
+    return fuzzy_df
+
+
+# Function to run the hotels fuzzy match for one OneSchema CSV file, returns the run result
+def fuzzy_match_file(csv_file_path, customer_name, travel_type, country, year, quarter):
+    if not os.path.isfile(csv_file_path):
+        raise FileNotFoundError("Unable to find CSV file in specified directory: %s" % csv_file_path)
+    final_dropbox_path = dropbox_output_path(customer_name, year, quarter)
+    settings = pipeline_settings()
+    timings = StageTimings(settings.stage_timing, settings.memory_profiling)
+    try:
+        # Converting .CSV file to dataframe
+        with timings.stage("read") as stage:
+            df = pd.read_csv(csv_file_path, **HOTEL_SCHEMA.read_options())
+            stage.rows = len(df.index)
+
+        # Insert concertiv_ids into dataframe
+        with timings.stage("match", len(df.index)):
+            cities = df["City"].to_list() if "City" in df.columns else None
+            countries = df["Country"].to_list() if "Country" in df.columns else None
+            final_data, match_report = match_concertiv_ids(df["Property Address"].to_list(), cities, countries)
+            df.insert(8, "Concertiv ID", [i for i in final_data])
+
+        # Adding new column - concertiv_id into excel sheet
+        new_file_name = "{}_{}_{}{}_{}_FuzzyMatch.xlsx".format(customer_name, travel_type, quarter, year, country)
+        new_file_path = Path(os.path.join(final_dropbox_path, new_file_name))
+        with timings.stage("write_xlsx", len(df.index)):
+            df.to_excel(new_file_path, index=False)
+    finally:
+        timings.close()
+    logger.info("Match report of %s: %s", os.path.basename(csv_file_path), match_report)
+    timings.log(os.path.basename(csv_file_path))
+    return {"file_path": str(new_file_path), "rows": len(df.index), "match_report": match_report, "stages": timings.report()}
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+# Hotel chains of the synthetic Gdscodes master: chain code, chain name and the hotel group of the chainwide discounts
+SYNTHETIC_CHAINS = [
+    ("MC", "Marriott", "Marriott International"), ("RZ", "Ritz-Carlton", "Marriott International"), ("SI", "Sheraton", "Marriott International"),
+    ("WI", "Westin", "Marriott International"), ("HH", "Hilton", "Hilton Worldwide"), ("DT", "DoubleTree", "Hilton Worldwide"),
+    ("ES", "Embassy Suites", "Hilton Worldwide"), ("HY", "Hyatt", "Hyatt Hotels"), ("AN", "Andaz", "Hyatt Hotels"),
+    ("IC", "InterContinental", "IHG"), ("HI", "Holiday Inn", "IHG"), ("KI", "Kimpton", "IHG"), ("FS", "Four Seasons", "Four Seasons"),
+    ("AC", "Accor", "Accor"), ("SO", "Sofitel", "Accor"), ("FA", "Fairmont", "Accor"),
+]
+SYNTHETIC_CITIES = [("NEW YORK", "NY", "10001"), ("CHICAGO", "IL", "60601"), ("BOSTON", "MA", "02108"), ("SAN FRANCISCO", "CA", "94102"),
+                    ("LOS ANGELES", "CA", "90012"), ("MIAMI", "FL", "33131"), ("DALLAS", "TX", "75201"), ("SEATTLE", "WA", "98101"),
+                    ("ATLANTA", "GA", "30303"), ("DENVER", "CO", "80202"), ("WASHINGTON", "DC", "20001"), ("HOUSTON", "TX", "77002")]
+SYNTHETIC_STREETS = ["MAIN ST", "BROADWAY", "PARK AVE", "MARKET ST", "LAKE SHORE DR", "OCEAN DR", "COMMERCE ST", "PINE ST", "PEACHTREE ST",
+                     "LARIMER ST", "PENNSYLVANIA AVE", "TRAVIS ST", "MADISON AVE", "STATE ST", "MISSION ST", "FIGUEROA ST"]
+# Blackout period columns of the BO dates sheets
+BO_COLUMNS = ["BO{}_{}".format(i, end) for i in range(1, 11) for end in ["s", "e"]]
+
+
+# Function to build a Gdscodes master of hotel properties with distinct property addresses, with the model field names
+def synthetic_gdscodes(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    chains = rng.integers(0, len(SYNTHETIC_CHAINS), rows)
+    cities = rng.integers(0, len(SYNTHETIC_CITIES), rows)
+    streets = rng.integers(0, len(SYNTHETIC_STREETS), rows)
+    return pd.DataFrame({
+        "concertiv_id": range(1, rows + 1),
+        "chain_code": [SYNTHETIC_CHAINS[c][0] for c in chains],
+        "chain_name": [SYNTHETIC_CHAINS[c][1] for c in chains],
+        "property_name": ["{} {} {}".format(SYNTHETIC_CHAINS[c][1], SYNTHETIC_CITIES[city][0].title(), i + 1) for i, (c, city) in enumerate(zip(chains, cities))],
+        # The house number is unique per property, so every address identifies one property
+        "property_address": ["{} {}".format(i + 1, SYNTHETIC_STREETS[s]) for i, s in enumerate(streets)],
+        "city_name": [SYNTHETIC_CITIES[city][0] for city in cities],
+        "state": [SYNTHETIC_CITIES[city][1] for city in cities],
+        "postal_code": [SYNTHETIC_CITIES[city][2] for city in cities],
+        "country": "US",
+    })
+
+
+# Function to build a OneSchema hotel file of stays at Gdscodes properties. match_rate of the stays use the master address
+# (half of them with the city appended, as agencies often send it), the others addresses which are not in the master.
+# The intended concertiv_id of every stay is returned alongside, None for unknown addresses
+def synthetic_hotel_file(rows, gdscodes, client_name="Benchmark Client", seed=0, quarter_start="2022-07-01", match_rate=0.8):
+    rng = np.random.default_rng(seed)
+    quarter = pd.Period(quarter_start, freq="Q")
+    properties = gdscodes.iloc[rng.choice(len(gdscodes.index), rows, replace=rows > len(gdscodes.index))].reset_index(drop=True)
+    matched = rng.random(rows) < match_rate
+    with_city = rng.random(rows) < 0.5
+    addresses = [address + (", " + city if suffix else "") if known else "{} UNKNOWN RD".format(100000 + i)
+                 for i, (address, city, known, suffix) in enumerate(zip(properties["property_address"], properties["city_name"], matched, with_city))]
+    check_in = quarter.start_time + pd.to_timedelta(rng.integers(0, (quarter.end_time - quarter.start_time).days - 7, rows), unit="D")
+    nights = rng.integers(1, 6, rows)
+    hotel_df = pd.DataFrame({
+        "Client Name": client_name,
+        "Traveller Name": ["TRAVELLER{}, NAME{}".format(i % 5000, i % 97) for i in range(rows)],
+        "Property Name": properties["property_name"],
+        "City": properties["city_name"],
+        "State": properties["state"],
+        "Country": properties["country"],
+        "Check-in Date": check_in.strftime("%Y-%m-%d"),
+        "Check-out Date": (check_in + pd.to_timedelta(nights, unit="D")).strftime("%Y-%m-%d"),
+        "Property Address": addresses,
+        "Room Nights": nights,
+        "Spends": (nights * rng.uniform(120, 650, rows)).round(2),
+    })
+    concertiv_ids = properties["concertiv_id"].where(matched, None).tolist()
+    return hotel_df, concertiv_ids
+
+
+# Function to build the reviewed fuzzy match file the group savings calculation is run on, with the CTV ID of every stay
+def synthetic_fuzzy_match_file(rows, gdscodes, client_name="Benchmark Client", seed=0, quarter_start="2022-07-01"):
+    hotel_df, concertiv_ids = synthetic_hotel_file(rows, gdscodes, client_name, seed, quarter_start, match_rate=1.0)
+    hotel_df.insert(8, "CTV ID", concertiv_ids)
+    return hotel_df
+
+
+# Function to return a blackout dates frame, one period inside the quarter for every hotel and the other BO columns empty
+def synthetic_bo_dates(ctv_ids, quarter, rng):
+    start = quarter.start_time + pd.to_timedelta(rng.integers(0, 80, len(ctv_ids)), unit="D")
+    df = pd.DataFrame(np.nan, index=range(len(ctv_ids)), columns=BO_COLUMNS, dtype=object)
+    df["BO1_s"] = start.strftime("%Y-%m-%d")
+    df["BO1_e"] = (start + pd.Timedelta(days=5)).strftime("%Y-%m-%d")
+    return df
+
+
+# Function to build the sheets of Group Hotel Discounts Mapping.xlsx for a Gdscodes master, in the order the savings
+# calculation reads them. Group and special contract hotels are disjoint, a third of them have a blackout period
+def synthetic_hotel_group_mappings(gdscodes, client_name="Benchmark Client", seed=0, quarter_start="2022-07-01", group_rate=0.2, special_rate=0.1):
+    rng = np.random.default_rng(seed)
+    quarter = pd.Period(quarter_start, freq="Q")
+    ctv_ids = rng.permutation(gdscodes["concertiv_id"].to_numpy())
+    group_ids = ctv_ids[:int(len(ctv_ids) * group_rate)]
+    special_ids = ctv_ids[len(group_ids):len(group_ids) + int(len(ctv_ids) * special_rate)]
+    group_bo_ids = group_ids[:len(group_ids) // 3]
+    special_bo_ids = special_ids[:len(special_ids) // 3]
+    chains = pd.DataFrame(SYNTHETIC_CHAINS, columns=["Chain_code", "Chain_name", "Hotel_Group"]).drop(columns="Chain_code")
+    chains["Rate"] = rng.choice([0.0, 0.05, 0.08, 0.1], len(chains.index))
+    return {
+        "Group CTV": pd.DataFrame({"Concertiv_Hotel_UID": group_ids, "Discount": rng.uniform(0.05, 0.25, len(group_ids)).round(3)}),
+        "Group BO": pd.concat([pd.DataFrame({"CTV ID": group_bo_ids}), synthetic_bo_dates(group_bo_ids, quarter, rng)], axis=1),
+        "Special Contracts": pd.DataFrame({"Concertiv_Hotel_UID": special_ids, "Client Name": client_name, "Client ID": 1,
+                                           "Discount": rng.uniform(0.05, 0.3, len(special_ids)).round(3)}),
+        "Special Contracts BO": pd.concat([pd.DataFrame({"Concertiv_Hotel_UID": special_bo_ids, "Client Name": client_name}),
+                                           synthetic_bo_dates(special_bo_ids, quarter, rng)], axis=1),
+        "Chainwide": chains,
+    }
@@ -1,3 +1,123 @@
-from django.test import TestCase
+from django.db import connections
+from django.test import SimpleTestCase, TestCase
+from unittest import mock
+
+from .addresses import address_key, normalize_address
+from .matching import AddressIndex, cache_entries, is_valid_match, match_key, property_fingerprint
+from .models import Gdscodes
+from .pipeline import database_matches, search_address_terms, search_addresses
+
+import pandas as pd
 
 # Create your tests here.
+PROPERTIES = pd.DataFrame({
+    "concertiv_id": [1, 2, 3, 4],
+    "property_address": ["1 Main St.", "10 Main St", "1 Main St", "250 Park Avenue South"],
+    "city_name": ["NEW YORK", "NEW YORK", "BOSTON", "NEW YORK"],
+    "postal_code": ["10001", "10001", "02108", "10003"],
+    "country": ["US", "US", "US", "US"],
+})
+
+
+class AddressIndexTest(SimpleTestCase):
+
+    def setUp(self):
+        self.index = AddressIndex(PROPERTIES)
+
+    def test_normalize_address(self):
+        self.assertEqual(normalize_address("  1 Main St., Suite #4 "), "1 MAIN ST")
+        self.assertEqual(normalize_address("250 Park Avenue South, Ste. 12B"), "250 PARK AVE S")
+        self.assertEqual(normalize_address("10 Main Street #1200"), "10 MAIN ST")
+        self.assertEqual(normalize_address(None), "")
+        self.assertEqual(address_key("1 Main Street, New York, US", "New York", "US"), "1 MAIN ST")
+
+    def test_address_key_matches_without_scoring(self):
+        match = self.index.match("250 Park Avenue South, Suite 300, New York", "NEW YORK", "US")
+        self.assertEqual((match["concertiv_id"], match["method"]), (4, "hash"))
+        # The key of 1 Main St is shared by two cities, it only identifies a property within a known city
+        self.assertEqual(self.index.match("1 MAIN STREET", "BOSTON", "US")["method"], "hash")
+        self.assertNotEqual(self.index.match("1 MAIN STREET", "NYC", "US")["method"], "hash")
+
+    def test_city_block_decides_between_equal_addresses(self):
+        self.assertEqual(self.index.match("1 MAIN ST", "NEW YORK", "US")["concertiv_id"], 1)
+        self.assertEqual(self.index.match("1 main st", "Boston", "US")["concertiv_id"], 3)
+
+    def test_fuzzy_match_keeps_house_number(self):
+        match = self.index.match("250 Park Avenue Suth", "NEW YORK", "US")
+        self.assertEqual((match["concertiv_id"], match["method"]), (4, "fuzzy"))
+        self.assertIsNone(self.index.match("12 Main St", "NEW YORK", "US"))
+        self.assertIsNone(self.index.match("99 Unknown Rd", "NEW YORK", "US"))
+
+    def test_unknown_city_searches_whole_master(self):
+        self.assertEqual(self.index.match("10 Main St", "NYC", "US")["concertiv_id"], 2)
+
+    def test_misspelled_word_finds_its_indexed_spelling(self):
+        vocabulary = self.index.vocabulary
+        self.assertEqual([vocabulary[code] for code in self.index.token_codes(["250", "PRAK", "AVE"])], ["250", "PARK", "AVE"])
+        self.assertEqual(list(self.index.candidates(self.index.token_codes(["PRAK"]), None)), [3])
+        # House numbers and postal codes only match exactly
+        self.assertEqual(self.index.similar_words("10002"), [])
+        self.assertEqual(self.index.similar_words("UNKNOWN"), [])
+
+
+class MatchCacheTest(SimpleTestCase):
+
+    def entry(self, method, version, address="1 Main St", city="NEW YORK"):
+        return {"concertiv_id": 1, "score": 100.0, "method": method, "gdscodes_version": version,
+                "property_fingerprint": property_fingerprint("1 Main St", "NEW YORK", "US"),
+                "concertiv__property_address": address, "concertiv__city_name": city, "concertiv__country": "US"}
+
+    def test_match_key_normalizes_the_raw_address(self):
+        self.assertEqual(match_key("1 Main Street, Suite 4", "New York", "US"), match_key("1 MAIN ST.", "NEW YORK", "US"))
+        self.assertNotEqual(match_key("1 Main St", "NEW YORK", "US"), match_key("1 Main St", "BOSTON", "US"))
+
+    def test_addresses_sharing_a_match_key_store_one_entry(self):
+        matches = {
+            ("1 Main St", "NEW YORK", "US"): None,
+            ("1 Main Street, Suite 4", "NEW YORK", "US"): {"concertiv_id": 1, "score": 100.0, "method": "hash"},
+            ("1 MAIN ST.", "NEW YORK", "US"): {"concertiv_id": 1, "score": 95.0, "method": "fuzzy"},
+            ("1 Main St", "BOSTON", "US"): {"concertiv_id": 3, "score": 100.0, "method": "hash"},
+        }
+        entries = cache_entries(matches, 7, {1: "a", 3: "b"})
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(len({entry.key for entry in entries}), 2)
+        entry = next(entry for entry in entries if entry.key == match_key("1 Main St", "NEW YORK", "US"))
+        self.assertEqual((entry.concertiv_id, entry.method, entry.property_fingerprint), (1, "hash", "a"))
+
+    def test_cached_match_invalidated_by_property_change(self):
+        self.assertTrue(is_valid_match(self.entry("fuzzy", 7), 7))
+        self.assertTrue(is_valid_match(self.entry("hash", 7), 8))
+        self.assertFalse(is_valid_match(self.entry("fuzzy", 7), 8))
+        self.assertFalse(is_valid_match(self.entry("hash", 7, address="2 Main St"), 8))
+        self.assertFalse(is_valid_match(self.entry("hash", 7, address=None, city=None), 8))
+
+
+class DatabaseCascadeTest(SimpleTestCase):
+
+    # Function to run the database cascade with a cursor finding nothing, returns the number of queries it ran
+    def queries(self, addresses):
+        with mock.patch.object(connections["default"], "cursor") as cursor:
+            cursor.return_value.__enter__.return_value.fetchall.return_value = []
+            self.assertEqual(database_matches(addresses), [])
+            return cursor.return_value.__enter__.return_value.execute.call_count
+
+    def test_query_count_does_not_grow_with_addresses(self):
+        addresses = ["{} Unknown Road, Springfield".format(i) for i in range(500)]
+        # One query per cascade level: contains, then the first one, two and three words
+        self.assertEqual(self.queries(addresses[:5]), 4)
+        self.assertEqual(self.queries(addresses), 4)
+
+
+class AddressSearchTest(TestCase):
+
+    def setUp(self):
+        Gdscodes.objects.bulk_create([
+            Gdscodes(concertiv_id=row.concertiv_id, chain_code="XX", chain_name="Chain", property_name="Hotel {}".format(row.concertiv_id),
+                     property_address=row.property_address, city_name=row.city_name, postal_code=row.postal_code, country=row.country)
+            for row in PROPERTIES.itertuples()])
+
+    def test_terms_are_parsed_with_the_stored_column_configuration(self):
+        # 'english' stems Avenues to the avenu of the stored tsvector
+        self.assertEqual([row["concertiv_id"] for row in search_addresses("Park", "Avenues")], [4])
+        self.assertEqual(search_address_terms([["Park", "Avenues"], ["Main", "Springfield"]]),
+                         [[{"concertiv_id": 4, "property_address": "250 Park Avenue South"}], []])
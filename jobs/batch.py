@@ -0,0 +1,85 @@
+from django.db import connections
+from django.utils.module_loading import import_string
+
+from pathlib import Path
+import csv
+import django
+import json
+import os
+import time
+import traceback
+
+# Manifest kinds and the job kind whose pipeline function runs them, with the columns each entry needs
+BATCH_KINDS = {"air": "air.process_data", "hotels": "hotels.fuzzy_match"}
+REQUIRED_COLUMNS = {
+    "air": ["csv_file_path", "customer_name", "travel_agency", "travel_type", "country", "year", "quarter"],
+    "hotels": ["csv_file_path", "customer_name", "travel_type", "country", "year", "quarter"],
+}
+FLAG_COLUMNS = {"air": ["write_db_staging", "replace_existing"], "hotels": []}
+TRUE_VALUES = {"1", "true", "yes", "y", "on"}
+
+
+# Function to read a batch manifest, a CSV file with a header row or a JSON list of objects, returns one dict per entry
+def read_manifest(manifest_path):
+    manifest_path = Path(manifest_path)
+    if manifest_path.suffix.lower() == ".json":
+        rows = json.loads(manifest_path.read_text())
+    else:
+        with open(manifest_path, newline="", encoding="utf-8-sig") as f:
+            rows = list(csv.DictReader(f))
+    return [manifest_entry(row, line) for line, row in enumerate(rows, start=1)]
+
+
+# Function to validate one manifest row, returns the entry with its kind and the keyword arguments of its pipeline function
+def manifest_entry(row, line):
+    kind = str(row.get("kind") or "").strip().lower()
+    if kind not in BATCH_KINDS:
+        raise ValueError("Entry {}: kind must be one of {}, got {!r}".format(line, ", ".join(BATCH_KINDS), row.get("kind")))
+    missing = [column for column in REQUIRED_COLUMNS[kind] if not str(row.get(column) or "").strip()]
+    if missing:
+        raise ValueError("Entry {}: missing {}".format(line, ", ".join(missing)))
+    params = {column: str(row[column]).strip() for column in REQUIRED_COLUMNS[kind]}
+    for column in FLAG_COLUMNS[kind]:
+        value = row.get(column)
+        params[column] = value if isinstance(value, bool) else str(value or "").strip().lower() in TRUE_VALUES
+    return {"entry": line, "kind": kind, "params": params}
+
+
+# Function to group the entries into tasks which can run in parallel. Air files of the same client are merged into the same
+# client quarters, so they stay in one task and run one after another in manifest order
+def batch_tasks(entries):
+    tasks = {}
+    for entry in entries:
+        key = ("air", entry["params"]["customer_name"]) if entry["kind"] == "air" else ("entry", entry["entry"])
+        tasks.setdefault(key, []).append(entry)
+    return list(tasks.values())
+
+
+# Function to run the entries of one task in a pool process, returns the outcome of every entry
+def run_task(entries):
+    from .queue import JOB_HANDLERS, error_message
+    outcomes = []
+    for entry in entries:
+        handler = import_string(JOB_HANDLERS[BATCH_KINDS[entry["kind"]]])
+        outcome = {"entry": entry["entry"], "kind": entry["kind"], "customer_name": entry["params"]["customer_name"],
+                   "file": os.path.basename(entry["params"]["csv_file_path"]), "pid": os.getpid()}
+        start = time.perf_counter()
+        try:
+            result = handler(**entry["params"])
+        except Exception as error:
+            traceback.print_exc()
+            outcome.update(status="failed", error=error_message(error), rows=None, result=None)
+        else:
+            outcome.update(status="succeeded", error=None, rows=result.get("rows"), result=result)
+        outcome["duration"] = round(time.perf_counter() - start, 3)
+        outcomes.append(outcome)
+    return outcomes
+
+
+# Function run once in every pool process. Spawned processes (Windows, macOS) start without Django set up, which is why this
+# module imports the models only inside run_task. Forked processes inherit the parent's database connection objects, they
+# are dropped without closing them so each process opens its own connection
+def init_worker():
+    django.setup()
+    for connection in connections.all():
+        connection.connection = None
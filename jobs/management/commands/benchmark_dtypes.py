@@ -0,0 +1,97 @@
+from django.core.management.base import BaseCommand
+
+from air.artifacts import RunArtifacts
+from air.enrichment import enrich_references
+from air.mappings import discount_index
+from air.pipeline import AIR_SCHEMA, process_chunk
+from air.synthetic import synthetic_air_file, synthetic_air_group_mappings, synthetic_reference_lookups, synthetic_references
+from hotels.pipeline import HOTEL_SCHEMA
+from hotels.synthetic import SYNTHETIC_CITIES, synthetic_gdscodes, synthetic_hotel_file
+from CPR.pipeline_settings import CONFIG_JSON_PATH, parse_pipeline_settings
+from CPR.schemas import frame_memory_mb
+from CPR.settings.base import BASE_DIR
+
+from pathlib import Path
+import json
+import tempfile
+import time
+import pandas as pd
+
+CLIENT_NAME = "Benchmark Client"
+
+
+class Command(BaseCommand):
+    help = ("Compares reading a synthetic OneSchema air and hotel file with pandas' inferred column types against the "
+            "AIR_SCHEMA / HOTEL_SCHEMA column types: memory of the frames and time of the read, groupby, merge and processing stages.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=200000)
+        parser.add_argument("--pipelines", nargs="+", choices=["air", "hotels"], default=["air", "hotels"])
+        parser.add_argument("--seed", type=int, default=0)
+
+    # Function to run one stage on a copy of the frame, returns its result and wall time
+    def timed(self, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        return result, time.perf_counter() - start
+
+    # Function to print the inferred and schema timings and memory of every stage side by side
+    def compare(self, pipeline, rows, inferred, schema):
+        self.stdout.write("{} file, {} rows".format(pipeline, rows))
+        self.stdout.write("  {:<10} {:>12} {:>12} {:>9} {:>14} {:>14} {:>10}".format("Stage", "Inferred s", "Schema s", "Speed-up", "Inferred MB", "Schema MB", "Reduction"))
+        for stage in inferred:
+            (seconds, mb), (schema_seconds, schema_mb) = inferred[stage], schema[stage]
+            self.stdout.write("  {:<10} {:>12.3f} {:>12.3f} {:>8.1f}x {:>14} {:>14} {:>10}".format(
+                stage, seconds, schema_seconds, seconds / schema_seconds if schema_seconds else 0.0,
+                "-" if mb is None else "%.1f" % mb, "-" if schema_mb is None else "%.1f" % schema_mb,
+                "-" if mb is None else "{:.0%}".format(1 - schema_mb / mb)))
+
+    # Function to time the air stages on the file read with the given schema (None for pandas' inferred types)
+    def air_stages(self, path, schema, lookups, discounts, settings):
+        stages = {}
+        df, seconds = self.timed(RunArtifacts(Path(path).parent).read_csv, path, schema)
+        stages["read"] = (seconds, frame_memory_mb(df))
+        _, seconds = self.timed(lambda: df.groupby(["Carrier Code", "Origin Airport Code", "Destination Airport Code", "Class of Service Code"],
+                                                   observed=True)["Fare"].agg(["sum", "count"]))
+        stages["groupby"] = (seconds, None)
+        airlines = lookups[0]
+        _, seconds = self.timed(lambda: df.merge(airlines, left_on="Carrier Code", right_index=True, how="left"))
+        stages["merge"] = (seconds, None)
+        _, seconds = self.timed(enrich_references, df.copy(), *lookups)
+        stages["enrich"] = (seconds, None)
+        (final_df, _), seconds = self.timed(process_chunk, df, lookups, discounts, settings, CLIENT_NAME, "Benchmark Agency", "US", "2022")
+        stages["process"] = (seconds, frame_memory_mb(final_df))
+        return stages
+
+    # Function to time the hotel stages on the file read with or without the schema
+    def hotel_stages(self, path, options):
+        stages = {}
+        df, seconds = self.timed(lambda: pd.read_csv(path, **options))
+        stages["read"] = (seconds, frame_memory_mb(df))
+        _, seconds = self.timed(lambda: df.groupby(["Client Name", "City", "State"], observed=True)["Spends"].agg(["sum", "count"]))
+        stages["groupby"] = (seconds, None)
+        cities = pd.DataFrame(SYNTHETIC_CITIES, columns=["City", "State", "Postal Code"])
+        _, seconds = self.timed(lambda: df.merge(cities, on=["City", "State"], how="left"))
+        stages["merge"] = (seconds, None)
+        return stages
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        settings = parse_pipeline_settings(json.loads(CONFIG_JSON_PATH.read_text()), Path(BASE_DIR))
+        with tempfile.TemporaryDirectory() as directory:
+            if "air" in options["pipelines"]:
+                references = synthetic_references(seed=options["seed"])
+                air_df = synthetic_air_file(rows, references, settings, seed=options["seed"])
+                discounts = discount_index(pd.concat(synthetic_air_group_mappings(air_df, references, settings, seed=options["seed"]).values(), ignore_index=True))
+                path = Path(directory, "air.csv")
+                air_df.to_csv(path, index=False)
+                del air_df
+                lookups = synthetic_reference_lookups(references)
+                inferred = self.air_stages(path, None, lookups, discounts, settings)
+                self.compare("air", rows, inferred, self.air_stages(path, AIR_SCHEMA, lookups, discounts, settings))
+            if "hotels" in options["pipelines"]:
+                hotel_df, _ = synthetic_hotel_file(rows, synthetic_gdscodes(min(rows, 50000), seed=options["seed"]), CLIENT_NAME, seed=options["seed"])
+                path = Path(directory, "hotels.csv")
+                hotel_df.to_csv(path, index=False)
+                del hotel_df
+                self.compare("hotels", rows, self.hotel_stages(path, {}), self.hotel_stages(path, HOTEL_SCHEMA.read_options()))
@@ -0,0 +1,189 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from air.artifacts import RunArtifacts
+from air.enrichment import reference_lookups, enrich_references, unresolved_references
+from air.classification import classify_contracts
+from air.loaders import FactRowSpool
+from air.mappings import group_mapping_cache
+from air.merge import merge_client_quarters
+from air.models import Airline, Airport, Alliance
+from air.partitions import ensure_quarter_partitions
+from air.pipeline import AIR_SCHEMA, DB_COLUMNS, FINAL_HEADERS, prepare_frame, savings_columns
+from air.rollups import refresh_savings_rollup
+from air.synthetic import synthetic_air_file, synthetic_air_group_mappings, synthetic_reference_lookups, synthetic_references
+from hotels.models import AddressMatch, Gdscodes
+from hotels.pipeline import HOTEL_SCHEMA, calculate_group_savings, match_concertiv_ids
+from hotels.synthetic import synthetic_fuzzy_match_file, synthetic_gdscodes, synthetic_hotel_file, synthetic_hotel_group_mappings
+from CPR.db_pool import db_pool
+from CPR.pipeline_settings import CONFIG_JSON_PATH, parse_pipeline_settings
+from CPR.schemas import format_dates
+from CPR.settings.base import BASE_DIR
+
+from pathlib import Path
+import json
+import platform
+import subprocess
+import tempfile
+import time
+import pandas as pd
+
+RESULTS_PATH = Path(BASE_DIR, "benchmarks", "pipeline_results.jsonl")
+CLIENT_NAME = "Benchmark Client"
+
+
+class Command(BaseCommand):
+    help = ("Times every stage of the air and hotel pipelines on synthetic OneSchema files, Gdscodes masters and group mapping "
+            "workbooks, and appends the timings to a JSON lines file to compare runs over time. The database stages run "
+            "against a throwaway test database, --no-database runs only the stages which do not need Postgres.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000], help="File sizes to benchmark, 1k to 1M rows")
+        parser.add_argument("--pipelines", nargs="+", choices=["air", "hotels"], default=["air", "hotels"])
+        parser.add_argument("--gdscodes", type=int, help="Properties in the Gdscodes master, defaults to the file size")
+        parser.add_argument("--no-database", action="store_true", help="Skip the stages which need Postgres")
+        parser.add_argument("--keepdb", action="store_true", help="Keep the test database between runs")
+        parser.add_argument("--output", default=str(RESULTS_PATH), help="JSON lines file the results are appended to")
+        parser.add_argument("--files", help="Directory to keep the generated input and output files in, a temporary one by default")
+        parser.add_argument("--seed", type=int, default=0)
+
+    # Function to run one stage, recording its wall time and the rows it handled
+    def stage(self, pipeline, rows, name, function, *args, **kwargs):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        self.results.append({"pipeline": pipeline, "rows": rows, "stage": name, "seconds": round(seconds, 4)})
+        self.stdout.write("{:<8} {:>9} rows  {:<16} {:>10.3f} s".format(pipeline, rows, name, seconds))
+        return result
+
+    # Function to return the commit the benchmark runs on, None outside a git checkout
+    def commit(self):
+        try:
+            return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    # Function to write the synthetic reference tables and Gdscodes master into the test database, replacing a kept database's rows
+    def seed_masters(self, references, gdscodes):
+        Alliance.objects.all().delete()
+        Airport.objects.all().delete()
+        Gdscodes.objects.all().delete()
+        # Matches cached by an earlier run on a kept database would skip the matching being timed
+        AddressMatch.objects.all().delete()
+        Alliance.objects.bulk_create([Alliance(**row) for row in references["alliances"].to_dict("records")])
+        Airline.objects.bulk_create([Airline(**row) for row in references["airlines"].to_dict("records")])
+        Airport.objects.bulk_create([Airport(**row) for row in references["airports"].to_dict("records")], batch_size=5000)
+        Gdscodes.objects.bulk_create([Gdscodes(**row) for row in gdscodes.to_dict("records")], batch_size=5000)
+
+    # Function to run the air pipeline stages of process_air_file on one synthetic file
+    def benchmark_air(self, rows, directory, references, settings, use_database):
+        air_df = synthetic_air_file(rows, references, settings, seed=self.seed)
+        csv_file_path = Path(directory, "air_{}.csv".format(rows))
+        air_df.to_csv(csv_file_path, index=False)
+        mapping_path = Path(directory, "Group Airline Discounts Mapping.xlsx")
+        with pd.ExcelWriter(mapping_path) as writer:
+            for sheet, df in synthetic_air_group_mappings(air_df, references, settings, seed=self.seed).items():
+                df.to_excel(writer, sheet_name=sheet, index=False)
+        group_mapping_cache.invalidate(mapping_path)
+
+        artifacts = RunArtifacts(directory)
+        lookups = self.stage("air", rows, "lookups", reference_lookups) if use_database else synthetic_reference_lookups(references)
+        group, discounts = self.stage("air", rows, "group_mappings", group_mapping_cache.get, mapping_path)
+        df = self.stage("air", rows, "read", artifacts.read_csv, csv_file_path, AIR_SCHEMA)
+        df = self.stage("air", rows, "prepare", prepare_frame, df, CLIENT_NAME, "Benchmark Agency", "US", "2022")
+        df = self.stage("air", rows, "enrich", enrich_references, df, *lookups)
+        if not unresolved_references(df).empty:
+            raise CommandError("The synthetic air file has codes missing from the reference tables.")
+        df = self.stage("air", rows, "classify", classify_contracts, df, settings.contract_codes, settings.departure_cutoffs, discounts)
+        df["Departure Date"] = format_dates(df["Departure Date"], "%m/%d/%Y")
+        df = self.stage("air", rows, "savings", savings_columns, df, settings).reindex(columns=FINAL_HEADERS)
+        writer = artifacts.add_chunked("air_{}_FinalData.xlsx".format(rows), FINAL_HEADERS)
+        self.stage("air", rows, "write_xlsx", lambda: (artifacts.append(writer, df), artifacts.write()))
+        spool = FactRowSpool(DB_COLUMNS.values())
+        try:
+            self.stage("air", rows, "spool", spool.append, df[list(DB_COLUMNS)].rename(columns=DB_COLUMNS))
+            if use_database:
+                with db_pool.connection() as conn:
+                    self.stage("air", rows, "partitions", ensure_quarter_partitions, conn, spool.quarters, [CLIENT_NAME])
+                    self.stage("air", rows, "merge", merge_client_quarters, conn, spool, CLIENT_NAME, "US")
+                    self.stage("air", rows, "refresh_rollup", refresh_savings_rollup, conn)
+        finally:
+            spool.close()
+
+    # Function to run the hotel fuzzy match and group savings stages on one synthetic file
+    def benchmark_hotels(self, rows, directory, gdscodes, use_database):
+        hotel_df, concertiv_ids = synthetic_hotel_file(rows, gdscodes, CLIENT_NAME, seed=self.seed)
+        csv_file_path = Path(directory, "hotels_{}.csv".format(rows))
+        hotel_df.to_csv(csv_file_path, index=False)
+        fuzzy_file_path = Path(directory, "hotels_{}_FuzzyMatchReviewed.xlsx".format(rows))
+        synthetic_fuzzy_match_file(min(rows, len(gdscodes.index)), gdscodes, CLIENT_NAME, seed=self.seed).to_excel(fuzzy_file_path, index=False)
+        mapping_path = Path(directory, "Group Hotel Discounts Mapping.xlsx")
+        with pd.ExcelWriter(mapping_path) as writer:
+            for sheet, df in synthetic_hotel_group_mappings(gdscodes, CLIENT_NAME, seed=self.seed).items():
+                df.to_excel(writer, sheet_name=sheet, index=False)
+
+        df = self.stage("hotels", rows, "read", pd.read_csv, csv_file_path, **HOTEL_SCHEMA.read_options())
+        if use_database:
+            final_data, match_report = self.stage("hotels", rows, "match", match_concertiv_ids, df["Property Address"].to_list(), df["City"].to_list(), df["Country"].to_list())
+            df.insert(8, "Concertiv ID", final_data)
+            matched = sum(1 for found, expected in zip(final_data, concertiv_ids) if expected is not None and found == expected)
+            self.stdout.write("{:<8} {:>9} rows  matched {} of {} known addresses {}".format("hotels", rows, matched, sum(i is not None for i in concertiv_ids), match_report))
+        self.stage("hotels", rows, "write_xlsx", df.to_excel, Path(directory, "hotels_{}_FuzzyMatch.xlsx".format(rows)), index=False)
+        sheets = self.stage("hotels", rows, "group_mappings", pd.read_excel, mapping_path, sheet_name=None)
+        fuzzy_df = self.stage("hotels", rows, "read_fuzzy_match", pd.read_excel, fuzzy_file_path)
+        if use_database:
+            # The chainwide discount looks up every hotel's chain in Gdscodes
+            fuzzy_df = self.stage("hotels", rows, "group_savings", calculate_group_savings, fuzzy_df, *sheets.values())
+            self.stage("hotels", rows, "write_final_xlsx", fuzzy_df.to_excel, Path(directory, "hotels_{}_FinalData.xlsx".format(rows)), index=False)
+
+    # Function to print each stage against the last recorded run of the same stage, rows and database mode
+    def compare(self, output, record):
+        previous = {}
+        if output.exists():
+            for line in output.read_text().splitlines():
+                run = json.loads(line)
+                if run["database"] == record["database"]:
+                    previous.update({(r["pipeline"], r["rows"], r["stage"]): (run["commit"], r["seconds"]) for r in run["stages"]})
+        for result in record["stages"]:
+            key = (result["pipeline"], result["rows"], result["stage"])
+            if key in previous and previous[key][1]:
+                commit, seconds = previous[key]
+                change = (result["seconds"] - seconds) / seconds * 100
+                self.stdout.write("{:<8} {:>9} rows  {:<16} {:>10.3f} s against {:.3f} s at {} ({:+.0f}%)".format(*key, result["seconds"], seconds, commit, change))
+
+    def handle(self, *args, **options):
+        self.seed = options["seed"]
+        self.results = []
+        use_database = not options["no_database"]
+        settings = parse_pipeline_settings(json.loads(CONFIG_JSON_PATH.read_text()), Path(BASE_DIR))
+        references = synthetic_references(seed=self.seed)
+        gdscodes = synthetic_gdscodes(options["gdscodes"] or max(options["rows"]), seed=self.seed)
+        old_database_name = connection.settings_dict["NAME"]
+        if use_database:
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=options["keepdb"])
+        temporary = None if options["files"] else tempfile.TemporaryDirectory()
+        directory = Path(options["files"] or temporary.name)
+        directory.mkdir(parents=True, exist_ok=True)
+        try:
+            if use_database:
+                self.stage("setup", len(gdscodes.index), "seed_masters", self.seed_masters, references, gdscodes)
+            for rows in options["rows"]:
+                if "air" in options["pipelines"]:
+                    self.benchmark_air(rows, directory, references, settings, use_database)
+                if "hotels" in options["pipelines"]:
+                    self.benchmark_hotels(rows, directory, gdscodes, use_database)
+        finally:
+            if use_database:
+                connection.creation.destroy_test_db(old_database_name, verbosity=0, keepdb=options["keepdb"])
+            if temporary is not None:
+                temporary.cleanup()
+
+        record = {"run_at": timezone.now().isoformat(), "commit": self.commit(), "database": "postgres" if use_database else "none",
+                  "python": platform.python_version(), "pandas": pd.__version__, "seed": self.seed, "stages": self.results}
+        output = Path(options["output"])
+        self.compare(output, record)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with open(output, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        self.stdout.write("Results appended to %s" % output)
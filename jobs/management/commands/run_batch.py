@@ -0,0 +1,88 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from jobs.batch import batch_tasks, init_worker, read_manifest, run_task
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+import json
+import os
+import time
+
+
+class Command(BaseCommand):
+    help = ("Runs the air and hotel pipelines for every entry of a manifest without going through the browser, for the OneSchema "
+            "CSV files already exported to disk. The manifest is a CSV file (or a JSON list) with the columns kind (air or hotels), "
+            "csv_file_path, customer_name, travel_agency (air only), travel_type, country, year, quarter and optionally "
+            "write_db_staging and replace_existing. Independent files run in parallel across a process pool.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("manifest", help="Manifest CSV or JSON file")
+        parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1),
+                            help="Processes running files at once, 1 runs them in this process")
+        parser.add_argument("--report", help="JSON file the outcome of every entry is written to")
+
+    # Function to run the tasks, yielding the outcomes of each task as it finishes
+    def run(self, tasks, workers):
+        if workers == 1:
+            for task in tasks:
+                yield task, run_task(task)
+            return
+        # Pool processes must not share the parent's database connection
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+            futures = {pool.submit(run_task, task): task for task in tasks}
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result()
+                except Exception as error:
+                    # The pool process died (e.g. killed for running out of memory), every entry of its task failed
+                    yield futures[future], [{"entry": entry["entry"], "kind": entry["kind"], "customer_name": entry["params"]["customer_name"],
+                                             "file": os.path.basename(entry["params"]["csv_file_path"]), "pid": None, "status": "failed",
+                                             "error": "{}: {}".format(type(error).__name__, error), "rows": None, "result": None, "duration": None}
+                                            for entry in futures[future]]
+
+    # Function to print one line per entry, in manifest order, with the batch totals
+    def summary(self, outcomes, seconds):
+        self.stdout.write("{:>5}  {:<7} {:<30} {:<40} {:<9} {:>10} {:>10}".format("Entry", "Kind", "Client", "File", "Status", "Rows", "Seconds"))
+        for outcome in outcomes:
+            self.stdout.write("{:>5}  {:<7} {:<30} {:<40} {:<9} {:>10} {:>10}".format(
+                outcome["entry"], outcome["kind"], outcome["customer_name"][:30], outcome["file"][:40], outcome["status"],
+                "-" if outcome["rows"] is None else outcome["rows"], "-" if outcome["duration"] is None else "%.1f" % outcome["duration"]))
+            if outcome["error"]:
+                self.stdout.write(self.style.ERROR("       %s" % outcome["error"]))
+        busy = sum(outcome["duration"] or 0.0 for outcome in outcomes)
+        failed = sum(outcome["status"] == "failed" for outcome in outcomes)
+        self.stdout.write("{} entries, {} succeeded, {} failed in {:.1f} s ({:.1f} s of pipeline time, {:.1f}x)".format(
+            len(outcomes), len(outcomes) - failed, failed, seconds, busy, busy / seconds if seconds else 0.0))
+        return failed
+
+    def handle(self, *args, **options):
+        try:
+            entries = read_manifest(options["manifest"])
+        except (OSError, ValueError) as error:
+            raise CommandError("Invalid manifest: %s" % error)
+        if not entries:
+            raise CommandError("The manifest has no entries.")
+        if options["workers"] < 1:
+            raise CommandError("--workers must be at least 1.")
+        tasks = batch_tasks(entries)
+        workers = min(options["workers"], len(tasks))
+        self.stdout.write("Running {} entries as {} tasks on {} process(es)".format(len(entries), len(tasks), workers))
+
+        start = time.perf_counter()
+        outcomes = []
+        for task, task_outcomes in self.run(tasks, workers):
+            for outcome in task_outcomes:
+                self.stdout.write("Entry {} ({} {}) {} in {} s".format(outcome["entry"], outcome["kind"], outcome["file"], outcome["status"], outcome["duration"]))
+            outcomes.extend(task_outcomes)
+        seconds = time.perf_counter() - start
+        outcomes.sort(key=lambda outcome: outcome["entry"])
+        failed = self.summary(outcomes, seconds)
+
+        if options["report"]:
+            report = {"manifest": str(options["manifest"]), "workers": workers, "seconds": round(seconds, 3), "entries": outcomes}
+            Path(options["report"]).write_text(json.dumps(report, indent=2, default=str))
+            self.stdout.write("Report written to %s" % options["report"])
+        if failed:
+            raise CommandError("{} of {} entries failed.".format(failed, len(outcomes)))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from jobs.queue import claim_job, run_job, worker_name
+from CPR.db_pool import db_pool
+
+import time
+
+
+class Command(BaseCommand):
+    help = "Runs queued pipeline jobs. Start one worker per process; any number of workers can share the queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--poll", type=float, default=5.0, help="Seconds to wait before polling again when the queue is empty")
+        parser.add_argument("--once", action="store_true", help="Exit as soon as the queue is empty")
+
+    def handle(self, *args, **options):
+        worker = worker_name()
+        self.stdout.write("Job worker %s started" % worker)
+        while True:
+            close_old_connections()
+            job = claim_job(worker)
+            if job is None:
+                if options["once"]:
+                    return
+                time.sleep(options["poll"])
+                continue
+            self.stdout.write("Running %s (attempt %s)" % (job, job.attempts))
+            job = run_job(job)
+            self.stdout.write("%s %s in %ss, connection pool %s" % (job, job.status, job.duration, db_pool.stats()))
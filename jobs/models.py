@@ -0,0 +1,32 @@
+from django.db import models
+from django.utils import timezone
+
+# Create your models here.
+class Job(models.Model):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATUS_CHOICES = [(QUEUED, "Queued"), (RUNNING, "Running"), (SUCCEEDED, "Succeeded"), (FAILED, "Failed")]
+
+    kind = models.CharField(max_length=50)
+    params = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, null=True)
+    locked_until = models.DateTimeField(null=True)
+    created_by = models.CharField(max_length=30, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+    duration = models.FloatField(null=True)
+    result = models.JSONField(null=True)
+    error = models.TextField(null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "run_at"], name="jobs_job_status_run_at_idx")]
+
+    def __str__(self):
+        return "{} #{}".format(self.kind, self.id)
@@ -0,0 +1,140 @@
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+import datetime
+import os
+import socket
+import threading
+import time
+import traceback
+
+# Job kinds and the pipeline function which runs them, called with the job params as keyword arguments
+JOB_HANDLERS = {
+    "air.process_data": "air.pipeline.process_air_file",
+    "hotels.fuzzy_match": "hotels.pipeline.fuzzy_match_file",
+}
+# A running job whose lease expired (worker died or was killed) can be claimed again. The worker running a job renews its
+# lease every HEARTBEAT, so only jobs of dead workers expire however long the job runs
+LEASE = datetime.timedelta(minutes=10)
+HEARTBEAT = datetime.timedelta(minutes=1)
+RETRY_DELAY = datetime.timedelta(minutes=1)
+# Error recorded on a job whose worker stopped (killed, out of memory, restarted) during its last attempt
+LEASE_EXPIRED = "Lease expired: the worker running the last attempt stopped"
+# Errors caused by the input data, retrying them cannot succeed
+PERMANENT_ERRORS = (ValidationError, FileNotFoundError, KeyError, ValueError)
+
+
+# Function to return the identifier a worker process records on the jobs it claims
+def worker_name():
+    return "{}:{}".format(socket.gethostname(), os.getpid())
+
+
+# Function to queue a pipeline run, returns the job
+def enqueue(kind, params, created_by=None, max_attempts=3):
+    if kind not in JOB_HANDLERS:
+        raise ValueError("Unknown job kind: %s" % kind)
+    return Job.objects.create(kind=kind, params=params, created_by=created_by, max_attempts=max_attempts)
+
+
+# Function to fail the jobs whose lease expired on their last attempt, so a job which kills its worker is not run again by
+# every other worker. Returns the number of jobs failed
+def fail_expired_jobs(now):
+    return Job.objects.filter(status=Job.RUNNING, locked_until__lt=now, attempts__gte=F("max_attempts")).update(
+        status=Job.FAILED, error=LEASE_EXPIRED, finished_at=now, locked_by=None, locked_until=None)
+
+
+# Function to claim the next due job with SELECT ... FOR UPDATE SKIP LOCKED, returns None when there is nothing to run. A job
+# whose lease expired is claimed again while it has attempts left
+def claim_job(worker):
+    now = timezone.now()
+    fail_expired_jobs(now)
+    with transaction.atomic():
+        job = (Job.objects.select_for_update(skip_locked=True)
+               .filter(Q(status=Job.QUEUED, run_at__lte=now) | Q(status=Job.RUNNING, locked_until__lt=now, attempts__lt=F("max_attempts")))
+               .order_by("run_at", "id")
+               .first())
+        if job is None:
+            return None
+        job.status = Job.RUNNING
+        job.attempts += 1
+        job.locked_by = worker
+        job.locked_until = now + LEASE
+        job.started_at = now
+        job.save(update_fields=["status", "attempts", "locked_by", "locked_until", "started_at"])
+    return job
+
+
+# Function to extend the lease of a running job, returns False when the worker no longer owns the job (its lease expired and
+# another worker claimed it)
+def renew_lease(job):
+    return Job.objects.filter(id=job.id, status=Job.RUNNING, locked_by=job.locked_by).update(
+        locked_until=timezone.now() + LEASE) == 1
+
+
+# Renews the lease of a running job in a background thread until the job finishes
+class LeaseHeartbeat(threading.Thread):
+
+    def __init__(self, job, interval=HEARTBEAT):
+        super().__init__(daemon=True)
+        self.job = job
+        self.interval = interval.total_seconds()
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                if not renew_lease(self.job):
+                    return
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+# Function to return a readable message for a failed job
+def error_message(error):
+    if isinstance(error, ValidationError):
+        return "; ".join(error.messages)
+    return "{}: {}".format(type(error).__name__, error)
+
+
+# Function to run a claimed job and record its result, timing and retries. The result is only recorded if the worker still
+# owns the job, a job reclaimed by another worker is left to that worker
+def run_job(job):
+    handler = import_string(JOB_HANDLERS[job.kind])
+    worker = job.locked_by
+    heartbeat = LeaseHeartbeat(job)
+    heartbeat.start()
+    start = time.perf_counter()
+    try:
+        result = handler(**job.params)
+    except Exception as error:
+        traceback.print_exc()
+        job.error = error_message(error)
+        if isinstance(error, PERMANENT_ERRORS) or job.attempts >= job.max_attempts:
+            job.status = Job.FAILED
+        else:
+            job.status = Job.QUEUED
+            job.run_at = timezone.now() + RETRY_DELAY * job.attempts
+    else:
+        job.status = Job.SUCCEEDED
+        job.result = result
+        job.error = None
+    finally:
+        heartbeat.stop()
+    job.duration = round(time.perf_counter() - start, 3)
+    job.finished_at = timezone.now()
+    job.locked_by, job.locked_until = None, None
+    fields = ["status", "result", "error", "run_at", "duration", "finished_at", "locked_by", "locked_until"]
+    owned = Job.objects.filter(id=job.id, status=Job.RUNNING, locked_by=worker).update(
+        **{field: getattr(job, field) for field in fields})
+    if not owned:
+        job.refresh_from_db()
+    return job
@@ -0,0 +1,140 @@
+from django.core.exceptions import ValidationError
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .batch import batch_tasks, read_manifest
+from .models import Job
+from .queue import LEASE_EXPIRED, claim_job, enqueue, renew_lease, run_job
+
+import datetime
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+
+# Job handlers used by the queue tests
+def succeed(rows):
+    return {"rows": rows}
+
+
+def fail_temporarily():
+    raise ConnectionError("database went away")
+
+
+def fail_permanently():
+    raise ValidationError("Missing column: Departure Date")
+
+
+TEST_HANDLERS = {"test.succeed": "jobs.tests.succeed", "test.retry": "jobs.tests.fail_temporarily",
+                 "test.fail": "jobs.tests.fail_permanently"}
+
+
+# Create your tests here.
+class BatchManifestTest(SimpleTestCase):
+
+    def write_manifest(self, text):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name, "manifest.csv")
+        path.write_text(text)
+        return path
+
+    def test_air_files_of_a_client_run_in_one_task(self):
+        entries = read_manifest(self.write_manifest(
+            "kind,csv_file_path,customer_name,travel_agency,travel_type,country,year,quarter,replace_existing\n"
+            "air,a.csv,Acme,Amex,Air,US,2022,Q3,yes\n"
+            "hotels,b.csv,Acme,,Hotel,US,2022,Q3,\n"
+            "air,c.csv,Acme,Amex,Air,US,2022,Q4,\n"
+            "air,d.csv,Beta,Amex,Air,US,2022,Q3,\n"))
+        self.assertEqual(entries[0]["params"]["replace_existing"], True)
+        self.assertNotIn("travel_agency", entries[1]["params"])
+        self.assertEqual([[entry["entry"] for entry in task] for task in batch_tasks(entries)], [[1, 3], [2], [4]])
+
+    def test_invalid_entries_are_rejected(self):
+        with self.assertRaisesMessage(ValueError, "Entry 1: missing travel_agency"):
+            read_manifest(self.write_manifest("kind,csv_file_path,customer_name,travel_type,country,year,quarter\nair,a.csv,Acme,Air,US,2022,Q3\n"))
+
+
+@mock.patch.dict("jobs.queue.JOB_HANDLERS", TEST_HANDLERS)
+@mock.patch("jobs.queue.traceback.print_exc", mock.Mock())
+class JobQueueTest(TestCase):
+
+    def test_claimed_job_runs_once(self):
+        job = enqueue("test.succeed", {"rows": 3})
+        claimed = claim_job("worker-1")
+        self.assertEqual((claimed.id, claimed.status, claimed.attempts, claimed.locked_by), (job.id, Job.RUNNING, 1, "worker-1"))
+        self.assertIsNone(claim_job("worker-2"))
+        job = run_job(claimed)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, job.locked_by, job.locked_until), (Job.SUCCEEDED, {"rows": 3}, None, None))
+        self.assertIsNone(claim_job("worker-2"))
+
+    def test_jobs_scheduled_later_are_not_claimed(self):
+        Job.objects.create(kind="test.succeed", params={"rows": 1}, run_at=timezone.now() + datetime.timedelta(minutes=5))
+        self.assertIsNone(claim_job("worker-1"))
+
+    def test_failed_job_is_retried_until_max_attempts(self):
+        job = enqueue("test.retry", {}, max_attempts=2)
+        job = run_job(claim_job("worker-1"))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), (Job.QUEUED, "ConnectionError: database went away"))
+        self.assertGreater(job.run_at, timezone.now())
+        Job.objects.filter(id=job.id).update(run_at=timezone.now())
+        job = run_job(claim_job("worker-1"))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+    def test_permanent_error_is_not_retried(self):
+        job = enqueue("test.fail", {})
+        job = run_job(claim_job("worker-1"))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.error), (Job.FAILED, 1, "Missing column: Departure Date"))
+
+    def test_expired_lease_is_claimed_by_another_worker(self):
+        job = enqueue("test.succeed", {"rows": 2})
+        stale = claim_job("worker-1")
+        self.assertTrue(renew_lease(stale))
+        Job.objects.filter(id=job.id).update(locked_until=timezone.now() - datetime.timedelta(seconds=1))
+        reclaimed = claim_job("worker-2")
+        self.assertEqual((reclaimed.id, reclaimed.attempts, reclaimed.locked_by), (job.id, 2, "worker-2"))
+        # The first worker lost the job, it can neither renew the lease nor record its result
+        self.assertFalse(renew_lease(stale))
+        self.assertEqual(run_job(stale).locked_by, "worker-2")
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by), (Job.RUNNING, "worker-2"))
+        run_job(reclaimed)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result), (Job.SUCCEEDED, {"rows": 2}))
+
+    def test_expired_lease_on_the_last_attempt_fails_the_job(self):
+        job = enqueue("test.succeed", {"rows": 2}, max_attempts=2)
+        for worker in ["worker-1", "worker-2"]:
+            self.assertEqual(claim_job(worker).id, job.id)
+            # The worker is killed while running the job
+            Job.objects.filter(id=job.id).update(locked_until=timezone.now() - datetime.timedelta(seconds=1))
+        self.assertIsNone(claim_job("worker-3"))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.error, job.locked_by), (Job.FAILED, 2, LEASE_EXPIRED, None))
+
+
+class JobArtifactViewTest(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name, "Acme_Air_Q32022_US_FinalData.xlsx")
+        self.path.write_bytes(b"final data")
+        self.job = Job.objects.create(kind="air.process_data", status=Job.SUCCEEDED, result={"final_sheet": str(self.path), "rows": 1})
+        session = self.client.session
+        session["username"] = "tester"
+        session.save()
+
+    def test_result_files_are_downloaded(self):
+        response = self.client.get(reverse("jobs:job_artifact", args=[self.job.id, "final_sheet"]))
+        self.assertEqual(b"".join(response.streaming_content), b"final data")
+        self.assertIn(self.path.name, response["Content-Disposition"])
+
+    def test_only_result_files_are_served(self):
+        self.assertEqual(self.client.get(reverse("jobs:job_artifact", args=[self.job.id, "rows"])).status_code, 404)
+        self.assertEqual(self.client.get(reverse("jobs:job_artifact", args=[self.job.id, "file_path"])).status_code, 404)
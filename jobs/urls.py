@@ -0,0 +1,9 @@
+from django.urls import path
+from .views import JobArtifactView, JobStatusView
+
+app_name = "jobs"
+
+urlpatterns = [
+    path('jobs/<int:id>', JobStatusView.as_view(), name='job_status'),
+    path('jobs/<int:id>/artifacts/<str:key>', JobArtifactView.as_view(), name='job_artifact'),
+]
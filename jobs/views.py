@@ -0,0 +1,48 @@
+from django.http import FileResponse, Http404, JsonResponse
+from django.shortcuts import render, get_object_or_404
+from django.views.generic import View
+
+from .models import Job
+
+import os
+
+# Result keys of the pipeline runs which hold the path of a file the run wrote, served by JobArtifactView
+ARTIFACT_KEYS = ["final_sheet", "file_path"]
+
+
+# Create your views here.
+class JobStatusView(View):
+    template_name = 'jobs/job_status.html'
+    error_url = 'commons/error.html'
+
+    # Function to return the status and result of a job, as JSON when ?format=json is given
+    def get(self, request, id, *args, **kwargs):
+        if request.session.has_key('username'):
+            username = request.session.get('username')
+            request.session.modified = True
+            job = get_object_or_404(Job, id=id)
+            if request.GET.get('format') == 'json':
+                return JsonResponse({'id': job.id, 'kind': job.kind, 'status': job.status, 'attempts': job.attempts,
+                                     'created_at': job.created_at, 'started_at': job.started_at, 'finished_at': job.finished_at,
+                                     'duration': job.duration, 'result': job.result, 'error': job.error})
+            return render(request, self.template_name, context={'username': username, 'job': job})
+        else:
+            message = "Unauthorized access. Please login again."
+            return render(request, self.error_url, context={'message': message})
+
+
+# Download of a file written by a job, only the paths recorded in the job's result are served
+class JobArtifactView(View):
+    error_url = 'commons/error.html'
+
+    def get(self, request, id, key, *args, **kwargs):
+        if request.session.has_key('username'):
+            request.session.modified = True
+            job = get_object_or_404(Job, id=id)
+            path = (job.result or {}).get(key) if key in ARTIFACT_KEYS else None
+            if not path or not os.path.isfile(path):
+                raise Http404("Job #%s has no %s file" % (job.id, key))
+            return FileResponse(open(path, 'rb'), as_attachment=True, filename=os.path.basename(path))
+        else:
+            message = "Unauthorized access. Please login again."
+            return render(request, self.error_url, context={'message': message})